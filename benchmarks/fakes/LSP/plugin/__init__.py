@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from .core.collections import DottedDict
+from .core.protocol import Notification, Request
+from .core.sessions import Session, WorkspaceFolder
+from .core.types import ClientConfig
+
+__all__ = (
+    "ClientConfig",
+    "DottedDict",
+    "Notification",
+    "Request",
+    "Session",
+    "WorkspaceFolder",
+)
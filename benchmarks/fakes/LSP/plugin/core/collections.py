@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import copy
+from typing import Any
+
+
+class DottedDict:
+    def __init__(self, d: dict[str, Any] | None = None) -> None:
+        self._d: dict[str, Any] = {}
+        if d:
+            self.update(d)
+
+    def get(self, path: str | None = None) -> Any:
+        if path is None:
+            return self._d
+        current: Any = self._d
+        for key in path.split("."):
+            if not isinstance(current, dict) or key not in current:
+                return None
+            current = current[key]
+        return current
+
+    def set(self, path: str, value: Any) -> None:
+        keys = path.split(".")
+        current = self._d
+        for key in keys[:-1]:
+            current = current.setdefault(key, {})
+        current[keys[-1]] = value
+
+    def update(self, d: dict[str, Any]) -> None:
+        for key, value in d.items():
+            self.set(key, copy.deepcopy(value))
+
+    def assign(self, d: dict[str, Any]) -> None:
+        self._d = copy.deepcopy(d)
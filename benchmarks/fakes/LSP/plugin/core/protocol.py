@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import TypedDict
+
+
+class Position(TypedDict):
+    line: int
+    character: int
+
+
+class Range(TypedDict):
+    start: Position
+    end: Position
+
+
+class Request:
+    __slots__ = ("method", "params", "view", "progress")
+
+    def __init__(self, method: str, params: object = None, view: object = None, progress: bool = False) -> None:
+        self.method = method
+        self.params = params
+        self.view = view
+        self.progress = progress
+
+
+class Notification:
+    __slots__ = ("method", "params")
+
+    def __init__(self, method: str, params: object = None) -> None:
+        self.method = method
+        self.params = params
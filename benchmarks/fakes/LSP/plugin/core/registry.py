@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import sublime_plugin
+
+from .sessions import Session, sessions_for_window
+
+
+class LspTextCommand(sublime_plugin.TextCommand):
+    session_name: str | None = None
+
+    def is_enabled(self, event: dict | None = None, point: int | None = None) -> bool:  # type: ignore
+        return True
+
+    def session_by_name(self, name: str | None = None) -> Session | None:
+        window = self.view.window()
+        return next(iter(sessions_for_window(window)), None) if window else None
+
+
+class LspWindowCommand(sublime_plugin.WindowCommand):
+    session_name: str | None = None
+
+    def is_enabled(self) -> bool:
+        return self.session() is not None
+
+    def session(self) -> Session | None:
+        return next(iter(sessions_for_window(self.window)), None)
@@ -0,0 +1,257 @@
+"""
+A stand-in for LSP's `Session`, talking real JSON-RPC (with `Content-Length` framing) to a server process.
+
+Responses and notifications are delivered through `sublime.set_timeout_async`, just like the LSP
+package does, so callbacks run on the (fake) async thread of the benchmark event loop.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import subprocess
+import sys
+import threading
+import time
+import weakref
+from collections.abc import Callable
+from typing import Any
+
+import sublime
+
+from .protocol import Notification, Request
+from .types import ClientConfig
+from .url import filename_to_uri
+
+_sessions: dict[int, list[Session]] = {}
+
+
+def sessions_for_window(window: sublime.Window) -> list[Session]:
+    return _sessions.get(window.id(), [])
+
+
+class WorkspaceFolder:
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self.path = path
+
+
+class SessionBuffer:
+    def __init__(self, session: Session, view: sublime.View) -> None:
+        self.session = session
+        self.view = view
+        self.version = view.change_count()
+        self.pending_changes = False
+        self.uri = filename_to_uri(view.file_name() or f"buffer:{view.buffer().id()}")
+        session.send_notification(
+            Notification(
+                "textDocument/didOpen",
+                {
+                    "textDocument": {
+                        "uri": self.uri,
+                        "languageId": "python",
+                        "version": self.version,
+                        "text": view.substr(sublime.Region(0, view.size())),
+                    }
+                },
+            )
+        )
+        view.modification_listeners.append(self._on_modified)
+
+    def get_uri(self) -> str:
+        return self.uri
+
+    def _on_modified(self, view: sublime.View) -> None:
+        if not self.pending_changes:
+            self.pending_changes = True
+            # LSP debounces `didChange` notifications
+            sublime.set_timeout_async(lambda: self.purge_changes_async(view), self.session.did_change_delay_ms)
+
+    def purge_changes_async(self, view: sublime.View, suppress_requests: bool = False) -> None:
+        if not self.pending_changes:
+            return
+        self.pending_changes = False
+        self.version = view.change_count()
+        self.session.send_notification(
+            Notification(
+                "textDocument/didChange",
+                {
+                    "textDocument": {"uri": self.uri, "version": self.version},
+                    "contentChanges": [{"text": view.substr(sublime.Region(0, view.size()))}],
+                },
+            )
+        )
+
+
+class SessionView:
+    def __init__(self, session: Session, view: sublime.View, session_buffer: SessionBuffer) -> None:
+        self.session = session
+        self.view = view
+        self.session_buffer = session_buffer
+
+    def get_uri(self) -> str:
+        return self.session_buffer.get_uri()
+
+
+SessionViewProtocol = SessionView
+
+
+class Session:
+    def __init__(self, window: sublime.Window, config: ClientConfig, server_command: list[str]) -> None:
+        self.window = window
+        self.config = config
+        self.state = "running"
+        self.did_change_delay_ms = 300
+        self.config_status = ""
+        self.plugin: Any = None
+        self._session_views: dict[int, SessionView] = {}
+        self._callbacks: dict[int, tuple[Callable[[Any], None], Callable[[Any], None] | None]] = {}
+        self._ids = itertools.count(1)
+        self._write_lock = threading.Lock()
+        self.sent: dict[str, int] = {}
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.request_times: dict[int, float] = {}
+        self._process = subprocess.Popen(
+            server_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=sys.stderr,
+            bufsize=0,
+        )
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        _sessions.setdefault(window.id(), []).append(self)
+
+    # ------------ #
+    # views        #
+    # ------------ #
+
+    def attach_view(self, view: sublime.View) -> SessionView:
+        session_view = SessionView(self, view, SessionBuffer(self, view))
+        self._session_views[view.id()] = session_view
+        return session_view
+
+    def detach_view(self, view: sublime.View) -> None:
+        self._session_views.pop(view.id(), None)
+
+    def session_view_for_view_async(self, view: sublime.View) -> SessionView | None:
+        # like LSP, this walks every session view
+        for session_view in list(self._session_views.values()):
+            if session_view.view == view:
+                return session_view
+        return None
+
+    def session_views_async(self) -> list[SessionView]:
+        return list(self._session_views.values())
+
+    def set_config_status_async(self, message: str) -> None:
+        self.config_status = message
+
+    # ------------ #
+    # JSON-RPC     #
+    # ------------ #
+
+    def send_request_async(
+        self,
+        request: Request,
+        on_result: Callable[[Any], None],
+        on_error: Callable[[Any], None] | None = None,
+    ) -> int:
+        request_id = next(self._ids)
+        self._callbacks[request_id] = (on_result, on_error)
+        self.sent[request.method] = self.sent.get(request.method, 0) + 1
+        self.request_times[request_id] = time.perf_counter()
+        self._write({"jsonrpc": "2.0", "id": request_id, "method": request.method, "params": request.params})
+        return request_id
+
+    send_request = send_request_async
+
+    def send_notification(self, notification: Notification) -> None:
+        self.sent[notification.method] = self.sent.get(notification.method, 0) + 1
+        self._write({"jsonrpc": "2.0", "method": notification.method, "params": notification.params})
+
+    def cancel_request(self, request_id: int, ignore_response: bool = True) -> None:
+        self.send_notification(Notification("$/cancelRequest", {"id": request_id}))
+        if ignore_response:
+            self._callbacks.pop(request_id, None)
+
+    def end(self) -> None:
+        self.state = "stopped"
+        sessions = _sessions.get(self.window.id(), [])
+        if self in sessions:
+            sessions.remove(self)
+        try:
+            self._write({"jsonrpc": "2.0", "method": "exit", "params": None})
+            self._process.stdin.close()  # type: ignore
+        except OSError:
+            pass
+        self._process.wait(timeout=5)
+        if self.plugin:
+            self.plugin.on_session_end_async(0, None)
+
+    def _write(self, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        with self._write_lock:
+            self.sent_bytes += len(body)
+            self._process.stdin.write(b"Content-Length: %d\r\n\r\n%s" % (len(body), body))  # type: ignore
+
+    def _read_loop(self) -> None:
+        stdout = self._process.stdout
+        assert stdout
+        while True:
+            length = 0
+            while line := stdout.readline():
+                if line in (b"\r\n", b"\n"):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            if not line:
+                return
+            body = b""
+            while len(body) < length:
+                body += stdout.read(length - len(body))
+            self.received_bytes += len(body)
+            payload = json.loads(body)
+            sublime.set_timeout_async(lambda payload=payload: self._dispatch(payload))
+
+    def _dispatch(self, payload: dict[str, Any]) -> None:
+        if "id" in payload and "method" not in payload:
+            if not (callbacks := self._callbacks.pop(payload["id"], None)):
+                return
+            on_result, on_error = callbacks
+            if "error" in payload:
+                if on_error:
+                    on_error(payload["error"])
+            else:
+                on_result(payload.get("result"))
+            return
+
+        if not self.plugin:
+            return
+        if "id" in payload:
+            self._dispatch_server_request(payload)
+            return
+        notification = Notification(payload["method"], payload.get("params"))
+        for handler in _handlers(self.plugin, "_lsp_utils_notification"):
+            if handler._lsp_utils_notification == notification.method:
+                handler(notification.params)
+        self.plugin.on_server_notification_async(notification)
+
+    def _dispatch_server_request(self, payload: dict[str, Any]) -> None:
+        def respond(result: Any) -> None:
+            self._write({"jsonrpc": "2.0", "id": payload["id"], "result": result})
+
+        for handler in _handlers(self.plugin, "_lsp_utils_request"):
+            if handler._lsp_utils_request == payload["method"]:
+                handler(payload.get("params"), respond)
+                return
+        respond(None)
+
+
+def _handlers(plugin: Any, marker: str) -> list[Any]:
+    return [getattr(plugin, name) for name in dir(type(plugin)) if hasattr(getattr(type(plugin), name, None), marker)]
+
+
+def weak(session: Session) -> weakref.ref[Session]:
+    return weakref.ref(session)
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def basescope2languageid(base_scope: str) -> str:
+    return base_scope.split(".")[-1] if base_scope else ""
+
+
+class ClientConfig:
+    def __init__(self, name: str = "LSP-copilot", settings: Any = None) -> None:
+        from .collections import DottedDict
+
+        self.name = name
+        self.settings = settings if settings is not None else DottedDict()
+        self.enabled = True
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from urllib.parse import quote, unquote, urlparse
+
+
+def filename_to_uri(file_name: str) -> str:
+    return "file://" + quote(file_name)
+
+
+def parse_uri(uri: str) -> tuple[str, str]:
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        return parsed.scheme, unquote(parsed.path)
+    return parsed.scheme, uri
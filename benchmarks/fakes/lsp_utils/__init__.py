@@ -0,0 +1,83 @@
+"""A stand-in for the `lsp_utils` dependency. Only what LSP-copilot's client needs is provided."""
+
+from __future__ import annotations
+
+import weakref
+from typing import Any, Callable
+
+import sublime
+from LSP.plugin import ClientConfig, DottedDict, Session, WorkspaceFolder
+
+
+class ApiWrapperInterface:
+    def __init__(self, session: Session) -> None:
+        self._session = session
+
+    def send_request(self, method: str, params: Any, handler: Callable[[Any, bool], None]) -> None:
+        from LSP.plugin import Request
+
+        self._session.send_request_async(
+            Request(method, params),
+            lambda result: handler(result, False),
+            lambda error: handler(error, True),
+        )
+
+    def send_notification(self, method: str, params: Any) -> None:
+        from LSP.plugin import Notification
+
+        self._session.send_notification(Notification(method, params))
+
+
+class NpmClientHandler:
+    package_name = ""
+    server_directory = ""
+    server_binary_path = ""
+
+    def __init__(self, weaksession: weakref.ref[Session]) -> None:
+        self.weaksession = weaksession
+
+    @classmethod
+    def setup(cls) -> None:
+        pass
+
+    @classmethod
+    def cleanup(cls) -> None:
+        pass
+
+    @classmethod
+    def can_start(
+        cls,
+        window: sublime.Window,
+        initiating_view: sublime.View,
+        workspace_folders: list[WorkspaceFolder],
+        configuration: ClientConfig,
+    ) -> str | None:
+        return None
+
+    def on_ready(self, api: ApiWrapperInterface) -> None:
+        pass
+
+    def on_settings_changed(self, settings: DottedDict) -> None:
+        pass
+
+    def on_server_notification_async(self, notification: Any) -> None:
+        pass
+
+    def on_session_end_async(self, exit_code: int | None, exception: Exception | None) -> None:
+        pass
+
+
+def notification_handler(method: str) -> Callable[[Any], Any]:
+    def decorator(func: Any) -> Any:
+        func._lsp_utils_notification = method
+        return func
+
+    return decorator
+
+
+def request_handler(method: str) -> Callable[[Any], Any]:
+    def decorator(func: Any) -> Any:
+        func._lsp_utils_request = method
+        return func
+
+    return decorator
@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+import shutil
+
+
+def rmtree_ex(path: str, ignore_errors: bool = False) -> None:
+    shutil.rmtree(path, ignore_errors=ignore_errors)
@@ -0,0 +1,137 @@
+"""
+An in-memory stand-in for the `mdpopups` dependency.
+
+The Markdown conversion is deliberately simple, but its cost grows with the input like the real
+thing: every fenced code block is "highlighted" token by token and everything else is scanned
+line by line.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+from typing import Any
+
+import sublime
+
+_TOKEN_RE = re.compile(r"\w+|\s+|[^\w\s]")
+
+stats = {"md2html_calls": 0, "md2html_chars": 0}
+
+
+def _highlight(code: str) -> str:
+    return "".join(
+        f'<span class="t{len(token) % 7}">{html.escape(token)}</span>' if not token.isspace() else token
+        for token in _TOKEN_RE.findall(code)
+    )
+
+
+def md2html(
+    view: sublime.View | None, markup: str, template_vars: Any = None, template_env_options: Any = None, **kwargs: Any
+) -> str:
+    stats["md2html_calls"] += 1
+    stats["md2html_chars"] += len(markup)
+    out: list[str] = []
+    fence: str | None = None
+    code: list[str] = []
+    paragraph: list[str] = []
+
+    def flush_paragraph() -> None:
+        if paragraph:
+            out.append("<p>" + "\n".join(paragraph) + "</p>")
+            paragraph.clear()
+
+    for line in markup.split("\n"):
+        stripped = line.lstrip()
+        if fence is None and (m := re.match(r"(`{3,})", stripped)):
+            flush_paragraph()
+            fence = m.group(1)
+            continue
+        if fence is not None:
+            if stripped.startswith(fence):
+                out.append('<div class="highlight"><pre>' + _highlight("\n".join(code)) + "</pre></div>")
+                code.clear()
+                fence = None
+            else:
+                code.append(line)
+            continue
+        if not stripped:
+            flush_paragraph()
+        elif stripped.startswith(("<", "---")):
+            flush_paragraph()
+            out.append(line)
+        else:
+            paragraph.append(line)
+    flush_paragraph()
+    if fence is not None:
+        out.append('<div class="highlight"><pre>' + _highlight("\n".join(code)) + "</pre></div>")
+    return "\n".join(out)
+
+
+def _wrap(view: sublime.View | None, content: str, md: bool, css: str | None, wrapper_class: str | None) -> str:
+    body = md2html(view, content) if md else content
+    if wrapper_class:
+        body = f'<div class="{wrapper_class}">{body}</div>'
+    return f'<body id="mdpopups"><style>{css or ""}</style>{body}</body>'
+
+
+def show_popup(
+    view: sublime.View,
+    content: str,
+    md: bool = True,
+    css: str | None = None,
+    flags: int = 0,
+    location: int = -1,
+    max_width: int = 320,
+    max_height: int = 240,
+    on_navigate: Any = None,
+    on_hide: Any = None,
+    wrapper_class: str | None = None,
+    **kwargs: Any,
+) -> None:
+    view.show_popup(_wrap(view, content, md, css, wrapper_class), flags, location, max_width)
+
+
+def update_popup(
+    view: sublime.View,
+    content: str,
+    md: bool = True,
+    css: str | None = None,
+    wrapper_class: str | None = None,
+    **kwargs: Any,
+) -> None:
+    view.update_popup(_wrap(view, content, md, css, wrapper_class))
+
+
+def hide_popup(view: sublime.View) -> None:
+    view.hide_popup()
+
+
+def is_popup_visible(view: sublime.View) -> bool:
+    return view.is_popup_visible()
+
+
+def new_html_sheet(
+    window: sublime.Window,
+    name: str,
+    contents: str,
+    md: bool = True,
+    css: str | None = None,
+    flags: int = 0,
+    group: int = -1,
+    wrapper_class: str | None = None,
+    **kwargs: Any,
+) -> sublime.HtmlSheet:
+    return window.new_html_sheet(name, _wrap(window.active_view(), contents, md, css, wrapper_class), flags, group)
+
+
+def update_html_sheet(
+    sheet: sublime.HtmlSheet,
+    contents: str,
+    md: bool = True,
+    css: str | None = None,
+    wrapper_class: str | None = None,
+    **kwargs: Any,
+) -> None:
+    window = sheet.window()
+    sheet.set_contents(_wrap(window.active_view() if window else None, contents, md, css, wrapper_class))
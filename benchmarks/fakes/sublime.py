@@ -0,0 +1,997 @@
+"""
+An in-memory stand-in for Sublime Text's `sublime` module.
+
+Only the API surface used by LSP-copilot is implemented, but it is implemented faithfully:
+settings are deep-copied on every access (like ST's JSON round trip), the buffer keeps a
+change counter, positions are converted through UTF-16 code units and timeouts are queued
+on an event loop which the benchmark driver pumps.
+"""
+
+from __future__ import annotations
+
+import bisect
+import copy
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+# --------- #
+# constants #
+# --------- #
+
+OP_EQUAL = 0
+OP_NOT_EQUAL = 1
+OP_REGEX_MATCH = 2
+OP_NOT_REGEX_MATCH = 3
+OP_REGEX_CONTAINS = 4
+OP_NOT_REGEX_CONTAINS = 5
+
+LAYOUT_INLINE = 0
+LAYOUT_BELOW = 1
+LAYOUT_BLOCK = 2
+
+COOPERATE_WITH_AUTO_COMPLETE = 2
+HIDE_ON_MOUSE_MOVE = 4
+HIDE_ON_MOUSE_MOVE_AWAY = 8
+
+TRANSIENT = 4
+ADD_TO_SELECTION = 16
+
+# ---------- #
+# event loop #
+# ---------- #
+
+
+class _EventLoop:
+    """A thread-safe timer queue. Both the "main" and "async" threads of ST are served by it."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Condition()
+        self._queue: list[tuple[float, int, Callable[[], Any]]] = []
+        self._seq = itertools.count()
+
+    def call_later(self, callback: Callable[[], Any], delay_ms: float = 0) -> None:
+        with self._lock:
+            heapq.heappush(self._queue, (time.perf_counter() + delay_ms / 1000, next(self._seq), callback))
+            self._lock.notify_all()
+
+    def run_pending(self) -> int:
+        """Runs all callbacks that are due. Returns how many callbacks have been run."""
+        count = 0
+        while True:
+            with self._lock:
+                if not self._queue or self._queue[0][0] > time.perf_counter():
+                    return count
+                _, _, callback = heapq.heappop(self._queue)
+            callback()
+            count += 1
+
+    def pump(self, seconds: float) -> None:
+        """Runs the loop for `seconds` of wall time."""
+        deadline = time.perf_counter() + seconds
+        while (now := time.perf_counter()) < deadline:
+            self.run_pending()
+            with self._lock:
+                timeout = deadline - now
+                if self._queue:
+                    timeout = min(timeout, max(0.0, self._queue[0][0] - now))
+                self._lock.wait(timeout)
+        self.run_pending()
+
+    def pump_until(self, predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() >= deadline:
+                return False
+            self.pump(0.001)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queue.clear()
+
+
+loop = _EventLoop()
+
+
+def set_timeout(callback: Callable[[], Any], delay: float = 0) -> None:
+    loop.call_later(callback, delay)
+
+
+def set_timeout_async(callback: Callable[[], Any], delay: float = 0) -> None:
+    loop.call_later(callback, delay)
+
+
+# ------- #
+# regions #
+# ------- #
+
+
+class Region:
+    __slots__ = ("a", "b", "xpos")
+
+    def __init__(self, a: int, b: int | None = None, xpos: int = -1) -> None:
+        self.a = a
+        self.b = a if b is None else b
+        self.xpos = xpos
+
+    def __repr__(self) -> str:
+        return f"Region({self.a}, {self.b})"
+
+    def __eq__(self, rhs: object) -> bool:
+        return isinstance(rhs, Region) and self.a == rhs.a and self.b == rhs.b
+
+    def __len__(self) -> int:
+        return self.size()
+
+    def __bool__(self) -> bool:
+        return True
+
+    def begin(self) -> int:
+        return min(self.a, self.b)
+
+    def end(self) -> int:
+        return max(self.a, self.b)
+
+    def size(self) -> int:
+        return abs(self.a - self.b)
+
+    def empty(self) -> bool:
+        return self.a == self.b
+
+    def to_tuple(self) -> tuple[int, int]:
+        return (self.a, self.b)
+
+    def contains(self, x: int | Region) -> bool:
+        if isinstance(x, Region):
+            return self.contains(x.a) and self.contains(x.b)
+        return self.begin() <= x <= self.end()
+
+
+class Selection:
+    def __init__(self, view: View) -> None:
+        self._view = view
+        self._regions: list[Region] = [Region(0)]
+
+    def __len__(self) -> int:
+        return len(self._regions)
+
+    def __getitem__(self, index: int) -> Region:
+        return Region(self._regions[index].a, self._regions[index].b)
+
+    def __iter__(self):
+        return iter(list(self._regions))
+
+    def clear(self) -> None:
+        self._regions = []
+
+    def add(self, region: Region | int) -> None:
+        if isinstance(region, int):
+            region = Region(region)
+        self._regions.append(Region(region.a, region.b))
+        self._view._notify("on_selection_modified_async")
+
+    def add_all(self, regions: Iterable[Region]) -> None:
+        for region in regions:
+            self.add(region)
+
+
+# -------- #
+# settings #
+# -------- #
+
+
+class Settings:
+    def __init__(self, initial: dict[str, Any] | None = None) -> None:
+        self._data: dict[str, Any] = copy.deepcopy(initial or {})
+        self._on_change: dict[str, Callable[[], None]] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.reads += 1
+        # ST round-trips values through its own JSON-like storage, so the caller always gets a copy
+        return copy.deepcopy(self._data.get(key, default))
+
+    def has(self, key: str) -> bool:
+        return key in self._data
+
+    def set(self, key: str, value: Any) -> None:
+        self.writes += 1
+        self._data[key] = copy.deepcopy(value)
+        self._fire_on_change()
+
+    def erase(self, key: str) -> None:
+        self._data.pop(key, None)
+        self._fire_on_change()
+
+    def update(self, other: dict[str, Any]) -> None:
+        for key, value in other.items():
+            self._data[key] = copy.deepcopy(value)
+        self._fire_on_change()
+
+    def to_dict(self) -> dict[str, Any]:
+        return copy.deepcopy(self._data)
+
+    def add_on_change(self, tag: str, callback: Callable[[], None]) -> None:
+        self._on_change[tag] = callback
+
+    def clear_on_change(self, tag: str) -> None:
+        self._on_change.pop(tag, None)
+
+    def serialized_size(self) -> int:
+        """How many bytes these settings would take in a `.sublime_session` file."""
+        return len(json.dumps(self._data, ensure_ascii=False).encode("utf-8"))
+
+    def _fire_on_change(self) -> None:
+        for callback in tuple(self._on_change.values()):
+            callback()
+
+    # `jmespath` searches mapping-like objects
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def keys(self):
+        return self._data.keys()
+
+    def items(self):
+        return self._data.items()
+
+
+_global_settings: dict[str, Settings] = {}
+
+
+def load_settings(base_name: str) -> Settings:
+    if base_name not in _global_settings:
+        data: dict[str, Any] = {}
+        for name, root in PACKAGE_ROOTS.items():
+            path = os.path.join(root, base_name)
+            if os.path.isfile(path):
+                data = decode_value(open(path, encoding="utf-8").read())
+                break
+        _global_settings[base_name] = Settings(data)
+    return _global_settings[base_name]
+
+
+def save_settings(base_name: str) -> None:
+    pass
+
+
+# --------- #
+# resources #
+# --------- #
+
+PACKAGE_ROOTS: dict[str, str] = {}
+"""Maps a package name to the directory on disk which serves `Packages/<name>/...` resources."""
+
+_CACHE_DIR = tempfile.mkdtemp(prefix="lsp-copilot-bench-cache-")
+
+
+def load_resource(name: str) -> str:
+    return load_binary_resource(name).decode("utf-8")
+
+
+def load_binary_resource(name: str) -> bytes:
+    _, package, rest = name.split("/", 2)
+    if package == "Cache":
+        path = os.path.join(_CACHE_DIR, rest)
+    elif package in PACKAGE_ROOTS:
+        path = os.path.join(PACKAGE_ROOTS[package], rest)
+    else:
+        raise FileNotFoundError(name)
+    return Path(path).read_bytes()
+
+
+def find_resources(pattern: str) -> list[str]:
+    # like ST, the pattern is matched against file names
+    return [
+        f"Packages/{package}/{Path(path).relative_to(root).as_posix()}"
+        for package, root in PACKAGE_ROOTS.items()
+        for path in sorted(Path(root).rglob(pattern))
+        if ".git" not in Path(path).relative_to(root).parts
+    ]
+
+
+def cache_path() -> str:
+    return _CACHE_DIR
+
+
+def packages_path() -> str:
+    return os.path.dirname(next(iter(PACKAGE_ROOTS.values()), _CACHE_DIR))
+
+
+def installed_packages_path() -> str:
+    return packages_path()
+
+
+def version() -> str:
+    return "4180"
+
+
+def platform() -> str:
+    return "linux"
+
+
+def arch() -> str:
+    return "x64"
+
+
+def decode_value(data: str) -> Any:
+    """A tolerant JSON decoder which accepts comments and trailing commas like ST does."""
+    out = []
+    i, n = 0, len(data)
+    in_string = False
+    while i < n:
+        c = data[i]
+        if in_string:
+            out.append(c)
+            if c == "\\":
+                out.append(data[i + 1])
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+            out.append(c)
+        elif data.startswith("//", i):
+            while i < n and data[i] != "\n":
+                i += 1
+            continue
+        elif data.startswith("/*", i):
+            i = data.index("*/", i) + 2
+            continue
+        else:
+            out.append(c)
+        i += 1
+    text = "".join(out)
+    text = _strip_trailing_commas(text)
+    return json.loads(text)
+
+
+def _strip_trailing_commas(text: str) -> str:
+    out = []
+    in_string = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            out.append(c)
+            if c == "\\":
+                out.append(text[i + 1])
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+            out.append(c)
+        elif c == ",":
+            j = i + 1
+            while j < len(text) and text[j] in " \t\r\n":
+                j += 1
+            if j < len(text) and text[j] in "]}":
+                i += 1
+                continue
+            out.append(c)
+        else:
+            out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def encode_value(value: Any, pretty: bool = False) -> str:
+    return json.dumps(value, indent=4 if pretty else None)
+
+
+def expand_variables(value: Any, variables: dict[str, str]) -> Any:
+    if isinstance(value, str):
+        for key, var in variables.items():
+            value = value.replace(f"${{{key}}}", var).replace(f"${key}", var)
+    return value
+
+
+def command_url(cmd: str, args: dict[str, Any] | None = None) -> str:
+    if args is None:
+        return f"subl:{cmd}"
+    return f"subl:{cmd} {json.dumps(args)}"
+
+
+def score_selector(scope_name: str, selector: str) -> int:
+    for part in selector.split("|"):
+        part = part.strip()
+        if part and scope_name.startswith(part):
+            return len(part)
+    return 0
+
+
+# ---------- #
+# UI helpers #
+# ---------- #
+
+messages: list[str] = []
+clipboard = ""
+
+
+def status_message(msg: str) -> None:
+    messages.append(msg)
+
+
+def message_dialog(msg: str) -> None:
+    messages.append(msg)
+
+
+def error_message(msg: str) -> None:
+    messages.append(msg)
+
+
+def ok_cancel_dialog(msg: str, ok_title: str = "", title: str = "") -> bool:
+    messages.append(msg)
+    return True
+
+
+def set_clipboard(text: str) -> None:
+    global clipboard
+    clipboard = text
+
+
+def get_clipboard() -> str:
+    return clipboard
+
+
+def run_command(cmd: str, args: dict[str, Any] | None = None) -> None:
+    pass
+
+
+# ------------------------------ #
+# windows, views, sheets, phantoms #
+# ------------------------------ #
+
+_ids = itertools.count(1)
+_windows: list[Window] = []
+_active_window: Window | None = None
+
+
+def windows() -> list[Window]:
+    return list(_windows)
+
+
+def active_window() -> Window:
+    global _active_window
+    if _active_window is None:
+        _active_window = Window()
+    return _active_window
+
+
+class Buffer:
+    def __init__(self) -> None:
+        self.buffer_id = next(_ids)
+
+    def id(self) -> int:
+        return self.buffer_id
+
+
+class _Text:
+    """The text of a buffer with a line index, so that row/column conversions are cheap."""
+
+    def __init__(self, text: str = "") -> None:
+        self.set(text)
+
+    def set(self, text: str) -> None:
+        self.text = text
+        self.line_starts = [0]
+        self.line_starts.extend(i + 1 for i, c in enumerate(text) if c == "\n")
+
+    def replace(self, begin: int, end: int, new_text: str) -> None:
+        text = self.text[:begin] + new_text + self.text[end:]
+        # re-index only from the touched line onwards
+        row = bisect.bisect_right(self.line_starts, begin) - 1
+        del self.line_starts[row + 1 :]
+        start = self.line_starts[row]
+        self.text = text
+        idx = text.find("\n", start)
+        while idx != -1:
+            self.line_starts.append(idx + 1)
+            idx = text.find("\n", idx + 1)
+
+    def row_of(self, point: int) -> int:
+        return bisect.bisect_right(self.line_starts, point) - 1
+
+    def line_end(self, row: int) -> int:
+        if row + 1 < len(self.line_starts):
+            return self.line_starts[row + 1] - 1
+        return len(self.text)
+
+
+def _utf16_len(text: str) -> int:
+    return len(text) + sum(1 for c in text if ord(c) > 0xFFFF)
+
+
+class View:
+    def __init__(self, window: Window | None = None, *, text: str = "", file_name: str | None = None) -> None:
+        self.view_id = next(_ids)
+        self._window = window
+        self._buffer = Buffer()
+        self._text = _Text(text)
+        self._file_name = file_name
+        self._name = ""
+        self._change_count = 0
+        self._valid = True
+        self._read_only = False
+        self._scope = "source.python"
+        self._region_scopes: list[tuple[Region, str]] = []
+        self._settings = Settings({
+            "tab_size": 4,
+            "translate_tabs_to_spaces": True,
+            "line_padding_top": 0,
+            "line_padding_bottom": 0,
+            "auto_complete_cycle": False,
+            "animation_enabled": False,
+        })
+        self.sel_ = Selection(self)
+        self.popup_content: str | None = None
+        self.popup_updates = 0
+        self.phantom_sets: dict[str, list[Phantom]] = {}
+        self.modification_listeners: list[Callable[[View], None]] = []
+
+    def __repr__(self) -> str:
+        return f"View({self.view_id})"
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, View) and other.view_id == self.view_id
+
+    def __hash__(self) -> int:
+        return self.view_id
+
+    # identity
+    def id(self) -> int:
+        return self.view_id
+
+    def buffer(self) -> Buffer:
+        return self._buffer
+
+    def buffer_id(self) -> int:
+        return self._buffer.id()
+
+    def is_valid(self) -> bool:
+        return self._valid
+
+    def is_primary(self) -> bool:
+        return True
+
+    def element(self) -> str | None:
+        return None
+
+    def window(self) -> Window | None:
+        return self._window if self._valid else None
+
+    def file_name(self) -> str | None:
+        return self._file_name
+
+    def name(self) -> str:
+        return self._name
+
+    def set_name(self, name: str) -> None:
+        self._name = name
+
+    def settings(self) -> Settings:
+        return self._settings
+
+    def is_read_only(self) -> bool:
+        return self._read_only
+
+    def set_read_only(self, value: bool) -> None:
+        self._read_only = value
+
+    def set_scratch(self, value: bool) -> None:
+        pass
+
+    def is_dirty(self) -> bool:
+        return self._change_count > 0
+
+    def is_loading(self) -> bool:
+        return False
+
+    def change_count(self) -> int:
+        return self._change_count
+
+    def assign_syntax(self, syntax: str) -> None:
+        pass
+
+    def set_scope(self, scope: str, region: Region | None = None) -> None:
+        """Set the scope of the whole view, or only of the points in `region`, e.g., for embedded languages."""
+        if region is None:
+            self._scope = scope
+        else:
+            self._region_scopes.append((region, scope))
+
+    def _scope_at(self, point: int) -> str:
+        for region, scope in reversed(self._region_scopes):
+            if region.begin() <= point <= region.end():
+                return scope
+        return self._scope
+
+    # text
+    def size(self) -> int:
+        return len(self._text.text)
+
+    def substr(self, x: Region | int) -> str:
+        if isinstance(x, Region):
+            return self._text.text[x.begin() : x.end()]
+        return self._text.text[x : x + 1]
+
+    def sel(self) -> Selection:
+        return self.sel_
+
+    def line(self, x: Region | int) -> Region:
+        if isinstance(x, Region):
+            begin = self.line(x.begin()).begin()
+            end = self.line(x.end()).end()
+            return Region(begin, end)
+        row = self._text.row_of(x)
+        return Region(self._text.line_starts[row], self._text.line_end(row))
+
+    def full_line(self, x: Region | int) -> Region:
+        line = self.line(x)
+        return Region(line.begin(), min(line.end() + 1, self.size()))
+
+    def lines(self, region: Region) -> list[Region]:
+        out = []
+        point = region.begin()
+        while True:
+            line = self.line(point)
+            out.append(line)
+            if line.end() >= region.end() or line.end() >= self.size():
+                return out
+            point = line.end() + 1
+
+    def rowcol(self, point: int) -> tuple[int, int]:
+        row = self._text.row_of(point)
+        return row, point - self._text.line_starts[row]
+
+    def rowcol_utf16(self, point: int) -> tuple[int, int]:
+        row = self._text.row_of(point)
+        start = self._text.line_starts[row]
+        return row, _utf16_len(self._text.text[start:point])
+
+    def text_point(self, row: int, col: int) -> int:
+        row = min(max(row, 0), len(self._text.line_starts) - 1)
+        start = self._text.line_starts[row]
+        return min(start + col, self._text.line_end(row))
+
+    def text_point_utf16(self, row: int, col: int, *, clamp_column: bool = True) -> int:
+        row = min(max(row, 0), len(self._text.line_starts) - 1)
+        start = self._text.line_starts[row]
+        end = self._text.line_end(row)
+        point, units = start, 0
+        while point < end and units < col:
+            units += 2 if ord(self._text.text[point]) > 0xFFFF else 1
+            point += 1
+        return point
+
+    def scope_name(self, point: int) -> str:
+        return f"{self._scope_at(point)} "
+
+    def match_selector(self, point: int, selector: str) -> bool:
+        return bool(score_selector(self._scope_at(point), selector))
+
+    def visible_region(self) -> Region:
+        return Region(0, min(self.size(), 4000))
+
+    def show(self, x: Any, show_surrounds: bool = True, keep_to_left: bool = False, animate: bool = True) -> None:
+        pass
+
+    def show_at_center(self, x: Any, animate: bool = True) -> None:
+        pass
+
+    # editing
+    def _modify(self, begin: int, end: int, text: str) -> None:
+        if self._read_only:
+            return
+        self._text.replace(begin, end, text)
+        self._change_count += 1
+        delta = len(text) - (end - begin)
+        regions = []
+        for region in self.sel_._regions:
+            a, b = region.a, region.b
+            if a >= end:
+                a += delta
+            elif a > begin:
+                a = begin + len(text)
+            if b >= end:
+                b += delta
+            elif b > begin:
+                b = begin + len(text)
+            regions.append(Region(a, b))
+        self.sel_._regions = regions
+        for listener in tuple(self.modification_listeners):
+            listener(self)
+        self._notify("on_modified_async")
+        self._notify("on_selection_modified_async")
+
+    def insert(self, edit: Edit, point: int, text: str) -> int:
+        self._modify(point, point, text)
+        return len(text)
+
+    def erase(self, edit: Edit, region: Region) -> None:
+        self._modify(region.begin(), region.end(), "")
+
+    def replace(self, edit: Edit, region: Region, text: str) -> None:
+        self._modify(region.begin(), region.end(), text)
+
+    def run_command(self, cmd: str, args: dict[str, Any] | None = None) -> None:
+        args = args or {}
+        if cmd == "insert":
+            # typed text replaces every selection and leaves the caret behind it
+            for region in reversed(list(self.sel_._regions)):
+                self._modify(region.begin(), region.end(), args["characters"])
+            return
+        if cmd == "append":
+            self._modify(self.size(), self.size(), args["characters"])
+            return
+        import sublime_plugin
+
+        sublime_plugin.run_text_command(self, cmd, args)
+
+    # popups
+    def show_popup(self, content: str, flags: int = 0, location: int = -1, max_width: int = 320, **kwargs) -> None:
+        self.popup_content = content
+
+    def update_popup(self, content: str) -> None:
+        self.popup_content = content
+        self.popup_updates += 1
+
+    def hide_popup(self) -> None:
+        self.popup_content = None
+
+    def is_popup_visible(self) -> bool:
+        return self.popup_content is not None
+
+    def is_auto_complete_visible(self) -> bool:
+        return False
+
+    def style(self) -> dict[str, str]:
+        return {"background": "#202020", "foreground": "#f0f0f0"}
+
+    def close(self) -> bool:
+        if self._window:
+            self._window._close_view(self)
+        return True
+
+    def _notify(self, event: str) -> None:
+        import sublime_plugin
+
+        sublime_plugin.dispatch_view_event(self, event)
+
+
+class Edit:
+    def __init__(self, token: int = 0) -> None:
+        self.edit_token = token
+
+
+class Sheet:
+    def __init__(self, window: Window, group: int) -> None:
+        self.sheet_id = next(_ids)
+        self._window: Window | None = window
+        self._group = group
+
+    def id(self) -> int:
+        return self.sheet_id
+
+    def window(self) -> Window | None:
+        return self._window
+
+    def group(self) -> int:
+        return self._group
+
+    def view(self) -> View | None:
+        return None
+
+    def close(self, on_close: Callable[[bool], None] | None = None) -> None:
+        if self._window:
+            self._window._close_sheet(self)
+
+
+class HtmlSheet(Sheet):
+    def __init__(self, window: Window, group: int, name: str, contents: str) -> None:
+        super().__init__(window, group)
+        self._name = name
+        self.contents = contents
+        self.updates = 0
+
+    def name(self) -> str:
+        return self._name
+
+    def set_name(self, name: str) -> None:
+        self._name = name
+
+    def set_contents(self, contents: str) -> None:
+        self.contents = contents
+        self.updates += 1
+
+
+class Window:
+    def __init__(self) -> None:
+        global _active_window
+        self.window_id = next(_ids)
+        self._views: list[View] = []
+        self._sheets: list[Sheet] = []
+        self._transient: dict[int, Sheet] = {}
+        self._layout: dict[str, Any] = {"cols": [0.0, 1.0], "rows": [0.0, 1.0], "cells": [[0, 0, 1, 1]]}
+        self._active_group = 0
+        self._active_view: View | None = None
+        self._settings = Settings()
+        self._folders: list[str] = []
+        self._valid = True
+        self.input_panel: tuple[str, str, Callable[[str], Any]] | None = None
+        _windows.append(self)
+        if _active_window is None:
+            _active_window = self
+
+    def __repr__(self) -> str:
+        return f"Window({self.window_id})"
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Window) and other.window_id == self.window_id
+
+    def __hash__(self) -> int:
+        return self.window_id
+
+    def id(self) -> int:
+        return self.window_id
+
+    def is_valid(self) -> bool:
+        return self._valid
+
+    def settings(self) -> Settings:
+        return self._settings
+
+    def folders(self) -> list[str]:
+        return list(self._folders)
+
+    def extract_variables(self) -> dict[str, str]:
+        return {"packages": packages_path(), "platform": "Linux"}
+
+    def views(self, *, include_transient: bool = False) -> list[View]:
+        return list(self._views)
+
+    def sheets(self) -> list[Sheet]:
+        return list(self._sheets)
+
+    def new_file(self, *, text: str = "", file_name: str | None = None) -> View:
+        view = View(self, text=text, file_name=file_name)
+        self._views.append(view)
+        self._sheets.append(Sheet(self, 0))
+        self.focus_view(view)
+        return view
+
+    def new_html_sheet(self, name: str, contents: str, flags: int = 0, group: int = -1) -> HtmlSheet:
+        group = self._active_group if group < 0 else group
+        sheet = HtmlSheet(self, group, name, contents)
+        if flags & TRANSIENT:
+            self._transient[group] = sheet
+        else:
+            self._sheets.append(sheet)
+        return sheet
+
+    def transient_sheet_in_group(self, group: int) -> Sheet | None:
+        return self._transient.get(group)
+
+    def active_sheet(self) -> Sheet | None:
+        return self._transient.get(self._active_group)
+
+    def num_groups(self) -> int:
+        return len(self._layout["cells"])
+
+    def active_group(self) -> int:
+        return self._active_group
+
+    def focus_group(self, group: int) -> None:
+        self._active_group = group
+
+    def active_view(self) -> View | None:
+        return self._active_view
+
+    def focus_view(self, view: View) -> None:
+        if self._active_view is view:
+            return
+        if self._active_view is not None:
+            self._active_view._notify("on_deactivated_async")
+        self._active_view = view
+        view._notify("on_activated_async")
+
+    def layout(self) -> dict[str, Any]:
+        return copy.deepcopy(self._layout)
+
+    def set_layout(self, layout: dict[str, Any]) -> None:
+        self._layout = copy.deepcopy(layout)
+
+    def show_input_panel(self, caption: str, initial_text: str, on_done, on_change, on_cancel) -> View:
+        # the driver "types" into the input panel by calling `on_done` itself
+        self.input_panel = (caption, initial_text, on_done)
+        return View(self)
+
+    def show_quick_panel(self, items, on_select, flags: int = 0, selected_index: int = -1, on_highlight=None) -> None:
+        pass
+
+    def create_output_panel(self, name: str, unlisted: bool = False) -> View:
+        return View(self)
+
+    def destroy_output_panel(self, name: str) -> None:
+        pass
+
+    def run_command(self, cmd: str, args: dict[str, Any] | None = None) -> None:
+        import sublime_plugin
+
+        sublime_plugin.run_window_command(self, cmd, args or {})
+
+    def _close_view(self, view: View) -> None:
+        view._notify("on_pre_close")
+        if view in self._views:
+            self._views.remove(view)
+        if self._active_view is view:
+            self._active_view = self._views[-1] if self._views else None
+        view._valid = False
+        view._notify("on_close")
+
+    def _close_sheet(self, sheet: Sheet) -> None:
+        sheet._window = None
+        for group, transient in tuple(self._transient.items()):
+            if transient is sheet:
+                del self._transient[group]
+        if sheet in self._sheets:
+            self._sheets.remove(sheet)
+
+    def close(self) -> None:
+        for view in tuple(self._views):
+            self._close_view(view)
+        self._valid = False
+        if self in _windows:
+            _windows.remove(self)
+
+
+class Phantom:
+    def __init__(self, region: Region, content: str, layout: int, on_navigate=None) -> None:
+        self.region = region
+        self.content = content
+        self.layout = layout
+
+    def __eq__(self, rhs: object) -> bool:
+        return (
+            isinstance(rhs, Phantom)
+            and self.region == rhs.region
+            and self.content == rhs.content
+            and self.layout == rhs.layout
+        )
+
+
+class PhantomSet:
+    def __init__(self, view: View, key: str = "") -> None:
+        self.view = view
+        self.key = key
+        self.phantoms: list[Phantom] = []
+        self.updates = 0
+
+    def update(self, phantoms: list[Phantom]) -> None:
+        self.phantoms = list(phantoms)
+        self.view.phantom_sets[self.key] = self.phantoms
+        self.updates += 1
+
+
+def reset() -> None:
+    """Forgets every window, view and global setting. Used between benchmark scenarios."""
+    global _active_window
+    for window in tuple(_windows):
+        window.close()
+    _windows.clear()
+    _active_window = None
+    _global_settings.clear()
+    loop.clear()
+    messages.clear()
@@ -0,0 +1,159 @@
+"""An in-memory stand-in for Sublime Text's `sublime_plugin` module."""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+import sublime
+
+view_event_listener_classes: list[type[ViewEventListener]] = []
+event_listeners: list[EventListener] = []
+text_command_classes: dict[str, type[TextCommand]] = {}
+window_command_classes: dict[str, type[WindowCommand]] = {}
+application_command_classes: dict[str, type[ApplicationCommand]] = {}
+
+_view_event_listeners: dict[int, list[ViewEventListener]] = {}
+
+
+def command_name(cls: type) -> str:
+    name = cls.__name__
+    if name.endswith("Command"):
+        name = name[: -len("Command")]
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def register(*objects: Any) -> None:
+    """Registers command classes and event listener classes/instances, like ST does for a plugin module."""
+    for obj in objects:
+        if isinstance(obj, type):
+            if issubclass(obj, ViewEventListener):
+                view_event_listener_classes.append(obj)
+            elif issubclass(obj, EventListener):
+                event_listeners.append(obj())
+            elif issubclass(obj, TextCommand):
+                text_command_classes[command_name(obj)] = obj
+            elif issubclass(obj, WindowCommand):
+                window_command_classes[command_name(obj)] = obj
+            elif issubclass(obj, ApplicationCommand):
+                application_command_classes[command_name(obj)] = obj
+
+
+def reset() -> None:
+    view_event_listener_classes.clear()
+    event_listeners.clear()
+    text_command_classes.clear()
+    window_command_classes.clear()
+    application_command_classes.clear()
+    _view_event_listeners.clear()
+
+
+def _listeners_for(view: sublime.View) -> list[ViewEventListener]:
+    if (listeners := _view_event_listeners.get(view.id())) is None:
+        listeners = _view_event_listeners[view.id()] = [cls(view) for cls in view_event_listener_classes]
+    return listeners
+
+
+def dispatch_view_event(view: sublime.View, event: str) -> None:
+    def run() -> None:
+        for listener in _listeners_for(view):
+            if handler := getattr(listener, event, None):
+                handler()
+        for listener in event_listeners:
+            if handler := getattr(listener, event, None):
+                handler(view)
+        if event == "on_close":
+            _view_event_listeners.pop(view.id(), None)
+
+    if event.endswith("_async"):
+        sublime.set_timeout_async(run)
+    else:
+        run()
+
+
+def query_context(view: sublime.View, key: str, operator: int = sublime.OP_EQUAL, operand: Any = True) -> bool:
+    for listener in _listeners_for(view):
+        if (result := listener.on_query_context(key, operator, operand, False)) is not None:
+            return bool(result)
+    if key.startswith("setting."):
+        value = view.settings().get(key[len("setting.") :])
+        return (value == operand) if operator == sublime.OP_EQUAL else (value != operand)
+    return False
+
+
+def run_text_command(view: sublime.View, name: str, args: dict[str, Any]) -> None:
+    if not (cls := text_command_classes.get(name)):
+        return
+    command = cls(view)
+    command.run(sublime.Edit(), **args)
+    for listener in _listeners_for(view):
+        if handler := getattr(listener, "on_post_text_command", None):
+            handler(name, args)
+
+
+def run_window_command(window: sublime.Window, name: str, args: dict[str, Any]) -> None:
+    for listener in event_listeners:
+        if (handler := getattr(listener, "on_window_command", None)) and handler(window, name, args):
+            return
+    if cls := window_command_classes.get(name):
+        cls(window).run(**args)
+
+
+class CommandInputHandler:
+    pass
+
+
+class TextInputHandler(CommandInputHandler):
+    pass
+
+
+class ListInputHandler(CommandInputHandler):
+    pass
+
+
+class Command:
+    def name(self) -> str:
+        return command_name(type(self))
+
+    def is_enabled(self, *args: Any, **kwargs: Any) -> bool:
+        return True
+
+    def is_visible(self, *args: Any, **kwargs: Any) -> bool:
+        return True
+
+    def input(self, args: dict[str, Any]) -> CommandInputHandler | None:
+        return None
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class WindowCommand(Command):
+    def __init__(self, window: sublime.Window) -> None:
+        self.window = window
+
+
+class TextCommand(Command):
+    def __init__(self, view: sublime.View) -> None:
+        self.view = view
+
+    def want_event(self) -> bool:
+        return False
+
+
+class EventListener:
+    pass
+
+
+class ViewEventListener:
+    def __init__(self, view: sublime.View) -> None:
+        self.view = view
+
+    @classmethod
+    def is_applicable(cls, settings: sublime.Settings) -> bool:
+        return True
+
+    @classmethod
+    def applies_to_primary_view_only(cls) -> bool:
+        return True
@@ -0,0 +1,111 @@
+"""
+Loads LSP-copilot against the in-memory fakes and wires it to a stub server process.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import types
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(HERE)
+PACKAGE_NAME = "LSP-copilot"
+
+sys.path.insert(0, os.path.join(HERE, "fakes"))
+
+import sublime  # noqa: E402
+import sublime_plugin  # noqa: E402
+from LSP.plugin import ClientConfig, DottedDict  # noqa: E402
+from LSP.plugin.core.sessions import Session  # noqa: E402
+from lsp_utils import ApiWrapperInterface  # noqa: E402
+
+sublime.PACKAGE_ROOTS[PACKAGE_NAME] = REPO_ROOT
+
+
+def load_plugin() -> types.ModuleType:
+    if PACKAGE_NAME not in sys.modules:
+        package = types.ModuleType(PACKAGE_NAME)
+        package.__path__ = [REPO_ROOT]  # type: ignore
+        sys.modules[PACKAGE_NAME] = package
+    module = importlib.import_module(f"{PACKAGE_NAME}.plugin")
+    return module
+
+
+def plugin_module(name: str) -> types.ModuleType:
+    load_plugin()
+    return importlib.import_module(f"{PACKAGE_NAME}.plugin.{name}")
+
+
+def reset() -> None:
+    """Forgets every window and view, as well as callbacks pending on the plugin's scheduler."""
+    # the settings snapshot follows changes of settings which are about to be forgotten
+    plugin_module("settings").forget_settings_snapshot()
+    sublime.reset()
+    plugin_module("scheduler").scheduler.clear()
+
+
+def default_session_settings() -> dict[str, Any]:
+    path = Path(REPO_ROOT, f"{PACKAGE_NAME}.sublime-settings")
+    return sublime.decode_value(path.read_text(encoding="utf-8"))["settings"]
+
+
+@dataclass
+class Editor:
+    window: Any
+    view: Any
+    session: Any
+    plugin: Any
+    module: Any
+    extra_views: list[Any] = field(default_factory=list)
+
+    def type(self, text: str) -> None:
+        self.view.run_command("insert", {"characters": text})
+
+    def close(self) -> None:
+        self.session.end()
+
+
+def open_editor(
+    text: str = "",
+    *,
+    settings: dict[str, Any] | None = None,
+    server_args: list[str] | None = None,
+    file_name: str = "/tmp/bench/example.py",
+) -> Editor:
+    module = load_plugin()
+    sublime_plugin.reset()
+    sublime_plugin.register(
+        *(getattr(module, name) for name in module.__all__ if isinstance(getattr(module, name), type))
+    )
+
+    reset()
+    window = sublime.Window()
+    view = window.new_file(text=text, file_name=file_name)
+    view.sel().clear()
+    view.sel().add(sublime.Region(view.size()))
+
+    session_settings = default_session_settings()
+    session_settings.update(settings or {})
+    config = ClientConfig(PACKAGE_NAME, DottedDict(session_settings))
+    server = [sys.executable, os.path.join(HERE, "stub_server.py"), *(server_args or [])]
+    session = Session(window, config, server)
+
+    client_cls = module.CopilotPlugin
+    # avoid reaching the network for the avatar of the stub server's user
+    plugin_module("helpers").GithubInfo.fetch_avatar = classmethod(lambda cls, username, *, size=64: None)
+    client_cls.setup()
+    client_cls.can_start(window, view, [], config)
+    plugin = client_cls(weakref.ref(session))
+    session.plugin = plugin
+    session.attach_view(view)
+    plugin.on_settings_changed(config.settings)
+    plugin.on_ready(ApiWrapperInterface(session))
+    sublime.loop.pump_until(lambda: client_cls.get_account_status().is_authorized, 5)
+    sublime.loop.pump(0.05)
+    return Editor(window, view, session, plugin, module)
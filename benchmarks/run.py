@@ -0,0 +1,568 @@
+"""
+Offline benchmarks of LSP-copilot.
+
+The plugin is loaded against the in-memory fakes of `sublime`, `sublime_plugin`, `LSP` and `lsp_utils` in
+`benchmarks/fakes/` and talks JSON-RPC to `benchmarks/stub_server.py`, so neither Sublime Text nor the network
+is needed. Every metric is "lower is better", which lets `--baseline` gate regressions.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --json baseline.json
+    python benchmarks/run.py --baseline baseline.json --tolerance 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import shutil
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict
+
+from harness import open_editor, plugin_module, reset, sublime
+
+Metrics = Dict[str, float]
+
+SAMPLE_TEXT = "import os\n\n\ndef main():\n    "
+
+
+# ------- #
+# helpers #
+# ------- #
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """The nearest-rank percentile of `values`."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+@contextmanager
+def track_allocations(metrics: Metrics, *, enabled: bool = True) -> Generator[None, None, None]:
+    """Records the peak and the retained memory allocated by Python code in the block, in KiB."""
+    if not enabled:
+        yield
+        return
+    tracemalloc.start()
+    try:
+        yield
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    metrics["alloc_peak_kib"] = round(peak / 1024, 1)
+    metrics["alloc_retained_kib"] = round(current / 1024, 1)
+
+
+@contextmanager
+def count_threads() -> Generator[list[int], None, None]:
+    """Counts threads started in the block."""
+    counter = [0]
+    original_start = threading.Thread.start
+
+    def start(self: threading.Thread) -> None:
+        counter[0] += 1
+        original_start(self)
+
+    threading.Thread.start = start  # type: ignore
+    try:
+        yield counter
+    finally:
+        threading.Thread.start = original_start  # type: ignore
+
+
+@contextmanager
+def time_calls(obj: Any, name: str) -> Generator[list[float], None, None]:
+    """Records how long each call to `obj.name` takes in seconds."""
+    durations: list[float] = []
+    original = getattr(obj, name)
+
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        started_at = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - started_at)
+
+    setattr(obj, name, timed)
+    try:
+        yield durations
+    finally:
+        setattr(obj, name, original)
+
+
+# --------- #
+# scenarios #
+# --------- #
+
+
+def bench_completion(args: argparse.Namespace) -> Metrics:
+    """
+    Types bursts of characters which never match a completion, so that each burst ends with a completion
+    request, and measures the time from the last keystroke of a burst to the rendered completion as well as
+    the handling of responses.
+    """
+    metrics: Metrics = {}
+    editor = open_editor(
+        SAMPLE_TEXT,
+        settings={"completion_style": args.completion_style},
+        server_args=["--latency-ms", str(args.latency_ms), "--completion-lines", "6"],
+    )
+    vcm = plugin_module("ui").ViewCompletionManager(editor.view)
+    rnd = random.Random(args.seed)
+    latencies: list[float] = []
+    missed = 0
+
+    with time_calls(editor.plugin, "_on_get_completions") as responses:
+        with track_allocations(metrics, enabled=args.allocations):
+            started_at = time.perf_counter()
+            for _ in range(args.bursts):
+                for _ in range(rnd.randint(2, 6)):
+                    editor.type("z")
+                    sublime.loop.pump(rnd.uniform(0.03, 0.12))
+                keystroke_at = time.perf_counter()
+                editor.type("z")
+                # the keystroke hides the shown completion once the listeners have seen it
+                sublime.loop.pump_until(lambda: not vcm.is_visible, timeout=1)
+                if sublime.loop.pump_until(lambda: vcm.is_visible, timeout=3):
+                    latencies.append(time.perf_counter() - keystroke_at)
+                else:
+                    missed += 1
+                sublime.loop.pump(rnd.uniform(0.1, 0.4))
+            elapsed = time.perf_counter() - started_at
+
+    sent = editor.session.sent
+    metrics["keystroke_to_render_p50_ms"] = round(percentile(latencies, 50) * 1000, 1)
+    metrics["keystroke_to_render_p95_ms"] = round(percentile(latencies, 95) * 1000, 1)
+    metrics["missed_renders"] = missed
+    metrics["response_handling_p50_ms"] = round(percentile(responses, 50) * 1000, 2)
+    metrics["response_handling_p95_ms"] = round(percentile(responses, 95) * 1000, 2)
+    metrics["requests_per_minute"] = round(sent.get("getCompletions", 0) / elapsed * 60, 1)
+    metrics["did_change_per_minute"] = round(sent.get("textDocument/didChange", 0) / elapsed * 60, 1)
+    metrics["sent_kib"] = round(editor.session.sent_bytes / 1024, 1)
+    editor.close()
+    return metrics
+
+
+def bench_accept(args: argparse.Namespace) -> Metrics:
+    """Accepts shown multi-line completions and measures the command as well as what the view settings hold."""
+    metrics: Metrics = {}
+    editor = open_editor(
+        SAMPLE_TEXT,
+        settings={"speculative_completions_per_minute": 0},
+        server_args=["--latency-ms", "5", "--completions", "5", "--completion-lines", "20"],
+    )
+    vcm = plugin_module("ui").ViewCompletionManager(editor.view)
+    settings = editor.view.settings()
+    latencies: list[float] = []
+    session_sizes: list[int] = []
+    settings_reads = 0
+
+    with track_allocations(metrics, enabled=args.allocations):
+        for _ in range(args.accepts):
+            editor.type("\n    z")
+            if not sublime.loop.pump_until(lambda: vcm.is_visible, timeout=3):
+                continue
+            session_sizes.append(settings.serialized_size())
+            reads_before = settings.reads
+            started_at = time.perf_counter()
+            editor.view.run_command("copilot_accept_completion")
+            latencies.append(time.perf_counter() - started_at)
+            settings_reads += settings.reads - reads_before
+            sublime.loop.pump(0.05)
+
+    metrics["accept_p50_ms"] = round(percentile(latencies, 50) * 1000, 3)
+    metrics["accept_p95_ms"] = round(percentile(latencies, 95) * 1000, 3)
+    metrics["view_settings_reads_per_accept"] = round(settings_reads / max(1, len(latencies)), 1)
+    metrics["view_settings_kib"] = round(max(session_sizes, default=0) / 1024, 2)
+    editor.close()
+    return metrics
+
+
+def bench_cycle(args: argparse.Namespace) -> Metrics:
+    """Cycles through long completions shown as a popup and as phantoms, like pressing next/previous does."""
+    metrics: Metrics = {}
+    for style in ("popup", "phantom"):
+        editor = open_editor(
+            SAMPLE_TEXT,
+            settings={"completion_style": style, "speculative_completions_per_minute": 0},
+            server_args=["--latency-ms", "5", "--completions", "5", "--completion-lines", "60"],
+        )
+        vcm = plugin_module("ui").ViewCompletionManager(editor.view)
+        phantom_updates = 0
+        latencies: list[float] = []
+
+        with track_allocations(metrics, enabled=args.allocations and style == "phantom"):
+            for _ in range(args.cycles):
+                editor.type("\n    z")
+                if not sublime.loop.pump_until(lambda: vcm.is_visible and len(vcm.completions) > 1, timeout=3):
+                    continue
+                # the user reads the shown completion before cycling
+                sublime.loop.pump(0.05)
+                updates_before = _phantom_set_updates(editor.view)
+                for command in ("copilot_next_completion",) * 4 + ("copilot_previous_completion",) * 4:
+                    started_at = time.perf_counter()
+                    editor.view.run_command(command)
+                    latencies.append(time.perf_counter() - started_at)
+                phantom_updates += _phantom_set_updates(editor.view) - updates_before
+                sublime.loop.pump(0.02)
+
+        metrics[f"{style}_cycle_p50_ms"] = round(percentile(latencies, 50) * 1000, 3)
+        metrics[f"{style}_cycle_p95_ms"] = round(percentile(latencies, 95) * 1000, 3)
+        if style == "popup":
+            metrics["popup_miss_rate"] = round(1 - vcm.get_popup_render_stats()["hit_rate"], 3)
+        if style == "phantom":
+            metrics["phantom_updates_per_cycle"] = round(phantom_updates / max(1, len(latencies)), 2)
+        editor.close()
+    return metrics
+
+
+def _phantom_set_updates(view: sublime.View) -> int:
+    phantom_set = plugin_module("ui.completion")._view_to_phantom_set.get(view.id())
+    return phantom_set.updates if phantom_set else 0
+
+
+def bench_chat(args: argparse.Namespace) -> Metrics:
+    """
+    Streams chat replies into the chat sheet and measures the cost of re-rendering it. The render time should not
+    grow with the length of the conversation, which is checked by comparing the first and the last turns.
+    """
+    metrics: Metrics = {}
+    editor = open_editor(
+        SAMPLE_TEXT,
+        server_args=["--chat-chunks", str(args.chat_chunks), "--stream-interval-ms", "2"],
+    )
+    chat = plugin_module("ui.chat")
+    throttle = plugin_module("scheduler").sheet_render_throttle
+    skipped_renders = throttle.skipped_renders
+    wcm = chat.WindowConversationManager(editor.window)
+    wcm.last_active_view_id = editor.view.id()
+    wcm.conversation_id = "bench-conversation"
+    turn_render_times: list[list[float]] = []
+
+    with track_allocations(metrics, enabled=args.allocations), time_calls(
+        chat._ConversationEntry, "update"
+    ) as render_times:
+        started_at = time.perf_counter()
+        for turn in range(args.chat_turns):
+            rendered = len(render_times)
+            editor.view.run_command("copilot_conversation_chat")
+            sublime.loop.pump_until(lambda: editor.window.input_panel is not None, timeout=3)
+            _, _, on_done = editor.window.input_panel
+            editor.window.input_panel = None
+            on_done(f"explain this code, part {turn}")
+            sublime.loop.pump(0.01)
+            sublime.loop.pump_until(lambda: not wcm.is_waiting, timeout=10)
+            turn_render_times.append(render_times[rendered:])
+        elapsed = time.perf_counter() - started_at
+
+    metrics["render_p50_ms"] = round(percentile(render_times, 50) * 1000, 2)
+    metrics["render_p95_ms"] = round(percentile(render_times, 95) * 1000, 2)
+    metrics["render_total_ms"] = round(sum(render_times) * 1000, 1)
+    metrics["render_first_turn_p50_ms"] = round(percentile(turn_render_times[0], 50) * 1000, 2)
+    metrics["render_last_turn_p50_ms"] = round(percentile(turn_render_times[-1], 50) * 1000, 2)
+    metrics["renders_per_turn"] = round(len(render_times) / args.chat_turns, 1)
+    metrics["skipped_renders_per_turn"] = round((throttle.skipped_renders - skipped_renders) / args.chat_turns, 1)
+    metrics["turn_duration_ms"] = round(elapsed / args.chat_turns * 1000, 1)
+    metrics["window_settings_kib"] = round(editor.window.settings().serialized_size() / 1024, 1)
+    editor.close()
+    return metrics
+
+
+def bench_panel(args: argparse.Namespace) -> Metrics:
+    """Streams panel solutions into the panel completion sheet and measures the cost of re-rendering it."""
+    metrics: Metrics = {}
+    editor = open_editor(
+        SAMPLE_TEXT,
+        server_args=[
+            "--panel-solutions",
+            str(args.panel_solutions),
+            "--completion-lines",
+            "12",
+            "--stream-interval-ms",
+            "2",
+        ],
+    )
+    mdpopups = sys.modules["mdpopups"]
+    panel_completion = plugin_module("ui.panel_completion")
+    throttle = plugin_module("scheduler").sheet_render_throttle
+    skipped_renders = throttle.skipped_renders
+    vpcm = panel_completion.ViewPanelCompletionManager(editor.view)
+
+    with track_allocations(metrics, enabled=args.allocations), time_calls(
+        panel_completion._PanelCompletion, "update"
+    ) as render_times:
+        md2html_chars = mdpopups.stats["md2html_chars"]
+        for _ in range(args.panel_requests):
+            editor.view.run_command("copilot_get_panel_completions")
+            sublime.loop.pump(0.01)
+            sublime.loop.pump_until(lambda: not vpcm.is_waiting, timeout=10)
+            vpcm.close()
+        md2html_chars = mdpopups.stats["md2html_chars"] - md2html_chars
+
+    metrics["render_p50_ms"] = round(percentile(render_times, 50) * 1000, 2)
+    metrics["render_p95_ms"] = round(percentile(render_times, 95) * 1000, 2)
+    metrics["render_total_ms"] = round(sum(render_times) * 1000, 1)
+    metrics["md2html_kib_per_request"] = round(md2html_chars / args.panel_requests / 1024, 1)
+    metrics["renders_per_request"] = round(len(render_times) / args.panel_requests, 1)
+    metrics["skipped_renders_per_request"] = round(
+        (throttle.skipped_renders - skipped_renders) / args.panel_requests, 1
+    )
+    editor.close()
+    return metrics
+
+
+def bench_lookup(args: argparse.Namespace) -> Metrics:
+    """Finds windows, views and sheets by their IDs with hundreds of views open, like notification handlers do."""
+    metrics: Metrics = {}
+    utils = plugin_module("utils")
+    reset()
+    windows = [sublime.Window() for _ in range(4)]
+    views = [windows[index % len(windows)].new_file(text=SAMPLE_TEXT) for index in range(args.lookup_views)]
+    sheets = [window.new_html_sheet("Copilot Chat", "", sublime.TRANSIENT) for window in windows]
+    sublime.loop.pump(0.01)
+    rnd = random.Random(args.seed)
+    targets = [
+        *((utils.find_view_by_id, view.id()) for view in rnd.choices(views, k=args.lookups)),
+        *((utils.find_window_by_id, window.id()) for window in rnd.choices(windows, k=args.lookups)),
+        *((utils.find_sheet_by_id, sheet.id()) for sheet in rnd.choices(sheets, k=args.lookups)),
+    ]
+
+    with track_allocations(metrics, enabled=args.allocations):
+        started_at = time.perf_counter()
+        for find, id_ in targets:
+            find(id_)
+        elapsed = time.perf_counter() - started_at
+
+    metrics["lookup_us"] = round(elapsed / len(targets) * 1e6, 2)
+    return metrics
+
+
+def bench_context(args: argparse.Namespace) -> Metrics:
+    """
+    Evaluates key binding contexts and `is_enabled` of commands with many views attached, like a Tab press does,
+    as well as the debug mode setting.
+    """
+    metrics: Metrics = {}
+    editor = open_editor(SAMPLE_TEXT)
+    for _ in range(args.context_views):
+        view = editor.window.new_file(text=SAMPLE_TEXT)
+        editor.session.attach_view(view)
+        editor.extra_views.append(view)
+    editor.window.focus_view(editor.view)
+    listener = editor.module.ViewEventListener(editor.view)
+    command = editor.module.CopilotGetVersionCommand(editor.view)
+    window_command = editor.module.CopilotClosePanelCompletionCommand(editor.window)
+
+    with track_allocations(metrics, enabled=args.allocations):
+        started_at = time.perf_counter()
+        for _ in range(args.context_queries):
+            listener.on_query_context("copilot.commit_completion_on_tab", sublime.OP_EQUAL, True, False)
+            command.is_enabled()
+            window_command.is_enabled()
+        elapsed = time.perf_counter() - started_at
+
+    metrics["query_us"] = round(elapsed / args.context_queries / 3 * 1e6, 2)
+
+    # asked by templates on every render
+    is_debug_mode = plugin_module("helpers").is_debug_mode
+    started_at = time.perf_counter()
+    for _ in range(args.context_queries):
+        is_debug_mode()
+    metrics["debug_mode_us"] = round((time.perf_counter() - started_at) / args.context_queries * 1e6, 2)
+    editor.close()
+    return metrics
+
+
+def bench_templates(args: argparse.Namespace) -> Metrics:
+    """
+    Loads every resource template like the first completion, panel or chat does: compiled from the source (cold),
+    from the bytecode cache (warm) and after being precompiled in the background.
+    """
+    metrics: Metrics = {}
+    template = plugin_module("template")
+    template_paths = [resource.rpartition("/")[2] for resource in sublime.find_resources("*.jinja")]
+
+    def forget_compiled() -> None:
+        template.load_resource_template.cache_clear()
+        template._resource_template_env.cache_clear()
+
+    def load_all() -> float:
+        started_at = time.perf_counter()
+        for path in template_paths:
+            template.load_resource_template(path)
+        return time.perf_counter() - started_at
+
+    cold, warm, precompiled = [], [], []
+    for _ in range(args.template_rounds):
+        shutil.rmtree(template._BytecodeCache.DIRECTORY, ignore_errors=True)
+        forget_compiled()
+        cold.append(load_all())
+        forget_compiled()
+        warm.append(load_all())
+        forget_compiled()
+        template.precompile_resource_templates()
+        precompiled.append(load_all())
+
+    metrics["cold_load_ms"] = round(statistics.median(cold) * 1000, 2)
+    metrics["warm_load_ms"] = round(statistics.median(warm) * 1000, 2)
+    metrics["precompiled_load_ms"] = round(statistics.median(precompiled) * 1000, 3)
+    return metrics
+
+
+def bench_debounce(args: argparse.Namespace) -> Metrics:
+    """Calls a debounced function for a few views in a tight loop, like keystrokes do."""
+    metrics: Metrics = {}
+    utils = plugin_module("utils")
+    reset()
+    window = sublime.Window()
+    views = [window.new_file(text=SAMPLE_TEXT) for _ in range(4)]
+    calls: list[int] = []
+
+    @utils.debounce(0.01)
+    def on_keystroke(view: sublime.View) -> None:
+        calls.append(view.id())
+
+    with track_allocations(metrics, enabled=args.allocations), count_threads() as threads:
+        started_at = time.perf_counter()
+        for index in range(args.debounce_calls):
+            on_keystroke(views[index % len(views)])
+        call_overhead = time.perf_counter() - started_at
+        sublime.loop.pump_until(lambda: len(calls) >= len(views), timeout=3)
+
+    metrics["call_overhead_us"] = round(call_overhead / args.debounce_calls * 1e6, 2)
+    metrics["threads_started"] = threads[0]
+    metrics["extra_runs"] = len(calls) - len(views)
+    return metrics
+
+
+def bench_status(args: argparse.Namespace) -> Metrics:
+    """
+    Updates the status bar text like activity indicators do while requests are pending. Several updates are
+    requested within each tick and the spinner stays on the same frame for a while, as when the server is idle.
+    """
+    metrics: Metrics = {}
+    editor = open_editor(SAMPLE_TEXT)
+    frames = ["⣷", "⣯", "⣟", "⡿", "⢿", "⣻", "⣽", "⣾"]
+    updates = 0
+
+    with time_calls(editor.session, "set_config_status_async") as status_sets:
+        with track_allocations(metrics, enabled=args.allocations):
+            started_at = time.perf_counter()
+            for tick in range(args.status_ticks):
+                for _ in range(args.status_updates_per_tick):
+                    editor.plugin.update_status_bar_text({"is_waiting": frames[tick // 4 % len(frames)]})
+                    updates += 1
+                sublime.loop.pump(0)
+            elapsed = time.perf_counter() - started_at
+
+    metrics["update_us"] = round(elapsed / updates * 1e6, 2)
+    metrics["status_sets_per_tick"] = round(len(status_sets) / args.status_ticks, 2)
+    editor.close()
+    return metrics
+
+
+SCENARIOS: dict[str, Callable[[argparse.Namespace], Metrics]] = {
+    "completion": bench_completion,
+    "accept": bench_accept,
+    "cycle": bench_cycle,
+    "chat": bench_chat,
+    "panel": bench_panel,
+    "lookup": bench_lookup,
+    "context": bench_context,
+    "templates": bench_templates,
+    "debounce": bench_debounce,
+    "status": bench_status,
+}
+
+
+# ---- #
+# main #
+# ---- #
+
+
+def compare(results: dict[str, Metrics], baseline: dict[str, Metrics], tolerance: float) -> list[str]:
+    """Lists metrics which are worse than `baseline` by more than `tolerance` (a ratio)."""
+    regressions: list[str] = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            if (base := baseline.get(scenario, {}).get(name)) is None:
+                continue
+            # a small absolute slack so that metrics close to zero don't flap
+            if value > base * (1 + tolerance) + 0.5:
+                regressions.append(f"{scenario}.{name}: {base} -> {value}")
+    return regressions
+
+
+def print_results(results: dict[str, Metrics], baseline: dict[str, Metrics]) -> None:
+    for scenario, metrics in results.items():
+        print(f"{scenario}:")
+        for name, value in metrics.items():
+            base = baseline.get(scenario, {}).get(name)
+            suffix = f"  (baseline {base})" if base is not None else ""
+            print(f"  {name:<28} {value:>10}{suffix}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke test")
+    parser.add_argument("--repeat", type=int, default=1, help="run each scenario this many times and keep medians")
+    parser.add_argument("--no-allocations", dest="allocations", action="store_false", help="skip tracemalloc")
+    parser.add_argument("--json", metavar="FILE", help="write the results to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with results written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression ratio (default: 0.25)")
+    parser.add_argument("--latency-ms", type=float, default=60.0, help="mean latency of the stub server")
+    parser.add_argument("--completion-style", choices=("popup", "phantom"), default="popup")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if unknown := set(args.scenarios) - set(SCENARIOS):
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.bursts = 5 if args.quick else 30
+    args.accepts = 5 if args.quick else 40
+    args.cycles = 5 if args.quick else 30
+    args.chat_turns = 2 if args.quick else 8
+    args.chat_chunks = 40 if args.quick else 120
+    args.panel_requests = 1 if args.quick else 3
+    args.panel_solutions = 10 if args.quick else 30
+    args.lookup_views = 500
+    args.lookups = 500 if args.quick else 5000
+    args.context_views = 200
+    args.context_queries = 500 if args.quick else 5000
+    args.template_rounds = 3 if args.quick else 10
+    args.debounce_calls = 1000 if args.quick else 20000
+    args.status_ticks = 100 if args.quick else 1000
+    args.status_updates_per_tick = 3
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    baseline: dict[str, Metrics] = {}
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+
+    results: dict[str, Metrics] = {}
+    for name in args.scenarios or SCENARIOS:
+        runs = [SCENARIOS[name](args) for _ in range(max(1, args.repeat))]
+        results[name] = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+
+    print_results(results, baseline)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    if regressions := compare(results, baseline, args.tolerance):
+        print("\nRegressions:", *regressions, sep="\n  ")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+A scripted stand-in for the Copilot language server.
+
+It speaks JSON-RPC over stdio with `Content-Length` framing, keeps track of documents synced via
+`textDocument/didOpen`/`didChange`, honours `$/cancelRequest` and answers completion, panel and chat
+requests after a configurable latency with payloads of a configurable size.
+
+    python benchmarks/stub_server.py --latency-ms 80 --completions 3 --completion-lines 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Any
+
+
+class StubServer:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.docs: dict[str, tuple[int, str]] = {}
+        self.cancelled: set[int] = set()
+        self.stats: dict[str, int] = {}
+        self._write_lock = threading.Lock()
+        self._stdout = sys.stdout.buffer
+
+    # ---------- #
+    # transport  #
+    # ---------- #
+
+    def write(self, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        with self._write_lock:
+            self._stdout.write(b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            self._stdout.flush()
+
+    def serve(self) -> None:
+        stdin = sys.stdin.buffer
+        while True:
+            length = 0
+            while line := stdin.readline():
+                if line in (b"\r\n", b"\n"):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            if not line:
+                return
+            message = json.loads(stdin.read(length))
+            method = message.get("method", "")
+            self.stats[method] = self.stats.get(method, 0) + 1
+            if method == "exit":
+                return
+            if "id" in message:
+                self.on_request(message["id"], method, message.get("params") or {})
+            else:
+                self.on_notification(method, message.get("params") or {})
+
+    def latency(self) -> float:
+        jitter = self.random.uniform(-self.args.jitter_ms, self.args.jitter_ms)
+        return max(0.0, self.args.latency_ms + jitter) / 1000
+
+    def respond_later(self, request_id: int, compute: Any, *, error: dict[str, Any] | None = None) -> None:
+        def run() -> None:
+            if request_id in self.cancelled:
+                self.cancelled.discard(request_id)
+                self.stats["cancelled"] = self.stats.get("cancelled", 0) + 1
+                self.write({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32800, "message": "cancelled"}})
+                return
+            if error:
+                self.write({"jsonrpc": "2.0", "id": request_id, "error": error})
+                return
+            self.write({"jsonrpc": "2.0", "id": request_id, "result": compute()})
+
+        timer = threading.Timer(self.latency(), run)
+        timer.daemon = True
+        timer.start()
+
+    # ------------- #
+    # notifications #
+    # ------------- #
+
+    def on_notification(self, method: str, params: dict[str, Any]) -> None:
+        if method == "textDocument/didOpen":
+            doc = params["textDocument"]
+            self.docs[doc["uri"]] = (doc["version"], doc["text"])
+        elif method == "textDocument/didChange":
+            doc = params["textDocument"]
+            self.docs[doc["uri"]] = (doc["version"], params["contentChanges"][-1]["text"])
+        elif method == "$/cancelRequest":
+            self.cancelled.add(params["id"])
+
+    # -------- #
+    # requests #
+    # -------- #
+
+    def on_request(self, request_id: int, method: str, params: dict[str, Any]) -> None:
+        if method in {"getCompletions", "getCompletionsCycling"}:
+            self.on_get_completions(request_id, method, params)
+        elif method == "getPanelCompletions":
+            self.on_get_panel_completions(request_id, params)
+        elif method in {"conversation/create", "conversation/turn"}:
+            self.on_conversation(request_id, method, params)
+        elif method == "checkStatus":
+            self.respond_later(request_id, lambda: {"status": "OK", "user": "bench"})
+        elif method == "getVersion":
+            self.respond_later(request_id, lambda: {"version": "1.0.0", "buildType": "stub", "runtimeVersion": "py"})
+        elif method == "bench/stats":
+            self.write({"jsonrpc": "2.0", "id": request_id, "result": dict(self.stats)})
+        else:
+            self.respond_later(request_id, lambda: "OK")
+
+    def on_get_completions(self, request_id: int, method: str, params: dict[str, Any]) -> None:
+        doc = params["doc"]
+        if "source" in doc:
+            source = doc["source"]
+        elif (synced := self.docs.get(doc["uri"])) and synced[0] == doc["version"]:
+            source = synced[1]
+        else:
+            self.stats["version_mismatch"] = self.stats.get("version_mismatch", 0) + 1
+            self.respond_later(request_id, None, error={"code": -32602, "message": "Document version mismatch"})
+            return
+
+        position = doc["position"]
+        lines = source.split("\n")
+        line = lines[position["line"]] if position["line"] < len(lines) else ""
+        prefix = line[: position["character"]]
+        count = self.args.completions if method == "getCompletions" else self.args.completions * 3
+
+        def compute() -> dict[str, Any]:
+            completions = []
+            for index in range(count):
+                display_text = self.make_completion_text(index)
+                completions.append({
+                    "uuid": str(uuid.uuid4()),
+                    "text": prefix + display_text,
+                    "displayText": display_text,
+                    "position": position,
+                    "range": {
+                        "start": {"line": position["line"], "character": 0},
+                        "end": {"line": position["line"], "character": len(line)},
+                    },
+                })
+            return {"completions": completions}
+
+        self.respond_later(request_id, compute)
+
+    def make_completion_text(self, index: int) -> str:
+        words = ["value", "result", "index", "item", "count", "total", "data", "node"]
+        first = f"{words[index % len(words)]}_{index} = compute({index})"
+        rest = [
+            f"    {words[(index + n) % len(words)]} += {n} * {words[n % len(words)]}"
+            for n in range(1, self.args.completion_lines)
+        ]
+        text = "\n".join([first, *rest])
+        return text + "#" * max(0, self.args.payload_bytes - len(text))
+
+    def on_get_panel_completions(self, request_id: int, params: dict[str, Any]) -> None:
+        panel_id = params["panelId"]
+        position = params["doc"]["position"]
+        count = self.args.panel_solutions
+
+        def stream() -> None:
+            for index in range(count):
+                time.sleep(self.args.stream_interval_ms / 1000)
+                text = self.make_completion_text(index % max(1, count - 2))
+                self.write({
+                    "jsonrpc": "2.0",
+                    "method": "PanelSolution",
+                    "params": {
+                        "panelId": panel_id,
+                        "solutionId": str(uuid.uuid4()),
+                        "score": self.random.randint(0, 100),
+                        "displayText": text,
+                        "completionText": text,
+                        "range": {"start": position, "end": position},
+                    },
+                })
+            self.write({"jsonrpc": "2.0", "method": "PanelSolutionsDone", "params": {"panelId": panel_id}})
+
+        self.write({"jsonrpc": "2.0", "id": request_id, "result": {"solutionCountTarget": count}})
+        threading.Thread(target=stream, daemon=True).start()
+
+    def on_conversation(self, request_id: int, method: str, params: dict[str, Any]) -> None:
+        conversation_id = params.get("conversationId") or str(uuid.uuid4())
+        turn_id = str(uuid.uuid4())
+        token = params.get("workDoneToken", "")
+
+        def stream() -> None:
+            chunks = self.make_chat_chunks()
+            for chunk in chunks:
+                time.sleep(self.args.stream_interval_ms / 1000)
+                self.progress(
+                    token, {"kind": "report", "reply": chunk, "turnId": turn_id, "conversationId": conversation_id}
+                )
+            self.progress(token, {"kind": "end", "turnId": turn_id, "conversationId": conversation_id})
+
+        self.write({
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "result": {"conversationId": conversation_id, "turnId": turn_id},
+        })
+        if method == "conversation/turn":
+            threading.Thread(target=stream, daemon=True).start()
+
+    def make_chat_chunks(self) -> list[str]:
+        chunks: list[str] = []
+        for n in range(self.args.chat_chunks):
+            if n % 20 == 5:
+                chunks.append("```python\n")
+            elif n % 20 == 12:
+                chunks.append("```\n")
+            else:
+                chunks.append(f"word{n} " * 3 + ("\n" if n % 7 == 0 else ""))
+        return chunks
+
+    def progress(self, token: str, value: dict[str, Any]) -> None:
+        value.setdefault("annotations", [])
+        value.setdefault("references", [])
+        value.setdefault("hideText", False)
+        value.setdefault("warnings", [])
+        self.write({"jsonrpc": "2.0", "method": "$/progress", "params": {"token": token, "value": value}})
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=60.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="uniform latency jitter")
+    parser.add_argument("--completions", type=int, default=3, help="completions per getCompletions response")
+    parser.add_argument("--completion-lines", type=int, default=3, help="lines per completion")
+    parser.add_argument("--payload-bytes", type=int, default=0, help="pad each completion to this many bytes")
+    parser.add_argument("--panel-solutions", type=int, default=10, help="solutions streamed per panel request")
+    parser.add_argument("--chat-chunks", type=int, default=60, help="progress chunks streamed per chat turn")
+    parser.add_argument("--stream-interval-ms", type=float, default=5.0, help="delay between streamed chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    StubServer(parse_args()).serve()
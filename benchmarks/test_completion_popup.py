@@ -0,0 +1,125 @@
+"""
+Tests of pre-rendering completion popups, against the same in-memory fakes as the benchmarks.
+
+    python -m unittest discover benchmarks
+"""
+
+from __future__ import annotations
+
+import copy
+import threading
+import unittest
+from typing import Any
+
+from harness import open_editor, plugin_module, sublime
+
+SAMPLE_TEXT = "def main():\n    "
+
+
+def make_completions(view: sublime.View, display_texts: list[str]) -> list[dict[str, Any]]:
+    point = view.size()
+    row, col = view.rowcol(point)
+    line = view.substr(view.line(point))
+    return [
+        {
+            "uuid": f"uuid-{index}",
+            "text": line + display_text,
+            "displayText": display_text,
+            "point": point,
+            "position": {"line": row, "character": col},
+            "region": (view.line(point).begin(), point),
+        }
+        for index, display_text in enumerate(display_texts)
+    ]
+
+
+class TestPopupPrerender(unittest.TestCase):
+    def setUp(self) -> None:
+        self.editor = open_editor(SAMPLE_TEXT, settings={"speculative_completions_per_minute": 0})
+        self.view = self.editor.view
+        self.completion = plugin_module("ui.completion")
+        self.completion._popup_html_cache._entries.clear()
+
+    def tearDown(self) -> None:
+        self.editor.close()
+
+    def popup(self, completion: dict[str, Any], index: int, count: int) -> Any:
+        return self.completion._PopupCompletion(self.view, completion, index, count)
+
+    def cached_html(self, completion: dict[str, Any], index: int, count: int) -> str | None:
+        return self.completion._popup_html_cache._entries.get(self.popup(completion, index, count).cache_key)
+
+    def test_prerendered_html_matches_its_key_after_typing_through(self) -> None:
+        completions = make_completions(self.view, ["return 1", "return 2", "return 3"])
+        originals = [copy.copy(completion) for completion in completions]
+        self.completion._PopupCompletion.prerender(self.view, completions, 0)
+
+        # typing "re" before the pre-rendering runs changes the completions in place, like typing through does.
+        # The new point is in another language, like in an embedded one, so its popups are rendered differently
+        self.view.run_command("insert", {"characters": "re"})
+        cursor = self.view.size()
+        self.view.set_scope("source.php", sublime.Region(cursor))
+        for completion in completions:
+            completion["displayText"] = completion["displayText"][2:]
+            completion["point"] = cursor
+        sublime.loop.pump(0.05)
+
+        for index, original in enumerate(originals[1:], 1):
+            html = self.cached_html(original, index, len(originals))
+            self.assertIsNotNone(html)
+            self.assertEqual(html, self.popup(original, index, len(originals)).render_popup_html())
+
+    def test_cycling_shows_html_of_current_completions(self) -> None:
+        vcm = plugin_module("ui").ViewCompletionManager(self.view)
+        vcm.show(make_completions(self.view, ["return 1", "return 2", "return 3"]), 0, "popup")
+        self.view.run_command("insert", {"characters": "re"})
+        self.assertTrue(vcm.handle_text_change())
+        sublime.loop.pump(0.05)
+
+        for _ in range(len(vcm.completions)):
+            vcm.show_next_completion()
+            completion, index, count = vcm.current_completion, vcm.completion_index, len(vcm.completions)
+            expected = self.popup(copy.copy(completion), index, count).render_popup_html()
+            self.assertEqual(self.cached_html(completion, index, count), expected)
+
+    def test_prerendering_is_serialized_on_the_event_loop(self) -> None:
+        utils = plugin_module("utils")
+        mdpopups, lock = utils.mdpopups, utils.md2html_lock
+        md2html = mdpopups.md2html
+        threads: set[int] = set()
+        unlocked_calls = 0
+
+        def checked_md2html(*args: Any, **kwargs: Any) -> str:
+            nonlocal unlocked_calls
+            threads.add(threading.get_ident())
+            # another thread can't take the lock while it's held
+            acquired: list[bool] = []
+
+            def probe() -> None:
+                if lock.acquire(blocking=False):
+                    lock.release()
+                    acquired.append(True)
+
+            prober = threading.Thread(target=probe)
+            prober.start()
+            prober.join()
+            unlocked_calls += len(acquired)
+            return md2html(*args, **kwargs)
+
+        threads_before = threading.active_count()
+        mdpopups.md2html = checked_md2html
+        try:
+            completions = make_completions(self.view, [f"return {index}" for index in range(5)])
+            self.completion._PopupCompletion.prerender(self.view, completions, 0)
+            sublime.loop.pump(0.05)
+        finally:
+            mdpopups.md2html = md2html
+
+        self.assertEqual(threads, {threading.get_ident()})
+        self.assertEqual(unlocked_calls, 0)
+        self.assertEqual(threading.active_count(), threads_before)
+        self.assertEqual(len(self.completion._popup_html_cache._entries), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
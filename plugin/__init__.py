@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import threading
+
 from .client import CopilotPlugin
 from .commands import (
     CopilotAcceptCompletionCommand,
@@ -33,6 +35,7 @@ from .commands import (
     CopilotPreviousCompletionCommand,
     CopilotRejectCompletionCommand,
     CopilotSendAnyRequestCommand,
+    CopilotShowCompletionMetricsCommand,
     CopilotSignInCommand,
     CopilotSignInWithGithubTokenCommand,
     CopilotSignOutCommand,
@@ -40,6 +43,9 @@ from .commands import (
 )
 from .helpers import CopilotIgnore
 from .listeners import EventListener, ViewEventListener, copilot_ignore_observer
+from .scheduler import scheduler
+from .settings import forget_settings_snapshot
+from .template import precompile_resource_templates
 from .utils import all_windows
 
 __all__ = (
@@ -77,6 +83,7 @@ __all__ = (
     "CopilotPreviousCompletionCommand",
     "CopilotRejectCompletionCommand",
     "CopilotSendAnyRequestCommand",
+    "CopilotShowCompletionMetricsCommand",
     "CopilotSignInCommand",
     "CopilotSignInWithGithubTokenCommand",
     "CopilotSignOutCommand",
@@ -93,6 +100,8 @@ def plugin_loaded() -> None:
     """Executed when this plugin is loaded."""
     CopilotPlugin.setup()
     copilot_ignore_observer.setup()
+    # so that the first completion or chat doesn't wait for templates to be compiled
+    threading.Thread(target=precompile_resource_templates, name="copilot-templates", daemon=True).start()
     for window in all_windows():
         CopilotIgnore(window).load_patterns()
 
@@ -102,3 +111,5 @@ def plugin_unloaded() -> None:
     CopilotPlugin.cleanup()
     CopilotIgnore.cleanup()
     copilot_ignore_observer.cleanup()
+    forget_settings_snapshot()
+    scheduler.clear()
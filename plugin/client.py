@@ -3,6 +3,7 @@ from __future__ import annotations
 import functools
 import json
 import os
+import time
 import weakref
 from collections.abc import Callable
 from dataclasses import dataclass
@@ -13,6 +14,7 @@ from urllib.parse import urlparse
 import jmespath
 import sublime
 from LSP.plugin import ClientConfig, DottedDict, Notification, Request, Session, WorkspaceFolder
+from LSP.plugin.core.sessions import SessionViewProtocol
 from lsp_utils import ApiWrapperInterface, NpmClientHandler, notification_handler, request_handler
 
 from .constants import (
@@ -31,16 +33,27 @@ from .constants import (
 )
 from .helpers import (
     ActivityIndicator,
+    AdaptiveCompletionDelay,
+    CompletionCache,
+    CompletionCacheKey,
+    CompletionRequestTracker,
     CopilotIgnore,
     GithubInfo,
+    RateLimiter,
+    get_completion_context_budget,
+    is_document_out_of_sync_error,
+    merge_completions,
     prepare_completion_request_doc,
     preprocess_completions,
     preprocess_panel_completions,
+    window_completion_request_doc,
 )
-from .log import log_warning
-from .template import load_string_template
+from .metrics import CompletionLatencyMetrics, CompletionTrace
+from .scheduler import sheet_render_throttle
+from .settings import SettingsSnapshot
 from .types import (
     AccountStatus,
+    CopilotDocType,
     CopilotPayloadCompletions,
     CopilotPayloadConversationContext,
     CopilotPayloadFeatureFlagsNotification,
@@ -52,12 +65,12 @@ from .types import (
     NetworkProxy,
     T_Callable,
 )
-from .ui import ViewCompletionManager, ViewPanelCompletionManager, WindowConversationManager
+from .ui import ViewCompletionManager, ViewPanelCompletionManager, WindowConversationManager, status_bar_renderer
 from .utils import (
     all_views,
     all_windows,
     debounce,
-    get_session_setting,
+    get_view_language_id,
     status_message,
 )
 
@@ -123,6 +136,9 @@ class CopilotPlugin(NpmClientHandler):
 
     _activity_indicator: ActivityIndicator | None = None
 
+    _view_to_resolution: dict[int, tuple[CopilotPlugin, weakref.ref[SessionViewProtocol]]] = {}
+    """View IDs to the plugin and the session view resolved by `from_view`. Only successful resolutions are cached."""
+
     def __init__(self, session: weakref.ref[Session]) -> None:
         super().__init__(session)
 
@@ -130,6 +146,18 @@ class CopilotPlugin(NpmClientHandler):
             self.window_attrs[sess.window].client = self
 
         self._activity_indicator = ActivityIndicator(self.update_status_bar_text)
+        self._completion_cache = CompletionCache()
+        self._completion_requests = CompletionRequestTracker()
+        self._completion_delay = AdaptiveCompletionDelay()
+        self._prefetch_budget = RateLimiter(0)
+        self._pending_prefetches: dict[int, tuple[int, tuple[int, int]]] = {}
+        """View ID to the view's change count and the selected region, for which completions are being prefetched."""
+        self._latency_metrics = CompletionLatencyMetrics()
+        self._keystroke_times: dict[int, float] = {}
+        self._waiting_view_ids: set[int] = set()
+        """IDs of views waiting for completions. Each one counts as an activity of the activity indicator."""
+        self.settings_snapshot = SettingsSnapshot()
+        """The "settings" of the session, taken by `on_settings_changed()`."""
 
         # Note that ST persists view settings after ST is closed. If the user closes ST
         # during awaiting Copilot's response, the internal state management will be corrupted.
@@ -139,7 +167,7 @@ class CopilotPlugin(NpmClientHandler):
             ViewPanelCompletionManager(view).reset()
 
         for window in all_windows():
-            WindowConversationManager(window).reset()
+            WindowConversationManager(window).reset(restore_history=True)
 
     @classmethod
     def setup(cls) -> None:
@@ -150,6 +178,7 @@ class CopilotPlugin(NpmClientHandler):
     @classmethod
     def cleanup(cls) -> None:
         cls.window_attrs.clear()
+        cls._view_to_resolution.clear()
         super().cleanup()
 
     @classmethod
@@ -185,6 +214,19 @@ class CopilotPlugin(NpmClientHandler):
         api.send_request(REQ_CHECK_STATUS, {}, _on_check_status)
         api.send_request(REQ_SET_EDITOR_INFO, self.editor_info(), _on_set_editor_info)
 
+    def on_session_end_async(self, exit_code: int | None, exception: Exception | None) -> None:
+        super().on_session_end_async(exit_code, exception)
+
+        for view_id, (plugin, _) in tuple(self._view_to_resolution.items()):
+            if plugin is self:
+                self._view_to_resolution.pop(view_id, None)
+
+        self._waiting_view_ids.clear()
+        if self._activity_indicator:
+            self._activity_indicator.reset()
+        if session := self.weaksession():
+            status_bar_renderer.forget(session)
+
     def on_settings_changed(self, settings: DottedDict) -> None:
         def parse_proxy(proxy: str) -> NetworkProxy | None:
             # in the form of "username:password@host:port" or "host:port"
@@ -201,6 +243,16 @@ class CopilotPlugin(NpmClientHandler):
 
         super().on_settings_changed(settings)
 
+        self.settings_snapshot = SettingsSnapshot.from_settings(settings)
+        self._completion_cache.configure(
+            max_size=int(settings.get("completion_cache_size") or 0),
+            ttl=float(settings.get("completion_cache_ttl") or 0),
+        )
+        self._completion_delay.enabled = bool(settings.get("adaptive_completion_delay"))
+        self._prefetch_budget.limit = int(settings.get("speculative_completions_per_minute") or 0)
+        self._latency_metrics.jsonl_path = str(settings.get("completion_latency_log") or "")
+        sheet_render_throttle.max_fps = float(settings.get("max_sheet_refresh_rate") or 0)
+
         if not (session := self.weaksession()):
             return
 
@@ -274,15 +326,27 @@ class CopilotPlugin(NpmClientHandler):
 
     @classmethod
     def from_view(cls, view: sublime.View) -> CopilotPlugin | None:
+        # a session view is dropped by LSP when the view is detached from the session
+        if (resolution := cls._view_to_resolution.get(view.id())) and resolution[1]() and resolution[0].weaksession():
+            return resolution[0]
+
         if (
             (window := view.window())
             and (window_attr := cls.window_attrs.get(window))
             and (self := window_attr.client)
-            and self.is_valid_for_view(view)
+            and (session := self.weaksession())
+            and (session_view := session.session_view_for_view_async(view))
         ):
+            cls._view_to_resolution[view.id()] = (self, weakref.ref(session_view))
             return self
+        cls._view_to_resolution.pop(view.id(), None)
         return None
 
+    @classmethod
+    def forget_view(cls, view: sublime.View) -> None:
+        """Forget the plugin resolved for `view` so that the next `from_view` resolves it again."""
+        cls._view_to_resolution.pop(view.id(), None)
+
     @classmethod
     def parse_server_version(cls) -> str:
         lock_file_content = sublime.load_resource(f"Packages/{PACKAGE_NAME}/language-server/package-lock.json")
@@ -315,13 +379,7 @@ class CopilotPlugin(NpmClientHandler):
         if extra_variables:
             variables.update(extra_variables)
 
-        rendered_text = ""
-        if template_text := str(session.config.settings.get("status_text") or ""):
-            try:
-                rendered_text = load_string_template(template_text).render(variables)
-            except Exception as e:
-                log_warning(f'Invalid "status_text" template: {e}')
-        session.set_config_status_async(rendered_text)
+        status_bar_renderer.request(session, str(session.config.settings.get("status_text") or ""), variables)
 
     def on_server_notification_async(self, notification: Notification) -> None:
         if notification.method == "$/progress":
@@ -333,6 +391,7 @@ class CopilotPlugin(NpmClientHandler):
                 wcm = WindowConversationManager(window)
                 if params.get("kind", None) == "end":
                     wcm.is_waiting = False
+                    wcm.persist_conversation()
 
                 if suggest_title := params.get("suggestedTitle", None):
                     wcm.suggested_title = suggest_title
@@ -344,7 +403,11 @@ class CopilotPlugin(NpmClientHandler):
                     message = followup.get("message", "")
                     wcm.follow_up = message
 
-                wcm.update()
+                # always show the final state right away
+                if params.get("kind", None) == "end":
+                    wcm.update()
+                else:
+                    wcm.request_update()
 
     @notification_handler(NTFY_FEATURE_FLAGS_NOTIFICATION)
     def _handle_feature_flags_notification(self, payload: CopilotPayloadFeatureFlagsNotification) -> None:
@@ -363,7 +426,7 @@ class CopilotPlugin(NpmClientHandler):
 
         vcm = ViewPanelCompletionManager(view)
         vcm.append_completion(payload)
-        vcm.update()
+        vcm.request_update()
 
     @notification_handler(NTFY_PANEL_SOLUTION_DONE)
     def _handle_panel_solution_done_notification(self, payload) -> None:
@@ -387,46 +450,364 @@ class CopilotPlugin(NpmClientHandler):
         respond(None)  # what?
 
     @_guard_view()
-    @debounce()
+    @debounce(lambda self, view: self._get_completion_delay(view))
     def request_get_completions(self, view: sublime.View) -> None:
+        # the prefetched completions will be shown when they arrive, if the cursor is still where it was
+        if (
+            (prefetch := self._pending_prefetches.get(view.id()))
+            and len(sel := view.sel()) == 1
+            and prefetch == (view.change_count(), sel[0].to_tuple())
+        ):
+            return
+
+        trace = CompletionTrace(get_view_language_id(view))
+        if (keystroke_time := self._keystroke_times.pop(view.id(), None)) is not None:
+            trace.mark("keystroke", keystroke_time)
+        trace.mark("debounce_fired")
+
+        self.cancel_completion_requests(view)
+        # it copies the text before the cursor, so it's computed only once for both the lookup and the request
+        cache_key = self._make_completion_cache_key(view)
+        if self._show_cached_completions(view, cache_key, trace=trace):
+            return
+
+        if self.settings_snapshot.completion_cycling != "eager":
+            # alternatives are requested later by `request_completion_alternatives()`
+            self._request_completions(view, REQ_GET_COMPLETIONS, cache_key=cache_key, trace=trace)
+            return
+
         self._request_completions(view, REQ_GET_COMPLETIONS, no_callback=True)
-        self._request_completions(view, REQ_GET_COMPLETIONS_CYCLING)
+        self._request_completions(view, REQ_GET_COMPLETIONS_CYCLING, cache_key=cache_key, trace=trace)
 
-    def _request_completions(self, view: sublime.View, request: str, *, no_callback: bool = False) -> None:
-        vcm = ViewCompletionManager(view)
-        vcm.hide()
+    def get_completion_metrics(self) -> dict[str, Any]:
+        """Get metrics of the completion pipeline."""
+        return {
+            "latency_ms": self._latency_metrics.percentiles(),
+            "cache": self._completion_cache.stats,
+            "requests": self._completion_requests.stats,
+            "delay": self._completion_delay.stats,
+            "prefetch": self._prefetch_budget.stats,
+            "sheet_renders": sheet_render_throttle.stats,
+            "popup_renders": ViewCompletionManager.get_popup_render_stats(),
+            "status_bar_renders": status_bar_renderer.stats,
+        }
 
+    def _get_completion_delay(self, view: sublime.View) -> float:
+        """Called on each (debounced) request of completions, which is usually a keystroke."""
+        self._keystroke_times[view.id()] = time.perf_counter()
+        return self._completion_delay.get_delay(view.id())
+
+    def prefetch_completions(self, view: sublime.View) -> None:
+        """
+        Speculatively request completions for the current document state without debouncing, e.g., right after
+        a completion is accepted. The result is cached and shown if the document hasn't changed when it arrives.
+        """
         if not (
             (session := self.weaksession())
             and self._account_status.has_signed_in
             and self._account_status.is_authorized
+            and self.settings_snapshot.auto_ask_completions
             and len(sel := view.sel()) == 1
+            and self._prefetch_budget.try_acquire()
         ):
             return
 
-        if not (doc := prepare_completion_request_doc(view)):
+        version = view.change_count()
+        is_eager = self.settings_snapshot.completion_cycling == "eager"
+        callback = functools.partial(
+            self._on_prefetch_completions,
+            view,
+            version=version,
+            region=sel[0].to_tuple(),
+            cache_key=self._make_completion_cache_key(view),
+        )
+        request = REQ_GET_COMPLETIONS_CYCLING if is_eager else REQ_GET_COMPLETIONS
+        if self._send_completion_doc_request(session, view, request, callback):
+            self._pending_prefetches[view.id()] = (version, sel[0].to_tuple())
+
+    def request_completion_alternatives(self, view: sublime.View, *, step: int = 0) -> bool:
+        """
+        Request alternatives ("getCompletionsCycling") of the visible completions if they haven't been requested.
+        They will be merged into the visible completions and then the completion index is moved by `step`.
+
+        :returns:   Whether the request has been sent.
+        """
+        vcm = ViewCompletionManager(view)
+        if not (
+            (session := self.weaksession())
+            and vcm.is_visible
+            and not vcm.has_requested_alternatives
+            and len(sel := view.sel()) == 1
+        ):
+            return False
+
+        callback = functools.partial(
+            self._on_get_completion_alternatives,
+            view,
+            region=sel[0].to_tuple(),
+            step=step,
+            cache_key=self._make_completion_cache_key(view),
+        )
+        if not self._send_completion_doc_request(session, view, REQ_GET_COMPLETIONS_CYCLING, callback):
+            return False
+
+        vcm.has_requested_alternatives = True
+        return True
+
+    def _request_completions(
+        self,
+        view: sublime.View,
+        request: str,
+        *,
+        no_callback: bool = False,
+        cache_key: CompletionCacheKey | None = None,
+        trace: CompletionTrace | None = None,
+    ) -> None:
+        vcm = ViewCompletionManager(view)
+        vcm.hide()
+
+        if not (
+            (session := self.weaksession())
+            and self._account_status.has_signed_in
+            and self._account_status.is_authorized
+            and len(sel := view.sel()) == 1
+        ):
             return
 
         if no_callback:
-            callback = lambda _: None  # noqa: E731
+            callback = lambda *_, **__: None  # noqa: E731
         else:
+            callback = functools.partial(
+                self._on_get_completions,
+                view,
+                region=sel[0].to_tuple(),
+                cache_key=cache_key,
+                trace=trace,
+            )
+
+        # the result of a request without callback is discarded, so it's not worth re-sending the whole buffer
+        if (
+            self._send_completion_doc_request(
+                session,
+                view,
+                request,
+                callback,
+                can_fall_back=not no_callback,
+                trace=trace,
+            )
+            and not no_callback
+        ):
+            self._completion_delay.record_request()
             vcm.is_waiting = True
+            self._start_waiting_indicator(view)
+
+    def _send_completion_doc_request(
+        self,
+        session: Session,
+        view: sublime.View,
+        request: str,
+        callback: Callable[..., None],
+        *,
+        can_fall_back: bool = True,
+        trace: CompletionTrace | None = None,
+    ) -> bool:
+        """
+        Send a completion request with the `doc` param of the `view`.
+        The `callback` is called with the response payload and the `row_offset` of the sent document.
+        In "incremental" mode, the request is sent again with the whole buffer if the server's copy of the document
+        is out of sync, unless `can_fall_back` is `False`.
+
+        :returns:   Whether the request has been sent.
+        """
+        # in "incremental" mode, the server uses the document which LSP has synced to it
+        is_incremental = self.settings_snapshot.completion_document_sync == "incremental"
+        if is_incremental:
+            self._purge_document_changes(session, view)
+
+        if not (prepared := self._prepare_completion_request_doc(view, include_source=not is_incremental)):
+            return False
+        doc, row_offset = prepared
+        if trace:
+            trace.mark("doc_prepared")
+
+        on_error = functools.partial(
+            self._on_get_completions_error,
+            view,
+            request,
+            callback,
+            is_incremental and can_fall_back,
+        )
+        self._send_completion_request(
+            session,
+            view,
+            Request(request, {"doc": doc}),
+            functools.partial(callback, row_offset=row_offset),
+            on_error,
+        )
+        if trace:
+            trace.mark("request_sent")
+        return True
+
+    def _send_completion_request(
+        self,
+        session: Session,
+        view: sublime.View,
+        request: Request,
+        on_result: Callable[[Any], None],
+        on_error: Callable[[Any], None],
+    ) -> None:
+        """Send a completion request which is tracked until it's settled or cancelled."""
+        view_id = view.id()
+        request_id = 0
+        sent_at = time.monotonic()
+
+        def settle(handler: Callable[[Any], None], payload: Any) -> None:
+            self._completion_requests.discard(view_id, request_id)
+            if handler is on_result:
+                self._completion_delay.record_rtt(time.monotonic() - sent_at)
+            handler(payload)
+
+        request_id = session.send_request_async(
+            request,
+            functools.partial(settle, on_result),
+            functools.partial(settle, on_error),
+        )
+        self._completion_requests.add(view_id, request_id)
+
+    def _start_waiting_indicator(self, view: sublime.View) -> None:
+        # tracked here rather than by `ViewCompletionManager.is_waiting`, which other sessions may reset
+        if view.id() not in self._waiting_view_ids:
+            self._waiting_view_ids.add(view.id())
             if self._activity_indicator:
                 self._activity_indicator.start()
-            callback = functools.partial(self._on_get_completions, view, region=sel[0].to_tuple())
 
-        session.send_request_async(Request(request, {"doc": doc}), callback)
+    def _stop_waiting_indicator(self, view: sublime.View) -> None:
+        if view.id() in self._waiting_view_ids:
+            self._waiting_view_ids.discard(view.id())
+            if self._activity_indicator:
+                self._activity_indicator.stop()
+
+    def cancel_completion_requests(self, view: sublime.View) -> None:
+        """Cancel in-flight completion requests of the `view` because their responses are no longer wanted."""
+        # the prefetch request is cancelled as well and its callback won't be called
+        self._pending_prefetches.pop(view.id(), None)
+        if not (request_ids := self._completion_requests.pop_for_cancellation(view.id())):
+            return
+
+        if session := self.weaksession():
+            for request_id in request_ids:
+                session.cancel_request(request_id)
+
+        # callbacks of cancelled requests won't be called, so the waiting state has to be reset here
+        if (vcm := ViewCompletionManager(view)).is_waiting:
+            self._completion_delay.record_waste()
+            vcm.is_waiting = False
+        self._stop_waiting_indicator(view)
+
+    def handle_view_pre_close(self, view: sublime.View) -> None:
+        self.cancel_completion_requests(view)
+        self._completion_delay.forget(view.id())
+        self._keystroke_times.pop(view.id(), None)
+
+    def _make_completion_cache_key(self, view: sublime.View) -> CompletionCacheKey | None:
+        """The key of the current document state of the `view` in the completion cache, unless it's disabled."""
+        return CompletionCache.make_key(view) if self._completion_cache.max_size else None
+
+    def _show_cached_completions(
+        self,
+        view: sublime.View,
+        cache_key: CompletionCacheKey | None,
+        *,
+        trace: CompletionTrace | None = None,
+    ) -> bool:
+        """Show completions from the cache if the document around the cursor is the same as a previous request."""
+        if not (
+            (session := self.weaksession()) and cache_key and (completions := self._completion_cache.get(cache_key))
+        ):
+            return False
+
+        ViewCompletionManager(view).show(completions, 0, self.settings_snapshot.completion_style)
+        self._on_completions_shown(session, view)
+        if trace:
+            trace.outcome = "cache"
+            trace.mark("rendered")
+            self._latency_metrics.record(trace)
+        return True
+
+    def _prepare_completion_request_doc(
+        self,
+        view: sublime.View,
+        *,
+        include_source: bool = True,
+    ) -> tuple[CopilotDocType, int] | None:
+        """
+        Prepare the `doc` param for completion requests. If the source is windowed by the "completion_context_window"
+        setting, the returned row offset has to be added back to positions in the response.
+        """
+        if not (doc := prepare_completion_request_doc(view, include_source=include_source)):
+            return None
+
+        row_offset = 0
+        if include_source and (
+            budget := get_completion_context_budget(
+                self.settings_snapshot.completion_context_window,
+                doc["languageId"],
+            )
+        ):
+            row_offset = window_completion_request_doc(view, doc, *budget)
+        return doc, row_offset
+
+    @staticmethod
+    def _purge_document_changes(session: Session, view: sublime.View) -> None:
+        """Make sure LSP has sent pending `didChange` notifications so that the server has the latest document."""
+        if session_view := session.session_view_for_view_async(view):
+            session_view.session_buffer.purge_changes_async(view)
+
+    def _on_get_completions_error(
+        self,
+        view: sublime.View,
+        request: str,
+        callback: Callable[..., None],
+        can_fall_back: bool,
+        error: Any,
+    ) -> None:
+        if (
+            can_fall_back
+            and is_document_out_of_sync_error(error)
+            and (session := self.weaksession())
+            and view.is_valid()
+            and (prepared := self._prepare_completion_request_doc(view))
+        ):
+            # the server's copy of the document is stale, so fall back to sending the full source
+            doc, row_offset = prepared
+            on_error = lambda _: callback({"completions": []})  # noqa: E731
+            self._send_completion_request(
+                session,
+                view,
+                Request(request, {"doc": doc}),
+                functools.partial(callback, row_offset=row_offset),
+                on_error,
+            )
+            return
+
+        # we won't get completions, but the waiting state still has to be reset
+        callback({"completions": []})
 
     def _on_get_completions(
         self,
         view: sublime.View,
         payload: CopilotPayloadCompletions,
         region: tuple[int, int],
+        row_offset: int = 0,
+        cache_key: CompletionCacheKey | None = None,
+        trace: CompletionTrace | None = None,
     ) -> None:
+        if trace:
+            trace.mark("response_received")
+
         vcm = ViewCompletionManager(view)
         vcm.is_waiting = False
-        if self._activity_indicator:
-            self._activity_indicator.stop()
+        self._stop_waiting_indicator(view)
 
         if not (session := self.weaksession()):
             return
@@ -436,11 +817,78 @@ class CopilotPlugin(NpmClientHandler):
 
         # re-request completions because the cursor position changed during awaiting Copilot's response
         if sel[0].to_tuple() != region:
+            self._completion_delay.record_waste()
             self.request_get_completions(view)
             return
 
         if not (completions := payload["completions"]):
             return
 
-        preprocess_completions(view, completions)
-        vcm.show(completions, 0, get_session_setting(session, "completion_style"))
+        preprocess_completions(view, completions, row_offset=row_offset)
+        if trace:
+            trace.mark("preprocessed")
+        if cache_key:
+            self._completion_cache.put(cache_key, completions)
+        vcm.show(completions, 0, self.settings_snapshot.completion_style)
+        if trace:
+            trace.mark("rendered")
+            self._latency_metrics.record(trace)
+        self._on_completions_shown(session, view)
+
+    def _on_prefetch_completions(
+        self,
+        view: sublime.View,
+        payload: CopilotPayloadCompletions,
+        version: int,
+        region: tuple[int, int],
+        row_offset: int = 0,
+        cache_key: CompletionCacheKey | None = None,
+    ) -> None:
+        if (prefetch := self._pending_prefetches.get(view.id())) and prefetch[0] == version:
+            del self._pending_prefetches[view.id()]
+
+        # positions in the response are only valid for the document state which was sent
+        if not (
+            (session := self.weaksession())
+            and (completions := payload["completions"])
+            and view.is_valid()
+            and view.change_count() == version
+        ):
+            return
+
+        preprocess_completions(view, completions, row_offset=row_offset)
+        if cache_key:
+            self._completion_cache.put(cache_key, completions)
+
+        vcm = ViewCompletionManager(view)
+        if not vcm.is_visible and len(sel := view.sel()) == 1 and sel[0].to_tuple() == region:
+            vcm.show(completions, 0, self.settings_snapshot.completion_style)
+            self._on_completions_shown(session, view)
+
+    def _on_get_completion_alternatives(
+        self,
+        view: sublime.View,
+        payload: CopilotPayloadCompletions,
+        region: tuple[int, int],
+        step: int,
+        row_offset: int = 0,
+        cache_key: CompletionCacheKey | None = None,
+    ) -> None:
+        vcm = ViewCompletionManager(view)
+        # alternatives are for the visible completions and they are outdated if the cursor has moved
+        if not (vcm.is_visible and len(sel := view.sel()) == 1 and sel[0].to_tuple() == region):
+            return
+
+        alternatives = payload["completions"]
+        preprocess_completions(view, alternatives, row_offset=row_offset)
+        completions = merge_completions(vcm.completions, alternatives)
+        if cache_key:
+            self._completion_cache.put(cache_key, completions)
+        vcm.show(completions, vcm.completion_index + step)
+
+    def _on_completions_shown(self, session: Session, view: sublime.View) -> None:
+        completion_cycling = self.settings_snapshot.completion_cycling
+        # in "eager" mode, the shown completions are from "getCompletionsCycling" already
+        ViewCompletionManager(view).has_requested_alternatives = completion_cycling == "eager"
+        if completion_cycling == "speculative":
+            self.request_completion_alternatives(view)
@@ -67,10 +67,8 @@ from .types import (
 )
 from .ui import ViewCompletionManager, ViewPanelCompletionManager, WindowConversationManager
 from .utils import (
-    find_index_by_key_value,
     find_view_by_id,
     find_window_by_id,
-    get_session_setting,
     message_dialog,
     mutable_view,
     ok_cancel_dialog,
@@ -119,8 +117,8 @@ class BaseCopilotCommand(ABC):
     session_name = PACKAGE_NAME
     requirement = REQUIRE_SIGN_IN | REQUIRE_AUTHORIZED
 
-    def _can_meet_requirement(self, session: Session) -> bool:
-        if get_session_setting(session, "debug"):
+    def _can_meet_requirement(self, plugin: CopilotPlugin) -> bool:
+        if plugin.settings_snapshot.debug:
             return True
 
         account_status = CopilotPlugin.get_account_status()
@@ -137,11 +135,12 @@ class CopilotTextCommand(BaseCopilotCommand, LspTextCommand, ABC):
 
     def _record_telemetry(
         self,
+        plugin: CopilotPlugin,
         session: Session,
         request: str,
         payload: CopilotPayloadNotifyAccepted | CopilotPayloadNotifyRejected,
     ) -> None:
-        if not get_session_setting(session, "telemetry"):
+        if not plugin.settings_snapshot.telemetry:
             return
 
         session.send_request(Request(request, payload), lambda _: None)
@@ -149,14 +148,19 @@ class CopilotTextCommand(BaseCopilotCommand, LspTextCommand, ABC):
     @must_be_active_view(failed_return=False)
     @_provide_plugin_session(failed_return=False)
     def is_enabled(self, plugin: CopilotPlugin, session: Session) -> bool:  # type: ignore
-        return self._can_meet_requirement(session)
+        return self._can_meet_requirement(plugin)
 
 
 class CopilotWindowCommand(BaseCopilotCommand, LspWindowCommand, ABC):
     def is_enabled(self) -> bool:
-        if not (session := self.session()):
+        if not (
+            (session := self.session())
+            and (window_attr := CopilotPlugin.window_attrs.get(self.window))
+            and (plugin := window_attr.client)
+            and plugin.weaksession() is session
+        ):
             return False
-        return self._can_meet_requirement(session)
+        return self._can_meet_requirement(plugin)
 
 
 class CopilotGetVersionCommand(CopilotTextCommand):
@@ -488,7 +492,7 @@ class CopilotConversationTurnDeleteCommand(CopilotTextCommand):
             return
 
         # Fixes: https://github.com/TerminalFi/LSP-copilot/issues/181
-        index = find_index_by_key_value(wcm.conversation, "turnId", turn_id) + 1
+        index = wcm.find_turn_index(turn_id) + 1
         if index >= len(wcm.conversation):
             return
         retrieved_turn_id = wcm.conversation[index]["turnId"]
@@ -523,11 +527,10 @@ class CopilotConversationTurnDeleteCommand(CopilotTextCommand):
         if wcm.conversation_id != conversation_id:
             return
 
-        index = find_index_by_key_value(wcm.conversation, "turnId", turn_id)
-        conversation = wcm.conversation
-        del conversation[index:]
+        if (index := wcm.find_turn_index(turn_id)) == -1:
+            return
         wcm.follow_up = ""
-        wcm.conversation = conversation
+        wcm.conversation = wcm.conversation[:index]
         wcm.update()
 
     def is_enabled(self, event: dict[Any, Any] | None = None, point: int | None = None) -> bool:  # type: ignore
@@ -540,7 +543,7 @@ class CopilotConversationCopyCodeCommand(CopilotWindowCommand):
             return
 
         wcm = WindowConversationManager(window)
-        if not (code := wcm.code_block_index.get(str(code_block_index), None)):
+        if not (code := wcm.get_code_block(code_block_index)):
             return
 
         sublime.set_clipboard(code)
@@ -557,7 +560,7 @@ class CopilotConversationInsertCodeShimCommand(CopilotWindowCommand):
             status_message("Window has no active view")
             return
 
-        if not (code := wcm.code_block_index.get(str(code_block_index), None)):
+        if not (code := wcm.get_code_block(code_block_index)):
             status_message(f"Failed to find code based on index. {code_block_index}")
             return
 
@@ -604,6 +607,23 @@ class CopilotGetPromptCommand(CopilotTextCommand):
         window.run_command("show_panel", {"panel": f"output.{COPILOT_OUTPUT_PANEL_PREFIX}.prompt_view"})
 
 
+class CopilotShowCompletionMetricsCommand(CopilotTextCommand):
+    requirement = REQUIRE_NOTHING
+
+    @_provide_plugin_session()
+    def run(self, plugin: CopilotPlugin, session: Session, _: sublime.Edit) -> None:
+        if not (window := self.view.window()):
+            return
+        view = window.create_output_panel(f"{COPILOT_OUTPUT_PANEL_PREFIX}.completion_metrics", unlisted=True)
+        view.assign_syntax("scope:source.json")
+
+        with mutable_view(view) as view:
+            view.run_command("select_all")
+            view.run_command("right_delete")
+            view.run_command("append", {"characters": json.dumps(plugin.get_completion_metrics(), indent=4)})
+        window.run_command("show_panel", {"panel": f"output.{COPILOT_OUTPUT_PANEL_PREFIX}.completion_metrics"})
+
+
 class CopilotConversationTemplatesCommand(CopilotTextCommand):
     @_provide_plugin_session()
     def run(self, plugin: CopilotPlugin, session: Session, _: sublime.Edit) -> None:
@@ -662,12 +682,14 @@ class CopilotAcceptCompletionCommand(CopilotTextCommand):
         self.view.insert(edit, source_line_region.begin(), completion["text"])
         self.view.show(self.view.sel(), show_surrounds=False, animate=self.view.settings().get("animation_enabled"))
 
-        self._record_telemetry(session, REQ_NOTIFY_ACCEPTED, {"uuid": completion["uuid"]})
+        self._record_telemetry(plugin, session, REQ_NOTIFY_ACCEPTED, {"uuid": completion["uuid"]})
+        # the user usually keeps going right after accepting, so get the next completion ready
+        sublime.set_timeout_async(lambda: plugin.prefetch_completions(self.view))
 
         other_uuids = [completion["uuid"] for completion in vcm.completions]
         other_uuids.remove(completion["uuid"])
         if other_uuids:
-            self._record_telemetry(session, REQ_NOTIFY_REJECTED, {"uuids": other_uuids})
+            self._record_telemetry(plugin, session, REQ_NOTIFY_REJECTED, {"uuids": other_uuids})
 
 
 class CopilotRejectCompletionCommand(CopilotTextCommand):
@@ -677,6 +699,7 @@ class CopilotRejectCompletionCommand(CopilotTextCommand):
         vcm.hide()
 
         self._record_telemetry(
+            plugin,
             session,
             REQ_NOTIFY_REJECTED,
             {"uuids": [completion["uuid"] for completion in vcm.completions]},
@@ -705,12 +728,20 @@ class CopilotGetPanelCompletionsCommand(CopilotTextCommand):
 
 
 class CopilotPreviousCompletionCommand(CopilotTextCommand):
-    def run(self, _: sublime.Edit) -> None:
+    @_provide_plugin_session()
+    def run(self, plugin: CopilotPlugin, session: Session, _: sublime.Edit) -> None:
+        # alternatives may not have been fetched in non-"eager" "completion_cycling" modes
+        if plugin.request_completion_alternatives(self.view, step=-1):
+            return
         ViewCompletionManager(self.view).show_previous_completion()
 
 
 class CopilotNextCompletionCommand(CopilotTextCommand):
-    def run(self, _: sublime.Edit) -> None:
+    @_provide_plugin_session()
+    def run(self, plugin: CopilotPlugin, session: Session, _: sublime.Edit) -> None:
+        # alternatives may not have been fetched in non-"eager" "completion_cycling" modes
+        if plugin.request_completion_alternatives(self.view, step=1):
+            return
         ViewCompletionManager(self.view).show_next_completion()
 
 
@@ -719,7 +750,7 @@ class CopilotCheckStatusCommand(CopilotTextCommand):
 
     @_provide_plugin_session()
     def run(self, plugin: CopilotPlugin, session: Session, _: sublime.Edit) -> None:
-        local_checks = get_session_setting(session, "local_checks")
+        local_checks = plugin.settings_snapshot.local_checks
         session.send_request(Request(REQ_CHECK_STATUS, {"localChecksOnly": local_checks}), self._on_result_check_status)
 
     def _on_result_check_status(self, payload: CopilotPayloadSignInConfirm | CopilotPayloadSignOut) -> None:
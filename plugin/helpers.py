@@ -1,24 +1,28 @@
 from __future__ import annotations
 
+import copy
 import itertools
 import os
 import re
 import threading
 import time
+import weakref
+from collections import OrderedDict, deque
 from operator import itemgetter
 from pathlib import Path
-from typing import Any, Callable, Literal, Sequence, cast
+from typing import Any, Callable, Literal, Mapping, Sequence, Tuple, cast
 
 import sublime
 from LSP.plugin.core.protocol import Position as LspPosition
 from LSP.plugin.core.protocol import Range as LspRange
 from LSP.plugin.core.url import filename_to_uri
-from more_itertools import duplicates_everseen, first_true
+from more_itertools import duplicates_everseen, first_true, unique_everseen
 from wcmatch import glob
 
 from .constants import COPILOT_WINDOW_SETTINGS_PREFIX, PACKAGE_NAME
 from .log import log_error
-from .settings import get_plugin_setting_dotted
+from .scheduler import scheduler
+from .settings import get_settings_snapshot
 from .types import (
     CopilotConversationTemplates,
     CopilotDocType,
@@ -32,6 +36,7 @@ from .types import (
 from .utils import (
     all_views,
     all_windows,
+    clamp,
     drop_falsy,
     erase_copilot_setting,
     erase_copilot_view_setting,
@@ -44,31 +49,66 @@ from .utils import (
 
 
 class ActivityIndicator:
+    """
+    Animates a spinner via `callback` while any activity is going on. Overlapping activities, e.g., completion
+    requests of several views, are reference counted. No thread is created. Instead, all active indicators are
+    animated by a single repeating callback on the shared scheduler.
+    """
+
+    ANIMATION = ("⣷", "⣯", "⣟", "⡿", "⢿", "⣻", "⣽", "⣾")  # taken from Package Control
+    INTERVAL_S = 0.1
+
+    _active: weakref.WeakSet[ActivityIndicator] = weakref.WeakSet()
+
     def __init__(self, callback: Callable[[dict[str, Any]], None] | None = None) -> None:
-        self.thread: threading.Thread | None = None
-        self.animation = ["⣷", "⣯", "⣟", "⡿", "⢿", "⣻", "⣽", "⣾"]  # taken from Package Control
-        self.animation_cycled = itertools.cycle(self.animation)
+        self.animation_cycled = itertools.cycle(self.ANIMATION)
         self.callback = callback
-        self.stop_event = threading.Event()
+        self.activity_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self) -> bool:
+        return self.activity_count > 0
 
     def start(self) -> None:
-        if not (self.thread and self.thread.is_alive()):
-            self.stop_event.clear()
-            self.thread = threading.Thread(target=self._run, daemon=True)
-            self.thread.start()
+        """Counts an activity in. The spinner starts with the first activity."""
+        with self._lock:
+            self.activity_count += 1
+            if self.activity_count > 1:
+                return
+            self._active.add(self)
+        self._animate()
+        if not scheduler.is_scheduled("activity_indicator"):
+            scheduler.schedule("activity_indicator", self.INTERVAL_S, self._tick)
 
     def stop(self) -> None:
-        if self.thread:
-            self.stop_event.set()
-            self.thread.join()
-            if self.callback:
-                self.callback({"is_waiting": ""})
+        """Counts an activity out. The spinner is cleared once there is no activity. It doesn't block."""
+        with self._lock:
+            if self.activity_count == 0:
+                return
+            self.activity_count -= 1
+            if self.activity_count:
+                return
+            self._active.discard(self)
+        if self.callback:
+            self.callback({"is_waiting": ""})
+
+    def reset(self) -> None:
+        """Forgets all activities without clearing the spinner."""
+        with self._lock:
+            self.activity_count = 0
+            self._active.discard(self)
+
+    def _animate(self) -> None:
+        if self.callback and self.is_active:
+            self.callback({"is_waiting": next(self.animation_cycled)})
 
-    def _run(self) -> None:
-        while not self.stop_event.is_set():
-            if self.callback:
-                self.callback({"is_waiting": next(self.animation_cycled)})
-            time.sleep(0.1)
+    @classmethod
+    def _tick(cls) -> None:
+        for indicator in tuple(cls._active):
+            indicator._animate()
+        if cls._active:
+            scheduler.schedule("activity_indicator", cls.INTERVAL_S, cls._tick)
 
 
 class GithubInfo:
@@ -169,6 +209,263 @@ class CopilotIgnore:
         return False
 
 
+CompletionCacheKey = Tuple[str, int, int, str]
+"""`(uri, hash of the text before the cursor, hash of the line suffix after the cursor, language ID)`"""
+
+
+class CompletionCache:
+    """An LRU cache of preprocessed completions keyed by the document state around the cursor."""
+
+    def __init__(self, max_size: int = 64, ttl: float = 300) -> None:
+        self.max_size = max_size
+        """The max number of cached entries. `0` disables the cache."""
+        self.ttl = ttl
+        """Seconds before an entry expires. `0` means entries never expire."""
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[CompletionCacheKey, tuple[float, list[CopilotPayloadCompletion]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    @staticmethod
+    def make_key(view: sublime.View) -> CompletionCacheKey | None:
+        if len(sel := view.sel()) != 1:
+            return None
+
+        point = sel[0].begin()
+        uri = filename_to_uri(file_path) if (file_path := view.file_name()) else f"buffer:{view.buffer().id()}"
+        return (
+            uri,
+            hash(view.substr(sublime.Region(0, point))),
+            hash(view.substr(sublime.Region(point, view.line(point).end()))),
+            get_view_language_id(view),
+        )
+
+    def configure(self, *, max_size: int, ttl: float) -> None:
+        with self._lock:
+            self.max_size = max(0, max_size)
+            self.ttl = max(0, ttl)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: CompletionCacheKey) -> list[CopilotPayloadCompletion] | None:
+        """Get a copy of the cached completions for `key`, if any."""
+        with self._lock:
+            if (entry := self._entries.get(key)) and not self._is_expired(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key: CompletionCacheKey, completions: list[CopilotPayloadCompletion]) -> None:
+        with self._lock:
+            if not (self.max_size and completions):
+                return
+            self._entries[key] = (time.monotonic(), copy.deepcopy(completions))
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.monotonic() - created_at > self.ttl
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        while self._entries and self._is_expired(next(iter(self._entries.values()))[0]):
+            self._entries.popitem(last=False)
+
+
+class CompletionRequestTracker:
+    """Tracks in-flight completion requests per view, so that superseded requests can be cancelled."""
+
+    def __init__(self) -> None:
+        self.issued = 0
+        self.cancelled = 0
+        self._requests: dict[int, set[int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            in_flight = sum(map(len, self._requests.values()))
+        return {"issued": self.issued, "cancelled": self.cancelled, "in_flight": in_flight}
+
+    def add(self, view_id: int, request_id: int) -> None:
+        with self._lock:
+            self._requests.setdefault(view_id, set()).add(request_id)
+            self.issued += 1
+
+    def discard(self, view_id: int, request_id: int) -> None:
+        with self._lock:
+            if (request_ids := self._requests.get(view_id)) is not None:
+                request_ids.discard(request_id)
+                if not request_ids:
+                    del self._requests[view_id]
+
+    def pop_for_cancellation(self, view_id: int) -> set[int]:
+        """Remove and return in-flight requests of the view. They are counted as cancelled."""
+        with self._lock:
+            request_ids = self._requests.pop(view_id, set())
+            self.cancelled += len(request_ids)
+        return request_ids
+
+
+class RateLimiter:
+    """Allows at most `limit` acquisitions in any sliding window of `period_s` seconds."""
+
+    def __init__(self, limit: int, period_s: float = 60) -> None:
+        self.limit = limit
+        self.period_s = period_s
+        self.granted = 0
+        self.denied = 0
+        self._timestamps: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"limit": self.limit, "granted": self.granted, "denied": self.denied}
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            while self._timestamps and now - self._timestamps[0] >= self.period_s:
+                self._timestamps.popleft()
+
+            if len(self._timestamps) >= self.limit:
+                self.denied += 1
+                return False
+
+            self._timestamps.append(now)
+            self.granted += 1
+            return True
+
+
+class AdaptiveCompletionDelay:
+    """
+    Picks the debounce delay of completion requests per view from the typing cadence and the server's latency.
+
+    A request is wasted if the user types again before its response arrives, i.e., when the pause in typing
+    is between the delay `d` and `d + rtt`. The chosen delay minimizes that probability, estimated from recent
+    keystroke intervals of the view, plus `d * latency_weight`. The weight is tuned so that the observed waste
+    ratio stays around `TARGET_WASTE_RATIO`.
+    """
+
+    DEFAULT_DELAY = 0.3
+    MIN_DELAY = 0.05
+    MAX_DELAY = 0.6
+    DELAY_STEP = 0.025
+    MAX_INTERVAL = 2.0
+    """Keystroke intervals are capped to this. Longer ones are pauses rather than typing."""
+    MIN_SAMPLES = 8
+    SAMPLE_SIZE = 64
+    RTT_SMOOTHING = 0.2
+    TARGET_WASTE_RATIO = 0.25
+    TUNING_WINDOW = 20
+    """The latency weight is tuned every this many requests."""
+
+    def __init__(self, *, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.issued = 0
+        self.wasted = 0
+        self.rtt = 0.0
+        """The smoothed round-trip time of completion requests in seconds."""
+        self.latency_weight = 1.0
+        self._candidates = [
+            round(self.MIN_DELAY + self.DELAY_STEP * n, 3)
+            for n in range(round((self.MAX_DELAY - self.MIN_DELAY) / self.DELAY_STEP) + 1)
+        ]
+        self._delays: dict[int, float] = {}
+        self._intervals: dict[int, deque[float]] = {}
+        self._last_keystrokes: dict[int, float] = {}
+        self._window_issued = 0
+        self._window_wasted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def waste_ratio(self) -> float:
+        return self.wasted / self.issued if self.issued else 0.0
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            delays = list(self._delays.values())
+        return {
+            "enabled": self.enabled,
+            "delay_ms": round(1000 * (sum(delays) / len(delays) if delays else self.DEFAULT_DELAY)),
+            "rtt_ms": round(1000 * self.rtt),
+            "issued": self.issued,
+            "wasted": self.wasted,
+            "waste_ratio": round(self.waste_ratio, 3),
+            "latency_weight": round(self.latency_weight, 3),
+        }
+
+    def get_delay(self, view_id: int) -> float:
+        """Record a keystroke in the view and return the delay for the next completion request."""
+        now = time.monotonic()
+        with self._lock:
+            if (last_keystroke := self._last_keystrokes.get(view_id)) is not None:
+                intervals = self._intervals.setdefault(view_id, deque(maxlen=self.SAMPLE_SIZE))
+                intervals.append(min(now - last_keystroke, self.MAX_INTERVAL))
+            self._last_keystrokes[view_id] = now
+
+            if not self.enabled:
+                return self.DEFAULT_DELAY
+
+            intervals = self._intervals.get(view_id) or deque()
+            delay = self._pick_delay(intervals) if len(intervals) >= self.MIN_SAMPLES else self.DEFAULT_DELAY
+            self._delays[view_id] = delay
+        return delay
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.issued += 1
+            self._window_issued += 1
+            if self._window_issued >= self.TUNING_WINDOW:
+                self._tune()
+
+    def record_waste(self) -> None:
+        with self._lock:
+            self.wasted += 1
+            self._window_wasted += 1
+
+    def record_rtt(self, rtt: float) -> None:
+        with self._lock:
+            self.rtt = rtt if not self.rtt else self.rtt + self.RTT_SMOOTHING * (rtt - self.rtt)
+
+    def forget(self, view_id: int) -> None:
+        with self._lock:
+            self._delays.pop(view_id, None)
+            self._intervals.pop(view_id, None)
+            self._last_keystrokes.pop(view_id, None)
+
+    def _pick_delay(self, intervals: Sequence[float]) -> float:
+        rtt = self.rtt or self.DEFAULT_DELAY
+
+        def cost(delay: float) -> float:
+            wasted = sum(delay < interval < delay + rtt for interval in intervals) / len(intervals)
+            return wasted + self.latency_weight * delay
+
+        return min(self._candidates, key=cost)
+
+    def _tune(self) -> None:
+        waste_ratio = self._window_wasted / self._window_issued
+        if waste_ratio > self.TARGET_WASTE_RATIO:
+            self.latency_weight *= 0.8  # be more patient
+        elif waste_ratio < self.TARGET_WASTE_RATIO / 2:
+            self.latency_weight *= 1.25  # be more eager
+        self.latency_weight = clamp(self.latency_weight, 0.25, 4.0)
+        self._window_issued = self._window_wasted = 0
+
+
 def st_point_to_lsp_position(point: int, view: sublime.View) -> LspPosition:
     row, col = view.rowcol_utf16(point)
     return {"line": row, "character": col}
@@ -178,6 +475,11 @@ def lsp_position_to_st_point(position: LspPosition, view: sublime.View) -> int:
     return view.text_point_utf16(position["line"], position["character"])
 
 
+def rebase_lsp_position(position: LspPosition, row_offset: int) -> None:
+    """Shift `position` by `row_offset` rows in-place."""
+    position["line"] += row_offset
+
+
 def st_region_to_lsp_range(region: sublime.Region, view: sublime.View) -> LspRange:
     return {
         "start": st_point_to_lsp_position(region.begin(), view),
@@ -192,14 +494,21 @@ def lsp_range_to_st_region(range_: LspRange, view: sublime.View) -> sublime.Regi
     )
 
 
-def prepare_completion_request_doc(view: sublime.View) -> CopilotDocType | None:
+def prepare_completion_request_doc(view: sublime.View, *, include_source: bool = True) -> CopilotDocType | None:
+    """
+    Prepare the `doc` param for completion requests.
+
+    :param      view:            The view
+    :param      include_source:  Whether to send the whole document. If `False`, the server is expected to use
+                                 the document synced by LSP (`didOpen`/`didChange`), which is identified by
+                                 `uri` and `version`.
+    """
     if not view.file_name():
         return None
 
     selection = view.sel()[0]
     file_path = view.file_name() or f"buffer:{view.buffer().id()}"
-    return {
-        "source": view.substr(sublime.Region(0, view.size())),
+    doc: CopilotDocType = {
         "tabSize": cast(int, view.settings().get("tab_size")),
         "indentSize": 1,  # there is no such concept in ST
         "insertSpaces": cast(bool, view.settings().get("translate_tabs_to_spaces")),
@@ -208,10 +517,80 @@ def prepare_completion_request_doc(view: sublime.View) -> CopilotDocType | None:
         "relativePath": get_project_relative_path(file_path),
         "languageId": get_view_language_id(view),
         "position": st_point_to_lsp_position(selection.begin(), view),
-        # Buffer Version. Generally this is handled by LSP, but we need to handle it here
-        # Will need to test getting the version from LSP
+        # Buffer Version. LSP uses `view.change_count()` as the version of synced documents as well.
         "version": view.change_count(),
     }
+    if include_source:
+        doc["source"] = view.substr(sublime.Region(0, view.size()))
+    return doc
+
+
+def get_completion_context_budget(
+    config: Mapping[str, Mapping[str, Any]] | None,
+    language_id: str,
+) -> tuple[int, float] | None:
+    """
+    Get `(budget_in_bytes, prefix_ratio)` for `language_id` from the "completion_context_window" setting.
+    If there is no budget, `None` is returned and the whole document should be sent.
+    """
+    if not config:
+        return None
+
+    window = {**config.get("*", {}), **config.get(language_id, {})}
+    if (budget := int(window.get("budget") or 0)) <= 0:
+        return None
+    if window.get("unit", "tokens") == "tokens":
+        budget *= 4  # a token is estimated as 4 bytes of source code
+    return budget, clamp(float(window.get("prefix_ratio", 0.75)), 0.0, 1.0)
+
+
+def window_completion_request_doc(view: sublime.View, doc: CopilotDocType, budget: int, prefix_ratio: float) -> int:
+    """
+    Replace `doc["source"]` with a window of about `budget` bytes around the cursor.
+
+    The window always starts at the beginning of a line (and never after the beginning of the cursor's line),
+    so only rows have to be rebased. The returned row offset has to be added back to rows in the response.
+    """
+    point = view.sel()[0].begin()
+    prefix_budget = int(budget * prefix_ratio)
+    suffix_budget = budget - prefix_budget
+
+    # a character takes at least 1 byte so this region is never shorter than the budget
+    cursor_line_begin = view.line(point).begin()
+    begin = max(0, point - prefix_budget)
+    if (line := view.line(begin)).begin() != begin:
+        begin = min(line.end() + 1, cursor_line_begin)
+    prefix = view.substr(sublime.Region(begin, point))
+    while len(prefix.encode("utf-8")) > prefix_budget and (newline := prefix.find("\n")) != -1:
+        prefix = prefix[newline + 1 :]
+
+    suffix = view.substr(sublime.Region(point, min(view.size(), point + suffix_budget)))
+    suffix = suffix.encode("utf-8")[:suffix_budget].decode("utf-8", "ignore")
+
+    row, col = view.rowcol_utf16(point)
+    row_offset = row - prefix.count("\n")
+    doc["source"] = prefix + suffix
+    doc["position"] = {"line": row - row_offset, "character": col}
+    return row_offset
+
+
+_DOCUMENT_OUT_OF_SYNC_MESSAGE_PATTERN = re.compile(
+    r"\bdocument\b.*\b(?:version mismatch|not (?:be )?found)\b",
+    re.IGNORECASE,
+)
+
+
+def is_document_out_of_sync_error(error: Any) -> bool:
+    """
+    Whether the `error` response means the server's copy of the document doesn't match the view. Other errors,
+    such as a model which is not found, must not match since each match re-sends the whole buffer.
+    """
+    if not isinstance(error, dict):
+        return False
+    # -32801 is "ContentModified" in the LSP specification
+    if error.get("code") == -32801:
+        return True
+    return bool(_DOCUMENT_OUT_OF_SYNC_MESSAGE_PATTERN.search(str(error.get("message", ""))))
 
 
 def prepare_conversation_turn_request(
@@ -307,8 +686,17 @@ def preprocess_chat_message(
     return is_template, message
 
 
-def preprocess_completions(view: sublime.View, completions: list[CopilotPayloadCompletion]) -> None:
-    """Preprocess the `completions` from "getCompletions" request."""
+def preprocess_completions(
+    view: sublime.View,
+    completions: list[CopilotPayloadCompletion],
+    *,
+    row_offset: int = 0,
+) -> None:
+    """
+    Preprocess the `completions` from "getCompletions" request.
+
+    :param      row_offset:  The row offset of the windowed source which was sent in the request
+    """
     # in-place de-duplication
     duplicate_indexes = list(
         map(
@@ -322,10 +710,22 @@ def preprocess_completions(view: sublime.View, completions: list[CopilotPayloadC
 
     # inject extra information for convenience
     for completion in completions:
+        if row_offset:
+            rebase_lsp_position(completion["position"], row_offset)
+            rebase_lsp_position(completion["range"]["start"], row_offset)
+            rebase_lsp_position(completion["range"]["end"], row_offset)
         completion["point"] = lsp_position_to_st_point(completion["position"], view)
         completion["region"] = lsp_range_to_st_region(completion["range"], view).to_tuple()
 
 
+def merge_completions(
+    completions: Sequence[CopilotPayloadCompletion],
+    alternatives: Sequence[CopilotPayloadCompletion],
+) -> list[CopilotPayloadCompletion]:
+    """Append `alternatives` to `completions` in order, skipping those whose `displayText` has been seen."""
+    return list(unique_everseen(itertools.chain(completions, alternatives), key=itemgetter("displayText")))
+
+
 def preprocess_panel_completions(view: sublime.View, completions: Sequence[CopilotPayloadPanelSolution]) -> None:
     """Preprocess the `completions` from "getCompletionsCycling" request."""
     for completion in completions:
@@ -333,4 +733,4 @@ def preprocess_panel_completions(view: sublime.View, completions: Sequence[Copil
 
 
 def is_debug_mode() -> bool:
-    return bool(get_plugin_setting_dotted("settings.debug", False))
+    return get_settings_snapshot().debug
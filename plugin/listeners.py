@@ -14,12 +14,15 @@ from .client import CopilotPlugin
 from .decorators import must_be_active_view
 from .helpers import CopilotIgnore
 from .ui import ViewCompletionManager, ViewPanelCompletionManager, WindowConversationManager
-from .utils import all_windows, get_copilot_view_setting, get_session_setting, set_copilot_view_setting
+from .utils import all_windows, view_registry, window_registry
 
 
 class ViewEventListener(sublime_plugin.ViewEventListener):
     def __init__(self, view: sublime.View) -> None:
         super().__init__(view)
+        view_registry.add(view)
+        self._is_modified = False
+        self._is_saving = False
 
     @classmethod
     def applies_to_primary_view_only(cls) -> bool:
@@ -28,22 +31,6 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
         # But we guard some of event listeners only work for the activate view.
         return False
 
-    @property
-    def _is_modified(self) -> bool:
-        return get_copilot_view_setting(self.view, "_is_modified", False)
-
-    @_is_modified.setter
-    def _is_modified(self, value: bool) -> None:
-        set_copilot_view_setting(self.view, "_is_modified", value)
-
-    @property
-    def _is_saving(self) -> bool:
-        return get_copilot_view_setting(self.view, "_is_saving", False)
-
-    @_is_saving.setter
-    def _is_saving(self, value: bool) -> None:
-        set_copilot_view_setting(self.view, "_is_saving", value)
-
     @must_be_active_view()
     def on_modified_async(self) -> None:
         self._is_modified = True
@@ -53,12 +40,17 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             return
 
         vcm = ViewCompletionManager(self.view)
-        vcm.handle_text_change()
+        if vcm.handle_text_change():
+            return
 
-        if not self._is_saving and get_session_setting(session, "auto_ask_completions") and not vcm.is_waiting:
+        if not self._is_saving and plugin.settings_snapshot.auto_ask_completions:
+            # in-flight requests are for the old content and will be superseded by the new request
+            plugin.cancel_completion_requests(self.view)
             plugin.request_get_completions(self.view)
 
     def on_activated_async(self) -> None:
+        # the view may have been attached to or detached from the session while it was inactive
+        CopilotPlugin.forget_view(self.view)
         _, session = CopilotPlugin.plugin_session(self.view)
 
         #        if (session and CopilotPlugin.should_ignore(self.view)) or (
@@ -76,12 +68,21 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
     def on_deactivated_async(self) -> None:
         ViewCompletionManager(self.view).hide()
 
+        if plugin := CopilotPlugin.from_view(self.view):
+            plugin.cancel_completion_requests(self.view)
+
     def on_pre_close(self) -> None:
+        if plugin := CopilotPlugin.from_view(self.view):
+            plugin.handle_view_pre_close(self.view)
+
         # close corresponding panel completion
         ViewPanelCompletionManager(self.view).close()
 
     def on_close(self) -> None:
         ViewCompletionManager(self.view).handle_close()
+        ViewPanelCompletionManager(self.view).handle_close()
+        view_registry.discard(self.view.id())
+        CopilotPlugin.forget_view(self.view)
 
     def on_query_context(self, key: str, operator: int, operand: Any, match_all: bool) -> bool | None:
         def test(value: Any) -> bool | None:
@@ -116,7 +117,7 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
             return None
 
         if key == "copilot.commit_completion_on_tab":
-            return test(get_session_setting(session, "commit_completion_on_tab"))
+            return test(plugin.settings_snapshot.commit_completion_on_tab)
 
         return None
 
@@ -126,7 +127,7 @@ class ViewEventListener(sublime_plugin.ViewEventListener):
 
         if command_name == "auto_complete":
             plugin, session = CopilotPlugin.plugin_session(self.view)
-            if plugin and session and get_session_setting(session, "hook_to_auto_complete_command"):
+            if plugin and session and plugin.settings_snapshot.hook_to_auto_complete_command:
                 plugin.request_get_completions(self.view)
 
     def on_post_save_async(self) -> None:
@@ -161,10 +162,13 @@ class EventListener(sublime_plugin.EventListener):
         return None
 
     def on_new_window(self, window: sublime.Window) -> None:
+        window_registry.add(window)
         copilot_ignore_observer.add_folders(window.folders())
 
     def on_pre_close_window(self, window: sublime.Window) -> None:
         copilot_ignore_observer.remove_folders(window.folders())
+        WindowConversationManager(window).handle_close()
+        window_registry.discard(window.id())
 
 
 class CopilotIgnoreHandler(FileSystemEventHandler):
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from .log import log_warning
+
+
+@dataclass
+class CompletionTrace:
+    """Timestamps of a completion request going through the pipeline, from the keystroke to the rendering."""
+
+    STAGES = (
+        "keystroke",
+        "debounce_fired",
+        "doc_prepared",
+        "request_sent",
+        "response_received",
+        "preprocessed",
+        "rendered",
+    )
+
+    language_id: str
+    outcome: str = "server"
+    """Where completions come from. Either `"server"` or `"cache"`."""
+    timestamps: dict[str, float] = field(default_factory=dict)
+    """Stage names to `time.perf_counter()` values."""
+
+    def mark(self, stage: str, timestamp: float | None = None) -> None:
+        self.timestamps[stage] = time.perf_counter() if timestamp is None else timestamp
+
+    def durations(self) -> dict[str, float]:
+        """Seconds spent on each stage, i.e., since the previous marked stage. `total` is for the whole trace."""
+        durations: dict[str, float] = {}
+        previous: float | None = None
+        for stage in self.STAGES:
+            if (timestamp := self.timestamps.get(stage)) is None:
+                continue
+            if previous is not None:
+                durations[stage] = timestamp - previous
+            previous = timestamp
+        if durations:
+            durations["total"] = max(self.timestamps.values()) - min(self.timestamps.values())
+        return durations
+
+
+class CompletionLatencyMetrics:
+    """Rolling latency samples of completion traces per language ID and outcome."""
+
+    def __init__(self, sample_size: int = 500) -> None:
+        self.sample_size = sample_size
+        self.jsonl_path = ""
+        """If not empty, every recorded trace is appended to this file as a JSON line."""
+        self._samples: dict[tuple[str, str], dict[str, deque[float]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, trace: CompletionTrace) -> None:
+        if not (durations := trace.durations()):
+            return
+
+        with self._lock:
+            samples = self._samples.setdefault((trace.language_id, trace.outcome), {})
+            for stage, duration in durations.items():
+                samples.setdefault(stage, deque(maxlen=self.sample_size)).append(duration)
+
+        if self.jsonl_path:
+            self._write_jsonl(trace, durations)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def percentiles(self) -> dict[str, dict[str, dict[str, dict[str, float]]]]:
+        """Get `{language_id: {outcome: {stage: {"count", "p50", "p95", "p99"}}}}` in milliseconds."""
+        with self._lock:
+            snapshot = {
+                key: {stage: sorted(values) for stage, values in samples.items()}
+                for key, samples in self._samples.items()
+            }
+
+        result: dict[str, dict[str, dict[str, dict[str, float]]]] = {}
+        for (language_id, outcome), samples in sorted(snapshot.items()):
+            result.setdefault(language_id, {})[outcome] = {
+                stage: {
+                    "count": len(values),
+                    "p50": _percentile_ms(values, 50),
+                    "p95": _percentile_ms(values, 95),
+                    "p99": _percentile_ms(values, 99),
+                }
+                for stage, values in samples.items()
+            }
+        return result
+
+    def _write_jsonl(self, trace: CompletionTrace, durations: dict[str, float]) -> None:
+        record = {
+            "time": time.time(),
+            "language_id": trace.language_id,
+            "outcome": trace.outcome,
+            "durations_ms": {stage: round(duration * 1000, 3) for stage, duration in durations.items()},
+        }
+        path = os.path.expandvars(os.path.expanduser(self.jsonl_path))
+        try:
+            with self._lock, open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            log_warning(f'Failed to write completion latency to "{path}": {e}')
+
+
+def _percentile_ms(sorted_values: list[float], percent: float) -> float:
+    """The nearest-rank percentile of `sorted_values` in milliseconds."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))  # ceiling division
+    return round(sorted_values[int(rank) - 1] * 1000, 3)
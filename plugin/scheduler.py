@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from collections.abc import Callable, Hashable
+from typing import Any
+
+import sublime
+
+from .log import log_error
+
+
+class Scheduler:
+    """
+    Runs callbacks on ST's async thread after a delay. Each callback is scheduled with a key and scheduling
+    another callback with the same key replaces the pending one, so that it can be used for debouncing.
+
+    No thread is created. Pending callbacks are kept in a heap ordered by their deadlines and only the earliest
+    deadline is waited for via `sublime.set_timeout_async`. Replaced or cancelled heap items are dropped lazily.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._entries: dict[Hashable, tuple[float, int, Callable[[], Any]]] = {}
+        self._sequence = itertools.count()
+        self._wakeup_at: float | None = None
+        """The deadline which a pending `sublime.set_timeout_async` call is for."""
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, key: Hashable, delay_s: float, callback: Callable[[], Any]) -> None:
+        """Run `callback` after `delay_s` seconds, replacing the pending callback of `key` if any."""
+        with self._lock:
+            deadline = time.monotonic() + max(0.0, delay_s)
+            sequence = next(self._sequence)
+            self._entries[key] = (deadline, sequence, callback)
+            heapq.heappush(self._heap, (deadline, sequence, key))
+            self._wake_up_by(deadline)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the pending callback of `key`. Returns whether there was one."""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def is_scheduled(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+            # a pending wake-up finds nothing to run, so the next schedule has to wake up on its own
+            self._wakeup_at = None
+
+    def _wake_up_by(self, deadline: float) -> None:
+        # a pending wake-up which is early enough can be reused
+        if self._wakeup_at is not None and self._wakeup_at <= deadline:
+            return
+        self._wakeup_at = deadline
+        sublime.set_timeout_async(self._run_due, max(0, round((deadline - time.monotonic()) * 1000)))
+
+    def _run_due(self) -> None:
+        due: list[Callable[[], Any]] = []
+        with self._lock:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, sequence, key = heapq.heappop(self._heap)
+                # skip items which have been replaced or cancelled
+                if (entry := self._entries.get(key)) and entry[1] == sequence:
+                    del self._entries[key]
+                    due.append(entry[2])
+
+            # drop stale items so that frequent rescheduling doesn't grow the heap
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [(deadline, sequence, key) for key, (deadline, sequence, _) in self._entries.items()]
+                heapq.heapify(self._heap)
+
+            self._wakeup_at = None
+            if self._heap:
+                self._wake_up_by(self._heap[0][0])
+
+        for callback in due:
+            try:
+                callback()
+            except Exception as e:
+                log_error(f"Scheduled callback {callback!r} failed: {e}")
+
+
+class RenderThrottle:
+    """
+    Limits how often each key is rendered to `max_fps` times per second via a `Scheduler`. Renders requested too
+    soon after the previous one are coalesced into a single trailing render, which renders the latest state.
+    """
+
+    def __init__(self, scheduler: Scheduler, max_fps: float = 0) -> None:
+        self.max_fps = max_fps
+        """`0` means no limit."""
+        self.renders = 0
+        self.skipped_renders = 0
+        """The number of requested renders which have been superseded by a later one."""
+        self._scheduler = scheduler
+        self._last_rendered_at: dict[Hashable, float] = {}
+
+    @property
+    def stats(self) -> dict[str, float]:
+        return {"max_fps": self.max_fps, "renders": self.renders, "skipped": self.skipped_renders}
+
+    def request(self, key: Hashable, render: Callable[[], Any]) -> None:
+        """Render right away if the previous render of `key` is long enough ago. Otherwise, render later."""
+        if self._scheduler.is_scheduled(("render", key)):
+            # the latest request wins
+            self.skipped_renders += 1
+        elif self._delay_s(key) <= 0:
+            self._render(key, render)
+            return
+        self._scheduler.schedule(("render", key), self._delay_s(key), lambda: self._render(key, render))
+
+    def flush(self, key: Hashable, render: Callable[[], Any]) -> None:
+        """Render right away, superseding the pending render of `key` if any."""
+        if self._scheduler.cancel(("render", key)):
+            self.skipped_renders += 1
+        self._render(key, render)
+
+    def forget(self, key: Hashable) -> None:
+        self._scheduler.cancel(("render", key))
+        self._last_rendered_at.pop(key, None)
+
+    def _delay_s(self, key: Hashable) -> float:
+        if self.max_fps <= 0 or (last_rendered_at := self._last_rendered_at.get(key)) is None:
+            return 0
+        return last_rendered_at + 1 / self.max_fps - time.monotonic()
+
+    def _render(self, key: Hashable, render: Callable[[], Any]) -> None:
+        self._last_rendered_at[key] = time.monotonic()
+        self.renders += 1
+        render()
+
+
+scheduler = Scheduler()
+"""The scheduler shared by the whole plugin."""
+
+sheet_render_throttle = RenderThrottle(scheduler, max_fps=15)
+"""Throttles the rendering of the chat and panel completion sheets while their contents are streaming."""
@@ -1,14 +1,49 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field, fields
 from functools import lru_cache
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Mapping
 
 import jmespath
 import sublime
+from LSP.plugin import DottedDict
 
 from .constants import PACKAGE_NAME
 
 
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """
+    An immutable snapshot of the "settings" object in this plugin's settings. Hot paths read its attributes instead
+    of calling the settings API. A new snapshot is taken whenever the settings change.
+    """
+
+    auto_ask_completions: bool = True
+    commit_completion_on_tab: bool = True
+    completion_context_window: Mapping[str, Mapping[str, Any]] = field(default_factory=dict)
+    completion_cycling: str = "eager"
+    completion_document_sync: str = "full"
+    completion_style: str = "popup"
+    debug: bool = False
+    hook_to_auto_complete_command: bool = False
+    local_checks: bool = False
+    persist_chat_history: bool = False
+    telemetry: bool = False
+
+    @classmethod
+    def from_settings(cls, settings: Mapping[str, Any] | DottedDict) -> SettingsSnapshot:
+        """Takes a snapshot of `settings`. Missing or `null` values fall back to the defaults."""
+        values = {field_.name: value for field_ in fields(cls) if (value := settings.get(field_.name)) is not None}
+        if isinstance(context_window := values.get("completion_context_window"), dict):
+            values["completion_context_window"] = MappingProxyType(context_window)
+        return cls(**values)
+
+
+_SNAPSHOT_ON_CHANGE_TAG = f"{PACKAGE_NAME}.snapshot"
+_settings_snapshot: SettingsSnapshot | None = None
+
+
 @lru_cache
 def _compile_jmespath_expression(expression: str) -> jmespath.parser.ParsedResult:
     return jmespath.compile(expression)
@@ -24,3 +59,29 @@ def get_plugin_setting(key: str, default: Any = None) -> Any:
 
 def get_plugin_setting_dotted(dotted: str, default: Any = None) -> Any:
     return _compile_jmespath_expression(dotted).search(get_plugin_settings()) or default
+
+
+def get_settings_snapshot() -> SettingsSnapshot:
+    """
+    Get the snapshot of the "settings" object in this plugin's settings. Unlike the session settings, it doesn't
+    include overrides from projects. It's only taken again when the settings change.
+    """
+    global _settings_snapshot
+    if _settings_snapshot is None:
+        settings = get_plugin_settings()
+        settings.clear_on_change(_SNAPSHOT_ON_CHANGE_TAG)
+        settings.add_on_change(_SNAPSHOT_ON_CHANGE_TAG, _take_settings_snapshot)
+        _take_settings_snapshot()
+    return _settings_snapshot  # type: ignore
+
+
+def forget_settings_snapshot() -> None:
+    """Stops following changes of this plugin's settings. The next snapshot is taken from scratch."""
+    global _settings_snapshot
+    get_plugin_settings().clear_on_change(_SNAPSHOT_ON_CHANGE_TAG)
+    _settings_snapshot = None
+
+
+def _take_settings_snapshot() -> None:
+    global _settings_snapshot
+    _settings_snapshot = SettingsSnapshot.from_settings(get_plugin_setting("settings") or {})
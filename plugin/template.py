@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+import json
+import os
+import time
 from functools import lru_cache
-from typing import Iterable
+from pathlib import Path
+from typing import Any, Callable, Iterable
 
 import jinja2
 import sublime
+from jinja2.bccache import Bucket
 from LSP.plugin.core.url import parse_uri
 
 from .constants import PACKAGE_NAME
 from .helpers import is_debug_mode
+from .log import log_warning
+
+TEMPLATES_DIR = f"Packages/{PACKAGE_NAME}/plugin/templates"
 
 
 @lru_cache
@@ -18,8 +26,30 @@ def load_string_template(template: str, *, keep_trailing_newline: bool = False)
 
 @lru_cache
 def load_resource_template(template_path: str, *, keep_trailing_newline: bool = False) -> jinja2.Template:
-    content = sublime.load_resource(f"Packages/{PACKAGE_NAME}/plugin/templates/{template_path}")
-    return load_string_template(content, keep_trailing_newline=keep_trailing_newline)
+    return _resource_template_env(keep_trailing_newline).get_template(template_path)
+
+
+def precompile_resource_templates() -> dict[str, float]:
+    """
+    Compile all resource templates, or load them from the bytecode cache, so that the first render of them doesn't
+    stall. It's meant to be run on a background thread. Returns the milliseconds spent on each template.
+    """
+    durations: dict[str, float] = {}
+    for resource in sublime.find_resources("*.jinja"):
+        if not resource.startswith(f"{TEMPLATES_DIR}/"):
+            continue
+        template_path = resource[len(TEMPLATES_DIR) + 1 :]
+        started_at = time.perf_counter()
+        # it's not known here which templates keep the trailing newline
+        for keep_trailing_newline in (False, True):
+            try:
+                load_resource_template(template_path, keep_trailing_newline=keep_trailing_newline)
+            except jinja2.TemplateError as e:
+                log_warning(f'Failed to compile template "{template_path}": {e}')
+        durations[template_path] = (time.perf_counter() - started_at) * 1000
+
+    _remove_stale_bytecode()
+    return durations
 
 
 def asset_url(asset_path: str) -> str:
@@ -53,6 +83,79 @@ def _plugin_asset_path(asset_path: str) -> str:
     return f"Packages/{PACKAGE_NAME}/plugin/assets/{asset_path}"
 
 
+def _package_version() -> str:
+    try:
+        return str(json.loads(sublime.load_resource(f"Packages/{PACKAGE_NAME}/package-metadata.json"))["version"])
+    except Exception:
+        return "dev"
+
+
+class _ResourceLoader(jinja2.BaseLoader):
+    """Loads templates from the `plugin/templates` directory of this package."""
+
+    def get_source(self, environment: jinja2.Environment, template: str) -> tuple[str, str, Callable[[], bool]]:
+        resource = f"{TEMPLATES_DIR}/{template}"
+        try:
+            source = sublime.load_resource(resource)
+        except OSError as e:
+            raise jinja2.TemplateNotFound(template) from e
+        # resources of a package don't change until it's updated, which reloads the plugin
+        return source, resource, lambda: True
+
+
+class _BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """
+    Compiled templates are stored under the cache directory of ST. A cached template is used only if the checksum of
+    its source matches, and files are prefixed with the package and Jinja versions.
+    """
+
+    DIRECTORY = Path(sublime.cache_path()) / PACKAGE_NAME / "jinja2"
+
+    def __init__(self, *, keep_trailing_newline: bool) -> None:
+        super().__init__(str(self.DIRECTORY), pattern=f"{self.version_prefix()}{int(keep_trailing_newline)}-%s.cache")
+
+    @staticmethod
+    @lru_cache
+    def version_prefix() -> str:
+        return f"{_package_version()}-{jinja2.__version__}-"
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        try:
+            super().load_bytecode(bucket)
+        except Exception as e:
+            log_warning(f"Failed to load cached template bytecode: {e}")
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+        except Exception as e:
+            log_warning(f"Failed to cache template bytecode: {e}")
+
+
+@lru_cache
+def _resource_template_env(keep_trailing_newline: bool) -> jinja2.Environment:
+    options: dict[str, Any] = {
+        "keep_trailing_newline": keep_trailing_newline,
+        "loader": _ResourceLoader(),
+    }
+    if not is_debug_mode():
+        options["bytecode_cache"] = _BytecodeCache(keep_trailing_newline=keep_trailing_newline)
+    return _JINJA_TEMPLATE_ENV.overlay(**options)
+
+
+def _remove_stale_bytecode() -> None:
+    """Remove templates cached by other versions of this package."""
+    if not _BytecodeCache.DIRECTORY.is_dir():
+        return
+    for path in _BytecodeCache.DIRECTORY.glob("*.cache"):
+        if not path.name.startswith(_BytecodeCache.version_prefix()):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
 _JINJA_TEMPLATE_ENV = jinja2.Environment(
     extensions=["jinja2.ext.do", "jinja2.ext.loopcontrols"],
 )
@@ -53,8 +53,7 @@ class NetworkProxy(TypedDict, total=True):
 # ------------------- #
 
 
-class CopilotDocType(TypedDict, total=True):
-    source: str
+class _CopilotDocTypeBase(TypedDict, total=True):
     tabSize: int
     indentSize: int
     insertSpaces: bool
@@ -66,6 +65,11 @@ class CopilotDocType(TypedDict, total=True):
     version: int
 
 
+class CopilotDocType(_CopilotDocTypeBase, total=False):
+    source: str
+    """The whole document. Omitted if the server should use its own synced copy of the document."""
+
+
 # --------------- #
 # Copilot payload #
 # --------------- #
@@ -3,9 +3,12 @@ from __future__ import annotations
 from .chat import WindowConversationManager
 from .completion import ViewCompletionManager
 from .panel_completion import ViewPanelCompletionManager
+from .status_bar import StatusBarRenderer, status_bar_renderer
 
 __all__ = (
+    "StatusBarRenderer",
     "ViewCompletionManager",
     "ViewPanelCompletionManager",
     "WindowConversationManager",
+    "status_bar_renderer",
 )
@@ -1,15 +1,129 @@
 from __future__ import annotations
 
-from typing import Callable
+from typing import Any, Callable
 
 import mdpopups
 import sublime
 
 from ..constants import COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX
 from ..helpers import GithubInfo, preprocess_message_for_html
+from ..scheduler import sheet_render_throttle
+from ..settings import get_settings_snapshot
 from ..template import load_resource_template
 from ..types import CopilotPayloadConversationEntry, CopilotPayloadConversationEntryTransformed, StLayout
-from ..utils import find_view_by_id, find_window_by_id, get_copilot_setting, remove_prefix, set_copilot_setting
+from ..utils import (
+    find_view_by_id,
+    find_window_by_id,
+    get_copilot_setting,
+    md2html,
+    md2html_lock,
+    remove_prefix,
+    set_copilot_setting,
+    sheet_registry,
+)
+
+
+class _WindowConversationState:
+    """
+    The in-memory conversation of a window. Streamed entries are appended in O(1), which includes grouping them
+    into sections and tracking code blocks in them. So rendering and code block lookups don't re-scan the history.
+    """
+
+    __slots__ = (
+        "code_block_count",
+        "code_blocks",
+        "entries",
+        "is_inside_code_block",
+        "reference_block_state",
+        "section_htmls",
+        "sections",
+        "turn_indices",
+    )
+
+    def __init__(self) -> None:
+        self.code_block_count = 0
+        self.code_blocks: dict[int, str] = {}
+        """Code block index to the code of the closed code block."""
+        self.entries: list[CopilotPayloadConversationEntry] = []
+        self.is_inside_code_block = False
+        """Whether the last section ends in an unclosed code block, which is being streamed."""
+        self.reference_block_state: dict[str, bool] = {}
+        self.section_htmls: dict[tuple[str, str], tuple[int, str]] = {}
+        """`(turn_id, kind)` of a section to the digest of its content and its rendered HTML."""
+        self.sections: list[CopilotPayloadConversationEntryTransformed] = []
+        """Consecutive entries of the same kind are grouped into a section."""
+        self.turn_indices: dict[str, int] = {}
+        """Turn ID to the index of the first entry of that turn."""
+
+    def append(self, entry: CopilotPayloadConversationEntry) -> None:
+        self.turn_indices.setdefault(entry["turnId"], len(self.entries))
+        self.entries.append(entry)
+        self._append_to_sections(entry)
+
+    def replace(self, entries: list[CopilotPayloadConversationEntry]) -> None:
+        self.code_block_count = 0
+        self.code_blocks = {}
+        self.entries = []
+        self.is_inside_code_block = False
+        self.section_htmls = {}
+        self.sections = []
+        self.turn_indices = {}
+        for entry in entries:
+            self.append(entry)
+
+    def _append_to_sections(self, entry: CopilotPayloadConversationEntry) -> None:
+        kind = entry["kind"]
+        reply = entry["reply"]
+        section = self.sections[-1] if self.sections else None
+
+        if section and section["kind"] == kind:
+            if reply.startswith("```"):
+                if self.is_inside_code_block:
+                    self._close_code_block(section)
+                else:
+                    reply = self._open_code_block(section, reply)
+            elif self.is_inside_code_block:
+                section["codeBlocks"].append(reply)
+            section["messages"].append(reply)
+            return
+
+        # Fixes: https://github.com/TerminalFi/LSP-copilot/issues/187
+        if section and self.is_inside_code_block:
+            self._close_code_block(section)
+            section["messages"].append("```")
+
+        previous_entry = self.entries[-2] if len(self.entries) > 1 else None
+        section = {
+            "kind": kind,
+            "turnId": entry["turnId"],
+            "messages": [],
+            "codeBlockIndices": [],
+            "codeBlocks": [],
+            "references": previous_entry.get("references", []) if previous_entry and kind == "report" else [],
+        }
+        self.sections.append(section)
+
+        if reply.startswith("```") and kind == "report":
+            reply = self._open_code_block(section, reply)
+        section["messages"].append(reply)
+
+    def _open_code_block(self, section: CopilotPayloadConversationEntryTransformed, reply: str) -> str:
+        index = self.code_block_count
+        self.code_block_count += 1
+        self.is_inside_code_block = True
+        section["codeBlockIndices"].append(index)
+        # to be replaced with the copy and insert commands of the code block when rendering
+        return f"CODE_BLOCK_COMMANDS_{index}\n\n{reply}"
+
+    def _close_code_block(self, section: CopilotPayloadConversationEntryTransformed) -> None:
+        self.is_inside_code_block = False
+        self.code_blocks[section["codeBlockIndices"][-1]] = "".join(section["codeBlocks"])
+        section["codeBlocks"] = []
+
+
+_window_to_conversation_state: dict[int, _WindowConversationState] = {}
+
+_MDPOPUPS_DUMMY_PANEL = "mdpopups-dummy"
 
 
 class WindowConversationManager:
@@ -84,15 +198,6 @@ class WindowConversationManager:
     def conversation_id(self, value: str) -> None:
         set_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "conversation_id", value)
 
-    @property
-    def code_block_index(self) -> dict[str, str]:
-        """The tracking of code blocks across the conversation. Used to support Copy and Insert code commands."""
-        return get_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "code_block_index", {})
-
-    @code_block_index.setter
-    def code_block_index(self, value: dict[str, str]) -> None:
-        set_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "code_block_index", value)
-
     @property
     def is_waiting(self) -> bool:
         """Whether the converation completions is streaming."""
@@ -113,24 +218,46 @@ class WindowConversationManager:
     def is_visible(self, value: bool) -> None:
         set_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "is_visible", value)
 
+    @property
+    def persisted_conversation(self) -> list[list[Any]]:
+        """The compact form of `conversation` which is persisted if the "persist_chat_history" setting is on."""
+        return get_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "persisted_entries", [])
+
+    @persisted_conversation.setter
+    def persisted_conversation(self, value: list[list[Any]]) -> None:
+        set_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "persisted_entries", value)
+
+    # --------- #
+    # in-memory #
+    # --------- #
+
     @property
     def reference_block_state(self) -> dict[str, bool]:
-        return get_copilot_setting(
-            self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "reference_block_state", {}
-        )
+        return self._state.reference_block_state
 
     @reference_block_state.setter
     def reference_block_state(self, value: dict[str, bool]) -> None:
-        set_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "reference_block_state", value)
+        self._state.reference_block_state = value
 
     @property
     def conversation(self) -> list[CopilotPayloadConversationEntry]:
-        """All `conversation` in the view. Note that this is a copy."""
-        return get_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "conversation_entries", [])
+        """All `conversation` in the window. Note that this is not a copy so assign a new list to change it."""
+        return self._state.entries
 
     @conversation.setter
     def conversation(self, value: list[CopilotPayloadConversationEntry]) -> None:
-        set_copilot_setting(self.window, COPILOT_WINDOW_CONVERSATION_SETTINGS_PREFIX, "conversation_entries", value)
+        self._state.replace(value)
+        self.persist_conversation()
+
+    @property
+    def sections(self) -> list[CopilotPayloadConversationEntryTransformed]:
+        """`conversation` grouped into sections to be rendered. Note that this is not a copy."""
+        return self._state.sections
+
+    @property
+    def is_inside_code_block(self) -> bool:
+        """Whether the last section ends in an unclosed code block."""
+        return self._state.is_inside_code_block
 
     # -------------- #
     # normal methods #
@@ -138,48 +265,98 @@ class WindowConversationManager:
 
     def __init__(self, window: sublime.Window) -> None:
         self.window = window
+        self._state = self._get_state(window)
+
+    @staticmethod
+    def _get_state(window: sublime.Window) -> _WindowConversationState:
+        window_id = window.id()
+        if not (state := _window_to_conversation_state.get(window_id)):
+            state = _window_to_conversation_state[window_id] = _WindowConversationState()
+        return state
+
+    def reset(self, *, restore_history: bool = False) -> None:
+        """
+        Reset the conversation.
+
+        :param      restore_history:  Restore the persisted conversation, if any, to be read. It's no longer
+                                      known by the server so a new message starts a new conversation.
+        """
+        history = self._load_persisted_conversation() if restore_history else []
 
-    def reset(self) -> None:
         self.is_waiting = False
         self.is_visible = False
         self.original_layout = None
         self.suggested_title = ""
         self.follow_up = ""
         self.conversation_id = ""
-        self.conversation = []
+        self.conversation = history
         self.reference_block_state = {}
-        self.code_block_index = {}
 
         if view := find_view_by_id(self.view_id):
             view.close()
 
+    def handle_close(self) -> None:
+        _window_to_conversation_state.pop(self.window.id(), None)
+        sheet_render_throttle.forget(("chat", self.window.id()))
+
     def append_conversation_entry(self, entry: CopilotPayloadConversationEntry) -> None:
-        # `self.conversation` is a deepcopy of the original value
-        # So if we do `self.conversation.append(entry)`, the source value won't be modified
-        conversation_history = self.conversation
-        conversation_history.append(entry)
-        self.conversation = conversation_history
-        self.append_reference_block_state(entry["turnId"], False)
+        self._state.append(entry)
+        self._state.reference_block_state.setdefault(entry["turnId"], False)
+
+    def find_turn_index(self, turn_id: str) -> int:
+        """Find the index of the first entry of the turn in `conversation`. If not found, returns `-1`."""
+        return self._state.turn_indices.get(turn_id, -1)
+
+    def get_section_html(self, key: tuple[str, str], digest: int, render: Callable[[], str]) -> str:
+        """
+        Get the rendered HTML of the section identified by `key`. It's rendered via `render` only if `digest`,
+        which is computed from the content of the section, has changed since the last time.
+        """
+        cached = self._state.section_htmls.get(key)
+        if not cached or cached[0] != digest:
+            cached = self._state.section_htmls[key] = (digest, render())
+        return cached[1]
 
     def append_reference_block_state(self, turn_id: str, state: bool) -> None:
-        # `self.reference_block_state` is a deepcopy of the original value
-        # So if we do self.`reference_block_state[turn_id] = state`, the source value won't be modified
-        reference_block_state = self.reference_block_state
-        reference_block_state[turn_id] = state
-        self.reference_block_state = reference_block_state
-
-    def insert_code_block_index(self, index: int, code_block: str) -> None:
-        # `self.code_block_index` is a deepcopy of the original value
-        # So if we do `self.code_block_index[str(index)] = code_block_index`, the source value won't be modified
-        code_block_index = self.code_block_index
-        code_block_index[str(index)] = code_block
-        self.code_block_index = code_block_index
+        self._state.reference_block_state[turn_id] = state
+
+    def get_code_block(self, index: int) -> str | None:
+        """Get the code of a closed code block by its index. Used to support Copy and Insert code commands."""
+        return self._state.code_blocks.get(index)
 
     def toggle_references_block(self, turn_id: str) -> None:
-        reference_block_state = self.reference_block_state
-        reference_block_state.setdefault(turn_id, False)
-        reference_block_state[turn_id] = not reference_block_state[turn_id]
-        self.reference_block_state = reference_block_state
+        reference_block_state = self._state.reference_block_state
+        reference_block_state[turn_id] = not reference_block_state.get(turn_id, False)
+
+    def persist_conversation(self) -> None:
+        """Persist `conversation` compactly into window settings if the "persist_chat_history" setting is on."""
+        if not get_settings_snapshot().persist_chat_history:
+            if self.persisted_conversation:
+                self.persisted_conversation = []
+            return
+
+        self.persisted_conversation = [
+            [entry["kind"], entry["turnId"], entry["reply"], entry.get("references") or []]
+            for entry in self._state.entries
+        ]
+
+    def _load_persisted_conversation(self) -> list[CopilotPayloadConversationEntry]:
+        if not get_settings_snapshot().persist_chat_history:
+            return []
+
+        return [
+            {
+                "kind": kind,
+                "conversationId": "",
+                "turnId": turn_id,
+                "reply": reply,
+                "annotations": [],
+                "references": references,
+                "hideText": False,
+                "warnings": [],
+            }
+            for kind, turn_id, reply, references in self.persisted_conversation
+        ]
 
     @staticmethod
     def find_window_by_token_id(token_id: str) -> sublime.Window | None:
@@ -193,8 +370,12 @@ class WindowConversationManager:
         _ConversationEntry(self.window).open()
 
     def update(self) -> None:
-        """Update the completion panel."""
-        _ConversationEntry(self.window).update()
+        """Update the completion panel right away."""
+        sheet_render_throttle.flush(("chat", self.window.id()), _ConversationEntry(self.window).update)
+
+    def request_update(self) -> None:
+        """Update the completion panel, no more often than the "max_sheet_refresh_rate" setting allows."""
+        sheet_render_throttle.request(("chat", self.window.id()), _ConversationEntry(self.window).update)
 
     def close(self) -> None:
         """Close the completion panel."""
@@ -208,116 +389,99 @@ class _ConversationEntry:
 
     @property
     def completion_content(self) -> str:
-        conversations_entries = self._synthesize()
+        window_id = self.wcm.window.id()
+        avatar_img_src = GithubInfo.get_avatar_img_src()
+        sections = []
+        last_index = len(self.wcm.sections) - 1
+        for index, entry in enumerate(self.wcm.sections):
+            is_inside_code_block = index == last_index and self.wcm.is_inside_code_block
+            references_expanded = self.wcm.reference_block_state.get(entry["turnId"], False)
+            # messages of a section are only appended so their count tells whether the content has changed
+            digest = hash((
+                len(entry["messages"]),
+                is_inside_code_block,
+                references_expanded,
+                self.wcm.conversation_id,
+                avatar_img_src,
+            ))
+            html = self.wcm.get_section_html(
+                (entry["turnId"], entry["kind"]),
+                digest,
+                lambda: self._render_section(entry, is_inside_code_block, references_expanded, avatar_img_src),
+            )
+            sections.append({"html": html})
+
         return load_resource_template("chat_panel.md.jinja", keep_trailing_newline=True).render(
-            window_id=self.wcm.window.id(),
             is_waiting=self.wcm.is_waiting,
-            avatar_img_src=GithubInfo.get_avatar_img_src(),
             suggested_title=preprocess_message_for_html(self.wcm.suggested_title),
             follow_up=preprocess_message_for_html(self.wcm.follow_up),
             follow_up_url=sublime.command_url(
                 "copilot_conversation_chat_shim",
-                {"window_id": self.wcm.window.id(), "message": self.wcm.follow_up},
+                {"window_id": window_id, "message": self.wcm.follow_up},
             ),
             close_url=sublime.command_url(
                 "copilot_conversation_close",
-                {"window_id": self.wcm.window.id()},
+                {"window_id": window_id},
             ),
             delete_url=sublime.command_url(
                 "copilot_conversation_destroy_shim",
                 {"conversation_id": self.wcm.conversation_id},
             ),
-            sections=[
-                {
-                    "kind": entry["kind"],
-                    "message": "".join(entry["messages"]),
-                    "code_block_indices": entry["codeBlockIndices"],
-                    "toggle_references_url": sublime.command_url(
-                        "copilot_conversation_toggle_references_block",
-                        {
-                            "conversation_id": self.wcm.conversation_id,
-                            "window_id": self.wcm.window.id(),
-                            "turn_id": entry["turnId"],
-                        },
-                    ),
-                    "references": [] if entry["kind"] != "report" else entry["references"],
-                    "references_expanded": self.wcm.reference_block_state.get(entry["turnId"], False),
-                    "turn_delete_url": sublime.command_url(
-                        "copilot_conversation_turn_delete_shim",
-                        {
-                            "conversation_id": self.wcm.conversation_id,
-                            "window_id": self.wcm.window.id(),
-                            "turn_id": entry["turnId"],
-                        },
-                    ),
-                    "thumbs_up_url": sublime.command_url(
-                        "copilot_conversation_rating_shim",
-                        {"turn_id": entry["turnId"], "rating": 1},
-                    ),
-                    "thumbs_down_url": sublime.command_url(
-                        "copilot_conversation_rating_shim",
-                        {"turn_id": entry["turnId"], "rating": -1},
-                    ),
-                }
-                for entry in conversations_entries
-            ],
+            sections=sections,
         )
 
-    def _synthesize(self) -> list[CopilotPayloadConversationEntryTransformed]:
-        def inject_code_block_commands(reply: str, code_block_index: int) -> str:
-            return f"CODE_BLOCK_COMMANDS_{code_block_index}\n\n{reply}"
-
-        transformed_conversation: list[CopilotPayloadConversationEntryTransformed] = []
-        current_entry: CopilotPayloadConversationEntryTransformed | None = None
-        is_inside_code_block = False
-        code_block_index = -1
-
-        for idx, entry in enumerate(self.wcm.conversation):
-            kind = entry["kind"]
-            reply = entry["reply"]
-            turn_id = entry["turnId"]
-
-            if current_entry and current_entry["kind"] == kind:
-                if reply.startswith("```"):
-                    is_inside_code_block = not is_inside_code_block
-                    if is_inside_code_block:
-                        code_block_index += 1
-                        current_entry["codeBlockIndices"].append(code_block_index)
-                        reply = inject_code_block_commands(reply, code_block_index)
-                    else:
-                        self.wcm.insert_code_block_index(code_block_index, "".join(current_entry["codeBlocks"]))
-                        current_entry["codeBlocks"] = []
-                elif is_inside_code_block:
-                    current_entry["codeBlocks"].append(reply)
-                current_entry["messages"].append(reply)
-            else:
-                if current_entry:
-                    transformed_conversation.append(current_entry)
-                current_entry = {
-                    "kind": kind,
-                    "turnId": turn_id,
-                    "messages": [reply],
-                    "codeBlockIndices": [],
-                    "codeBlocks": [],
-                    "references": [],
-                }
-                if kind == "report":
-                    current_entry["references"] = self.wcm.conversation[idx - 1].get("references", [])
-
-                if reply.startswith("```") and kind == "report":
-                    is_inside_code_block = True
-                    code_block_index += 1
-                    current_entry["codeBlockIndices"].append(code_block_index)
-                    reply = inject_code_block_commands(reply, code_block_index)
-                    current_entry["messages"] = [reply]
-
-        if current_entry:
-            # Fixes: https://github.com/TerminalFi/LSP-copilot/issues/187
-            if is_inside_code_block:
-                current_entry["messages"].append("```")
-            transformed_conversation.append(current_entry)
-
-        return transformed_conversation
+    def _render_section(
+        self,
+        entry: CopilotPayloadConversationEntryTransformed,
+        is_inside_code_block: bool,
+        references_expanded: bool,
+        avatar_img_src: str,
+    ) -> str:
+        message = "".join(entry["messages"])
+        # Fixes: https://github.com/TerminalFi/LSP-copilot/issues/187
+        if is_inside_code_block:
+            message += "```"
+
+        section = load_resource_template("chat_panel_section.md.jinja", keep_trailing_newline=True).render(
+            window_id=self.wcm.window.id(),
+            avatar_img_src=avatar_img_src,
+            kind=entry["kind"],
+            message=message,
+            code_block_indices=entry["codeBlockIndices"],
+            toggle_references_url=sublime.command_url(
+                "copilot_conversation_toggle_references_block",
+                {
+                    "conversation_id": self.wcm.conversation_id,
+                    "window_id": self.wcm.window.id(),
+                    "turn_id": entry["turnId"],
+                },
+            ),
+            references=entry["references"],
+            references_expanded=references_expanded,
+            turn_delete_url=sublime.command_url(
+                "copilot_conversation_turn_delete_shim",
+                {
+                    "conversation_id": self.wcm.conversation_id,
+                    "window_id": self.wcm.window.id(),
+                    "turn_id": entry["turnId"],
+                },
+            ),
+            thumbs_up_url=sublime.command_url(
+                "copilot_conversation_rating_shim",
+                {"turn_id": entry["turnId"], "rating": 1},
+            ),
+            thumbs_down_url=sublime.command_url(
+                "copilot_conversation_rating_shim",
+                {"turn_id": entry["turnId"], "rating": -1},
+            ),
+        )
+        # like mdpopups does for HTML sheets, a dummy view provides the color scheme for syntax highlighting
+        with md2html_lock:
+            view = self.window.create_output_panel(_MDPOPUPS_DUMMY_PANEL, unlisted=True)
+            try:
+                return md2html(view, section)
+            finally:
+                self.window.destroy_output_panel(_MDPOPUPS_DUMMY_PANEL)
 
     def open(self) -> None:
         self.wcm.is_visible = True
@@ -333,13 +497,14 @@ class _ConversationEntry:
         if not (sheet := self.window.transient_sheet_in_group(self.wcm.group_id)):
             return
 
-        mdpopups.update_html_sheet(sheet=sheet, contents=self.completion_content, md=True, wrapper_class="wrapper")
+        mdpopups.update_html_sheet(sheet=sheet, contents=self.completion_content, md=False, wrapper_class="wrapper")
 
     def close(self) -> None:
         if not (sheet := self.window.transient_sheet_in_group(self.wcm.group_id)):
             return
 
         sheet.close()
+        sheet_registry.discard(sheet.id())
 
         self.wcm.is_visible = False
         self.wcm.window.run_command("hide_panel")
@@ -358,10 +523,11 @@ class _ConversationEntry:
             window=window,
             name="Copilot Chat",
             contents=self.completion_content,
-            md=True,
+            md=False,
             flags=sublime.TRANSIENT,
             wrapper_class="wrapper",
         )
+        sheet_registry.add(sheet)
         self.wcm.view_id = sheet.id()
 
     def _open_in_side_by_side(self, window: sublime.Window) -> None:
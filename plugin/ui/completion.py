@@ -1,81 +1,208 @@
 from __future__ import annotations
 
-import html
+import copy
 import textwrap
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Sequence
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterator
+from functools import lru_cache
 
 import mdpopups
 import sublime
 from more_itertools import first_true
 
+from ..helpers import st_point_to_lsp_position
+from ..log import log_error
+from ..scheduler import scheduler
 from ..template import load_resource_template
 from ..types import CopilotPayloadCompletion
 from ..utils import (
     clamp,
+    erase_copilot_view_setting,
     fix_completion_syntax_highlight,
-    get_copilot_view_setting,
     get_view_language_id,
     is_active_view,
+    md2html,
     set_copilot_view_setting,
 )
 
 _view_to_phantom_set: dict[int, sublime.PhantomSet] = {}
+_view_to_phantom_state: dict[int, tuple[int, tuple[str, str]]] = {}
+"""The point and contents of the phantoms shown in a view."""
+
+
+class _PopupHtmlCache:
+    """
+    An LRU cache of the rendered HTML of completion popups. When completions arrive, the popups of all of them are
+    pre-rendered, so that cycling through them only swaps in the rendered HTML. Pre-rendering runs on ST's async
+    thread via the shared scheduler, one popup per tick, so that it neither blocks other callbacks for long nor
+    renders concurrently with them.
+    """
+
+    def __init__(self, max_size: int = 64) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_time = 0.0
+        """Seconds spent on rendering in total."""
+        self._entries: OrderedDict[Hashable, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "size": len(self._entries),
+            "render_ms_avg": round(self.render_time / self.renders * 1000, 3) if self.renders else 0,
+        }
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        with self._lock:
+            if (html := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        return self._render(key, render)
+
+    def prerender(self, view_id: int, items: list[tuple[Hashable, Callable[[], str]]]) -> None:
+        """
+        Render `(key, render)` items in order, unless they are cached already.
+        Pre-rendering requested for the view before is abandoned.
+        """
+        self._schedule_prerender(view_id, iter(items))
+
+    def forget_view(self, view_id: int) -> None:
+        scheduler.cancel(("popup_prerender", view_id))
+
+    def _schedule_prerender(self, view_id: int, items: Iterator[tuple[Hashable, Callable[[], str]]]) -> None:
+        # scheduling with the same key replaces the pending pre-rendering of the view
+        scheduler.schedule(("popup_prerender", view_id), 0, lambda: self._prerender_next(view_id, items))
+
+    def _prerender_next(self, view_id: int, items: Iterator[tuple[Hashable, Callable[[], str]]]) -> None:
+        for key, render in items:
+            if key in self._entries:
+                continue
+            try:
+                self._render(key, render)
+            except Exception as e:
+                log_error(f"Failed to pre-render a completion popup: {e}")
+            self._schedule_prerender(view_id, items)
+            return
+
+    def _render(self, key: Hashable, render: Callable[[], str]) -> str:
+        started_at = time.perf_counter()
+        html = render()
+        elapsed = time.perf_counter() - started_at
+
+        with self._lock:
+            self.renders += 1
+            self.render_time += elapsed
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return html
+
+
+_popup_html_cache = _PopupHtmlCache()
+
+
+class _ViewCompletionState:
+    """The in-memory completion state of a view. It's not persisted into the `.sublime_session` file."""
+
+    __slots__ = (
+        "completion_index",
+        "completion_style",
+        "completions",
+        "has_requested_alternatives",
+        "is_visible",
+        "is_waiting",
+    )
+
+    def __init__(self) -> None:
+        self.completion_index = 0
+        self.completion_style = ""
+        self.completions: list[CopilotPayloadCompletion] = []
+        self.has_requested_alternatives = False
+        self.is_visible = False
+        self.is_waiting = False
+
+
+_view_to_completion_state: dict[int, _ViewCompletionState] = {}
 
 
 class ViewCompletionManager:
-    # ------------- #
-    # view settings #
-    # ------------- #
+    # ---------- #
+    # view state #
+    # ---------- #
 
     @property
     def is_visible(self) -> bool:
         """Whether Copilot's completion popup is visible."""
-        return get_copilot_view_setting(self.view, "is_visible", False)
+        return self._state.is_visible
 
     @is_visible.setter
     def is_visible(self, value: bool) -> None:
-        set_copilot_view_setting(self.view, "is_visible", value)
+        if value == self._state.is_visible:
+            return
+        self._state.is_visible = value
+        # key bindings check this via the "setting.copilot.completion.is_visible" context
+        if value:
+            set_copilot_view_setting(self.view, "is_visible", True)
+        else:
+            erase_copilot_view_setting(self.view, "is_visible")
 
     @property
     def is_waiting(self) -> bool:
         """Whether the view is waiting for Copilot's completion response."""
-        return get_copilot_view_setting(self.view, "is_waiting_completion", False)
+        return self._state.is_waiting
 
     @is_waiting.setter
     def is_waiting(self, value: bool) -> None:
-        set_copilot_view_setting(self.view, "is_waiting_completion", value)
+        self._state.is_waiting = value
+
+    @property
+    def has_requested_alternatives(self) -> bool:
+        """Whether alternatives ("getCompletionsCycling") of the current completions have been requested."""
+        return self._state.has_requested_alternatives
+
+    @has_requested_alternatives.setter
+    def has_requested_alternatives(self, value: bool) -> None:
+        self._state.has_requested_alternatives = value
 
     @property
     def completions(self) -> list[CopilotPayloadCompletion]:
-        """All `completions` in the view. Note that this is a copy."""
-        return get_copilot_view_setting(self.view, "completions", [])
+        """All `completions` in the view. Note that this is not a copy so assign a new list to change it."""
+        return self._state.completions
 
     @completions.setter
     def completions(self, value: list[CopilotPayloadCompletion]) -> None:
-        set_copilot_view_setting(self.view, "completions", value)
+        self._state.completions = value
 
     @property
     def completion_style(self) -> str:
         """The completion style."""
-        return get_copilot_view_setting(self.view, "completion_style", "")
+        return self._state.completion_style
 
     @completion_style.setter
     def completion_style(self, value: str) -> None:
-        set_copilot_view_setting(self.view, "completion_style", value)
+        self._state.completion_style = value
 
     @property
     def completion_index(self) -> int:
         """The index of the current chosen completion."""
-        return get_copilot_view_setting(self.view, "completion_index", 0)
+        return self._state.completion_index
 
     @completion_index.setter
     def completion_index(self, value: int) -> None:
-        set_copilot_view_setting(
-            self.view,
-            "completion_index",
-            self._tidy_completion_index(value),
-        )
+        self._state.completion_index = self._tidy_completion_index(value)
 
     # -------------- #
     # normal methods #
@@ -83,6 +210,16 @@ class ViewCompletionManager:
 
     def __init__(self, view: sublime.View) -> None:
         self.view = view
+        self._state = self._get_state(view)
+
+    @staticmethod
+    def _get_state(view: sublime.View) -> _ViewCompletionState:
+        view_id = view.id()
+        if not (state := _view_to_completion_state.get(view_id)):
+            state = _view_to_completion_state[view_id] = _ViewCompletionState()
+            # the setting may be restored from a session where a completion was visible
+            erase_copilot_view_setting(view, "is_visible")
+        return state
 
     def reset(self) -> None:
         self.is_visible = False
@@ -91,7 +228,7 @@ class ViewCompletionManager:
     @property
     def current_completion(self) -> CopilotPayloadCompletion | None:
         """The current chosen `completion`."""
-        return self.completions[self.completion_index] if self.completions else None
+        return completions[self.completion_index] if (completions := self.completions) else None
 
     @property
     def completion_style_type(self) -> type[_BaseCompletion]:
@@ -120,17 +257,34 @@ class ViewCompletionManager:
 
         self.hide()
 
-    def handle_text_change(self) -> None:
-        if not (self.is_phantom and self.is_visible):
-            return
+    def handle_text_change(self) -> bool:
+        """
+        Handle the text change in the view.
 
-        self.hide()
+        :returns:   `True` if the typed text has been consumed by the visible completion,
+                    so there is no need to request new completions.
+        """
+        if not self.is_visible:
+            return False
+
+        if self._consume_typed_text():
+            return True
+
+        if self.is_phantom:
+            self.hide()
+        return False
 
     def handle_close(self) -> None:
-        if not self.is_phantom:
-            return
+        if self.is_phantom:
+            self.completion_style_type.close(self.view)
 
-        self.completion_style_type.close(self.view)
+        _view_to_completion_state.pop(self.view.id(), None)
+        _popup_html_cache.forget_view(self.view.id())
+
+    @staticmethod
+    def get_popup_render_stats() -> dict[str, float]:
+        """Get the hit rate and the render time of completion popups."""
+        return _popup_html_cache.stats
 
     def hide(self) -> None:
         """Hide Copilot's completion popup."""
@@ -167,9 +321,47 @@ class ViewCompletionManager:
             return
 
         self.completion_style_type(self.view, completion, self.completion_index, len(self.completions)).show()
+        if completions is not None:
+            self.completion_style_type.prerender(self.view, completions, self.completion_index)
 
         self.is_visible = True
 
+    def _consume_typed_text(self) -> bool:
+        """
+        If the text typed after the completion's `point` is the beginning of its `displayText`,
+        advance the completion (and other completions which match the typed text as well) and re-show it.
+        """
+        if not (
+            (completion := self.current_completion)
+            and len(sel := self.view.sel()) == 1
+            and sel[0].empty()
+            and (cursor := sel[0].b) > (point := completion["point"])
+        ):
+            return False
+
+        typed = self.view.substr(sublime.Region(point, cursor))
+        if "\n" in typed or not completion["displayText"].startswith(typed) or completion["displayText"] == typed:
+            return False
+
+        position = st_point_to_lsp_position(cursor, self.view)
+        completions: list[CopilotPayloadCompletion] = []
+        completion_index = 0
+        for index, completion_ in enumerate(self.completions):
+            display_text = completion_["displayText"]
+            if not display_text.startswith(typed) or display_text == typed:
+                continue
+            if index == self.completion_index:
+                completion_index = len(completions)
+            region_begin, region_end = completion_["region"]
+            completion_["displayText"] = display_text[len(typed) :]
+            completion_["point"] = cursor
+            completion_["position"] = position
+            completion_["region"] = (region_begin, region_end + len(typed))
+            completions.append(completion_)
+
+        self.show(completions, completion_index)
+        return True
+
     def _tidy_completion_index(self, index: int) -> int:
         """Revise `completion_index` to a valid value, or `0` if `self.completions` is empty."""
         completions_cnt = len(self.completions)
@@ -212,6 +404,11 @@ class _BaseCompletion(ABC):
     def close(cls, view: sublime.View) -> None:
         pass
 
+    @classmethod
+    def prerender(cls, view: sublime.View, completions: list[CopilotPayloadCompletion], index: int) -> None:
+        """Prepare to show `completions` other than the one at `index`, which is being shown."""
+        pass
+
 
 class _PopupCompletion(_BaseCompletion):
     name = "popup"
@@ -234,11 +431,30 @@ class _PopupCompletion(_BaseCompletion):
             textwrap.dedent(self.completion["text"]),
         )
 
+    @property
+    def popup_html(self) -> str:
+        return _popup_html_cache.get_or_render(self.cache_key, self.render_popup_html)
+
+    def render_popup_html(self) -> str:
+        return md2html(self.view, self.popup_content)
+
+    @property
+    def cache_key(self) -> Hashable:
+        # the text and the point of a completion change when the user types through it
+        return (
+            self.completion["uuid"],
+            self.completion["text"],
+            self.completion["point"],
+            self.index,
+            self.count,
+            self._settings.get("color_scheme"),
+        )
+
     def show(self) -> None:
         mdpopups.show_popup(
             view=self.view,
-            content=self.popup_content,
-            md=True,
+            content=self.popup_html,
+            md=False,
             layout=sublime.LAYOUT_INLINE,
             flags=sublime.COOPERATE_WITH_AUTO_COMPLETE,
             max_width=640,
@@ -248,6 +464,17 @@ class _PopupCompletion(_BaseCompletion):
     def hide(cls, view: sublime.View) -> None:
         mdpopups.hide_popup(view)
 
+    @classmethod
+    def prerender(cls, view: sublime.View, completions: list[CopilotPayloadCompletion], index: int) -> None:
+        count = len(completions)
+        # the next completions first as they are more likely to be shown. Typing through completions changes them
+        # in place, so they are copied to keep the rendered HTML consistent with the cache key taken here
+        popups = [
+            cls(view, copy.copy(completions[(index + offset) % count]), (index + offset) % count, count)
+            for offset in range(1, count)
+        ]
+        _popup_html_cache.prerender(view.id(), [(popup.cache_key, popup.render_popup_html) for popup in popups])
+
 
 class _PhantomCompletion(_BaseCompletion):
     name = "phantom"
@@ -297,53 +524,83 @@ class _PhantomCompletion(_BaseCompletion):
 
         return _view_to_phantom_set[view_id]
 
-    def normalize_phantom_line(self, line: str) -> str:
-        return html.escape(line).replace(" ", "&nbsp;").replace("\t", "&nbsp;" * self._settings.get("tab_size"))
+    @staticmethod
+    def normalize_phantom_line(line: str, tab_size: int) -> str:
+        return line.translate(_phantom_escape_table(tab_size))
 
-    def _build_phantom(
-        self,
-        lines: str | Sequence[str],
-        begin: int,
-        end: int | None = None,
-        *,
-        inline: bool = True,
-    ) -> sublime.Phantom:
-        body = (
-            self.normalize_phantom_line(lines)
-            if isinstance(lines, str)
-            else "".join(
-                self.PHANTOM_LINE_TEMPLATE.format(
-                    class_name=("rest" if index else "first"),
-                    content=self.normalize_phantom_line(line),
-                )
-                for index, line in enumerate(lines)
+    @classmethod
+    @lru_cache(maxsize=64)
+    def _render_phantom_contents(
+        cls,
+        uuid: str,
+        display_text: str,
+        tab_size: int,
+        line_padding_top: int,
+        line_padding_bottom: int,
+    ) -> tuple[str, str]:
+        """Render the contents of the inline phantom of the first line and the block phantom of the rest lines."""
+
+        def render(body: str) -> str:
+            return cls.PHANTOM_TEMPLATE.format(
+                body=body,
+                line_padding_top=line_padding_top * 2,  # TODO: play with this more
+                line_padding_bottom=line_padding_bottom * 2,
             )
-        )
 
-        return sublime.Phantom(
-            sublime.Region(begin, begin if end is None else end),
-            self.PHANTOM_TEMPLATE.format(
-                body=body,
-                line_padding_top=int(self._settings.get("line_padding_top")) * 2,  # TODO: play with this more
-                line_padding_bottom=int(self._settings.get("line_padding_bottom")) * 2,
+        # all lines are escaped in one pass
+        first_line, *rest_lines = cls.normalize_phantom_line(display_text, tab_size).splitlines()
+        return (
+            render(first_line),
+            render(
+                "".join(
+                    cls.PHANTOM_LINE_TEMPLATE.format(class_name=("rest" if index else "first"), content=line)
+                    for index, line in enumerate(rest_lines)
+                )
             ),
-            sublime.LAYOUT_INLINE if inline else sublime.LAYOUT_BLOCK,
         )
 
     def show(self) -> None:
-        first_line, *rest_lines = self.completion["displayText"].splitlines()
+        contents = self._render_phantom_contents(
+            self.completion["uuid"],
+            self.completion["displayText"],
+            int(self._settings.get("tab_size")),
+            int(self._settings.get("line_padding_top")),
+            int(self._settings.get("line_padding_bottom")),
+        )
+        point = self.completion["point"]
+
+        # cycling back and forth or re-showing the same completion doesn't have to touch the phantoms
+        if _view_to_phantom_state.get(self.view.id()) == (point, contents):
+            return
+        _view_to_phantom_state[self.view.id()] = (point, contents)
 
         assert self._phantom_set
         self._phantom_set.update([
-            self._build_phantom(first_line, self.completion["point"] + 1, self.completion["point"]),
+            sublime.Phantom(sublime.Region(point + 1, point), contents[0], sublime.LAYOUT_INLINE),
             # an empty phantom is required to prevent the cursor from jumping, even if there is only one line
-            self._build_phantom(rest_lines, self.completion["point"], inline=False),
+            sublime.Phantom(sublime.Region(point), contents[1], sublime.LAYOUT_BLOCK),
         ])
 
     @classmethod
     def hide(cls, view: sublime.View) -> None:
+        _view_to_phantom_state.pop(view.id(), None)
         cls._get_phantom_set(view).update([])
 
     @classmethod
     def close(cls, view: sublime.View) -> None:
         _view_to_phantom_set.pop(view.id(), None)
+        _view_to_phantom_state.pop(view.id(), None)
+
+
+@lru_cache
+def _phantom_escape_table(tab_size: int) -> dict[int, str]:
+    """The translation table which escapes a text like `html.escape()` and keeps its whitespaces in a phantom."""
+    return str.maketrans({
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "'": "&#x27;",
+        " ": "&nbsp;",
+        "\t": "&nbsp;" * tab_size,
+    })
@@ -1,25 +1,71 @@
 from __future__ import annotations
 
+import bisect
 import textwrap
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
 
 import mdpopups
 import sublime
-from more_itertools import first_true, unique_everseen
 
+from ..scheduler import sheet_render_throttle
 from ..template import load_resource_template
 from ..types import CopilotPayloadPanelSolution, StLayout
 from ..utils import (
-    all_views,
     find_view_by_id,
     fix_completion_syntax_highlight,
     get_copilot_view_setting,
     get_view_language_id,
+    md2html,
     remove_prefix,
     set_copilot_view_setting,
+    sheet_registry,
 )
 
 
+class _ViewPanelCompletionState:
+    """
+    The in-memory panel completions of a view. Solutions are deduplicated by `completionText` and ranked by
+    `score` as they arrive, and the HTML of each ranked solution is rendered only once.
+    """
+
+    __slots__ = (
+        "completions",
+        "completion_texts",
+        "ranking",
+        "section_htmls",
+    )
+
+    def __init__(self) -> None:
+        self.completions: list[CopilotPayloadPanelSolution] = []
+        """All received completions in the arrival order. Note that this is how a completion is indexed."""
+        self.completion_texts: set[str] = set()
+        self.ranking: list[tuple[float, int]] = []
+        """`(-score, completion_index)` of unique completions in ascending order."""
+        self.section_htmls: dict[int, str] = {}
+        """Completion index to the rendered HTML of its section."""
+
+    def append(self, completion: CopilotPayloadPanelSolution) -> None:
+        index = len(self.completions)
+        self.completions.append(completion)
+        if (text := completion["completionText"]) in self.completion_texts:
+            return
+        self.completion_texts.add(text)
+        bisect.insort(self.ranking, (-completion["score"], index))
+
+    def replace(self, completions: Iterable[CopilotPayloadPanelSolution]) -> None:
+        self.completions = []
+        self.completion_texts = set()
+        self.ranking = []
+        self.section_htmls = {}
+        for completion in completions:
+            self.append(completion)
+
+
+_view_to_panel_completion_state: dict[int, _ViewPanelCompletionState] = {}
+_panel_sheet_to_view_id: dict[int, int] = {}
+"""The ID of a panel completion sheet to the ID of the view which the panel completions are for."""
+
+
 class ViewPanelCompletionManager:
     # ------------- #
     # view settings #
@@ -60,6 +106,7 @@ class ViewPanelCompletionManager:
     @sheet_id.setter
     def sheet_id(self, value: int) -> None:
         set_copilot_view_setting(self.view, "panel_sheet_id", value)
+        _panel_sheet_to_view_id[value] = self.view.id()
 
     @property
     def original_layout(self) -> StLayout | None:
@@ -81,12 +128,12 @@ class ViewPanelCompletionManager:
 
     @property
     def completions(self) -> list[CopilotPayloadPanelSolution]:
-        """All `completions` in the view. Note that this is a copy."""
-        return get_copilot_view_setting(self.view, "panel_completions", [])
+        """All `completions` in the view. Note that this is not a copy so assign a new list to change it."""
+        return self._state.completions
 
     @completions.setter
     def completions(self, value: list[CopilotPayloadPanelSolution]) -> None:
-        set_copilot_view_setting(self.view, "panel_completions", value)
+        self._state.replace(value)
 
     @property
     def panel_id(self) -> str:
@@ -99,12 +146,24 @@ class ViewPanelCompletionManager:
 
     def __init__(self, view: sublime.View) -> None:
         self.view = view
+        self._state = self._get_state(view)
+
+    @staticmethod
+    def _get_state(view: sublime.View) -> _ViewPanelCompletionState:
+        view_id = view.id()
+        if not (state := _view_to_panel_completion_state.get(view_id)):
+            state = _view_to_panel_completion_state[view_id] = _ViewPanelCompletionState()
+        return state
 
     def reset(self) -> None:
         self.is_waiting = False
         self.is_visible = False
         self.original_layout = None
 
+    def handle_close(self) -> None:
+        _view_to_panel_completion_state.pop(self.view.id(), None)
+        sheet_render_throttle.forget(("panel", self.view.id()))
+
     def get_completion(self, index: int) -> CopilotPayloadPanelSolution | None:
         try:
             return self.completions[index]
@@ -112,9 +171,18 @@ class ViewPanelCompletionManager:
             return None
 
     def append_completion(self, completion: CopilotPayloadPanelSolution) -> None:
-        completions = self.completions
-        completions.append(completion)
-        self.completions = completions
+        self._state.append(completion)
+
+    def ranked_completions(self) -> list[tuple[int, CopilotPayloadPanelSolution]]:
+        """Return unique sorted-by-`score` completions in the form of `[(completion_index, completion), ...]`."""
+        completions = self._state.completions
+        return [(index, completions[index]) for _, index in self._state.ranking]
+
+    def get_section_html(self, index: int, render: Callable[[], str]) -> str:
+        """Get the rendered HTML of the section of the completion at `index`. It's rendered via `render` once."""
+        if (html := self._state.section_htmls.get(index)) is None:
+            html = self._state.section_htmls[index] = render()
+        return html
 
     @staticmethod
     def find_view_by_panel_id(panel_id: str) -> sublime.View | None:
@@ -123,7 +191,10 @@ class ViewPanelCompletionManager:
 
     @classmethod
     def from_sheet_id(cls, sheet_id: int) -> ViewPanelCompletionManager | None:
-        return first_true(map(cls, all_views()), pred=lambda self: self.sheet_id == sheet_id)
+        # most sheets aren't panels and an unknown view ID would make the lookup scan every view
+        if (view_id := _panel_sheet_to_view_id.get(sheet_id)) is None or not (view := find_view_by_id(view_id)):
+            return None
+        return vpcm if (vpcm := cls(view)).sheet_id == sheet_id else None
 
     def open(self, *, completion_target_count: int | None = None) -> None:
         """Open the completion panel."""
@@ -133,8 +204,12 @@ class ViewPanelCompletionManager:
         _PanelCompletion(self.view).open()
 
     def update(self) -> None:
-        """Update the completion panel."""
-        _PanelCompletion(self.view).update()
+        """Update the completion panel right away."""
+        sheet_render_throttle.flush(("panel", self.view.id()), _PanelCompletion(self.view).update)
+
+    def request_update(self) -> None:
+        """Update the completion panel, no more often than the "max_sheet_refresh_rate" setting allows."""
+        sheet_render_throttle.request(("panel", self.view.id()), _PanelCompletion(self.view).update)
 
     def close(self) -> None:
         """Close the completion panel."""
@@ -148,29 +223,33 @@ class _PanelCompletion:
 
     @property
     def completion_content(self) -> str:
-        completions = self._synthesize(self.completion_manager.completions)
+        sections = [
+            {"html": self.completion_manager.get_section_html(index, lambda: self._render_section(index, completion))}
+            for index, completion in self.completion_manager.ranked_completions()
+        ]
 
         return load_resource_template("panel_completion.md.jinja").render(
             close_url=sublime.command_url("copilot_close_panel_completion", {"view_id": self.view.id()}),
             is_waiting=self.completion_manager.is_waiting,
-            sections=[
-                {
-                    "accept_url": sublime.command_url(
-                        "copilot_accept_panel_completion_shim",
-                        {"view_id": self.view.id(), "completion_index": index},
-                    ),
-                    "code": fix_completion_syntax_highlight(
-                        self.view,
-                        completion["region"][1],
-                        self._prepare_popup_code_display_text(completion["displayText"]),
-                    ),
-                    "lang": get_view_language_id(self.view, completion["region"][1]),
-                }
-                for index, completion in completions
-            ],
+            sections=sections,
             total_solutions=self.completion_manager.completion_target_count,
         )
 
+    def _render_section(self, index: int, completion: CopilotPayloadPanelSolution) -> str:
+        section = load_resource_template("panel_completion_section.md.jinja").render(
+            accept_url=sublime.command_url(
+                "copilot_accept_panel_completion_shim",
+                {"view_id": self.view.id(), "completion_index": index},
+            ),
+            code=fix_completion_syntax_highlight(
+                self.view,
+                completion["region"][1],
+                self._prepare_popup_code_display_text(completion["displayText"]),
+            ),
+            lang=get_view_language_id(self.view, completion["region"][1]),
+        )
+        return md2html(self.view, section)
+
     def open(self) -> None:
         window = self.view.window()
         if not window:
@@ -193,7 +272,7 @@ class _PanelCompletion:
         if not isinstance(sheet, sublime.HtmlSheet):
             return
 
-        mdpopups.update_html_sheet(sheet=sheet, contents=self.completion_content, md=True)
+        mdpopups.update_html_sheet(sheet=sheet, contents=self.completion_content, md=False)
 
     def close(self) -> None:
         window = self.view.window()
@@ -205,6 +284,8 @@ class _PanelCompletion:
             return
 
         sheet.close()
+        sheet_registry.discard(sheet.id())
+        _panel_sheet_to_view_id.pop(sheet.id(), None)
         self.completion_manager.is_visible = False
         if self.completion_manager.original_layout:
             window.set_layout(self.completion_manager.original_layout)  # type: ignore
@@ -226,18 +307,6 @@ class _PanelCompletion:
 
         return display_text
 
-    @staticmethod
-    def _synthesize(
-        completions: Iterable[CopilotPayloadPanelSolution],
-    ) -> list[tuple[int, CopilotPayloadPanelSolution]]:
-        """Return sorted-by-`score` completions in the form of `[(completion_index, completion), ...]`."""
-        return sorted(
-            # note that we must keep completion's original index
-            unique_everseen(enumerate(completions), key=lambda pair: pair[1]["completionText"]),
-            key=lambda pair: pair[1]["score"],
-            reverse=True,
-        )
-
     def _open_in_group(self, window: sublime.Window, group_id: int) -> None:
         self.completion_manager.group_id = group_id
 
@@ -246,9 +315,10 @@ class _PanelCompletion:
             window=window,
             name="Panel Completions",
             contents=self.completion_content,
-            md=True,
+            md=False,
             flags=sublime.TRANSIENT,
         )
+        sheet_registry.add(sheet)
         self.completion_manager.sheet_id = sheet.id()
 
     def _open_in_side_by_side(self, window: sublime.Window) -> None:
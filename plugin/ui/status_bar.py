@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Any
+
+from LSP.plugin import Session
+
+from ..log import log_warning
+from ..scheduler import Scheduler, scheduler
+from ..template import load_string_template
+
+
+class StatusBarRenderer:
+    """
+    Renders the "status_text" template into the status bar of sessions.
+
+    Updates requested before the next tick of the `Scheduler`, e.g., by the activity indicators of several windows,
+    are coalesced into that single tick, in which only the latest update of each session is applied. The template is
+    only rendered again if it or its variables have changed, and the status is only set if the rendered text has.
+    """
+
+    def __init__(self, scheduler: Scheduler) -> None:
+        self.renders = 0
+        self.skipped_renders = 0
+        """The number of requested updates which have been superseded or haven't changed anything."""
+        self._scheduler = scheduler
+        self._pending: weakref.WeakKeyDictionary[Session, tuple[str, dict[str, Any]]] = weakref.WeakKeyDictionary()
+        """Sessions to the latest requested `(template_text, variables)`."""
+        self._rendered: weakref.WeakKeyDictionary[Session, tuple[str, dict[str, Any], str]] = (
+            weakref.WeakKeyDictionary()
+        )
+        """Sessions to the last `(template_text, variables, rendered_text)`."""
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, float]:
+        return {"renders": self.renders, "skipped": self.skipped_renders}
+
+    def request(self, session: Session, template_text: str, variables: dict[str, Any]) -> None:
+        """Update the status of `session` on the next tick."""
+        with self._lock:
+            if session in self._pending:
+                self.skipped_renders += 1
+            self._pending[session] = (template_text, variables)
+            if not self._scheduler.is_scheduled("status_bar"):
+                self._scheduler.schedule("status_bar", 0, self.flush)
+
+    def flush(self) -> None:
+        """Apply pending updates right away."""
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+
+        for session, (template_text, variables) in pending:
+            self._update(session, template_text, variables)
+
+    def forget(self, session: Session) -> None:
+        with self._lock:
+            self._pending.pop(session, None)
+            self._rendered.pop(session, None)
+
+    def _update(self, session: Session, template_text: str, variables: dict[str, Any]) -> None:
+        last = self._rendered.get(session)
+        if last and last[0] == template_text and last[1] == variables:
+            self.skipped_renders += 1
+            return
+
+        rendered_text = ""
+        if template_text:
+            try:
+                rendered_text = load_string_template(template_text).render(variables)
+            except Exception as e:
+                log_warning(f'Invalid "status_text" template: {e}')
+        self.renders += 1
+        self._rendered[session] = (template_text, variables, rendered_text)
+
+        if not last or last[2] != rendered_text:
+            session.set_config_status_async(rendered_text)
+
+
+status_bar_renderer = StatusBarRenderer(scheduler)
+"""Renders the status bar text of all sessions."""
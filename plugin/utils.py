@@ -6,22 +6,30 @@ import os
 import sys
 import threading
 import urllib.request
-from collections.abc import Callable, Generator, Iterable
+from collections.abc import Callable, Generator, Hashable, Iterable
 from functools import wraps
-from typing import Any, Mapping, Sequence, TypeVar, Union, cast
+from typing import Any, Generic, Mapping, Sequence, TypeVar, Union, cast
 
+import mdpopups
 import sublime
-from LSP.plugin.core.sessions import Session
 from LSP.plugin.core.types import basescope2languageid
-from more_itertools import first, first_true
+from more_itertools import first
 
 from .constants import COPILOT_VIEW_SETTINGS_PREFIX, PACKAGE_NAME
+from .scheduler import scheduler
 from .types import T_Callable
 
 _T = TypeVar("_T")
 _KT = TypeVar("_KT")
 _VT = TypeVar("_VT")
 _T_Number = TypeVar("_T_Number", bound=Union[int, float])
+_T_Handle = TypeVar("_T_Handle", sublime.Sheet, sublime.View, sublime.Window)
+
+md2html_lock = threading.RLock()
+"""
+Serializes `mdpopups.md2html()`. Its Sublime highlighter writes code into a shared output panel and reads it back,
+so concurrent calls can mix up each other's code.
+"""
 
 
 def all_windows() -> Generator[sublime.Window, None, None]:
@@ -59,50 +67,110 @@ def clamp(val: _T_Number, min_val: _T_Number | None = None, max_val: _T_Number |
     return val
 
 
-def debounce(time_s: float = 0.3) -> Callable[[T_Callable], T_Callable]:
+def debounce(time_s: float | Callable[..., float] = 0.3) -> Callable[[T_Callable], T_Callable]:
     """
-    Debounce a function so that it's called after `time_s` seconds.
-    If it's called multiple times in the time frame, it will only run the last call.
-
-    Taken and modified from https://github.com/salesforce/decorator-operations
+    Debounce a function so that it's called after `time_s` seconds on the async thread.
+    If it's called multiple times in the time frame with the same positional arguments (views and windows
+    are compared by their IDs, others by identity), it will only run the last call.
+    `time_s` can also be a function which is called with the arguments of each call to get the delay.
     """
 
     def decorator(func: T_Callable) -> T_Callable:
         @wraps(func)
         def debounced(*args: Any, **kwargs: Any) -> None:
-            def call_function() -> Any:
-                delattr(debounced, "_timer")
-                return func(*args, **kwargs)
-
-            timer: threading.Timer | None = getattr(debounced, "_timer", None)
-            if timer is not None:
-                timer.cancel()
-
-            timer = threading.Timer(time_s, call_function)
-            timer.start()
-            setattr(debounced, "_timer", timer)
+            scheduler.schedule(
+                (debounced, *map(_debounce_key, args)),
+                time_s(*args, **kwargs) if callable(time_s) else time_s,
+                lambda: func(*args, **kwargs),
+            )
 
-        setattr(debounced, "_timer", None)
         return cast(T_Callable, debounced)
 
     return decorator
 
 
+def _debounce_key(arg: Any) -> Hashable:
+    if isinstance(arg, (sublime.View, sublime.Window)):
+        return (type(arg), arg.id())
+    return id(arg)
+
+
 def drop_falsy(iterable: Iterable[_T | None]) -> Generator[_T, None, None]:
     """Drops falsy values from the iterable."""
     yield from filter(None, iterable)
 
 
+class HandleRegistry(Generic[_T_Handle]):
+    """
+    ID to ST's window/view/sheet handles, kept up-to-date by event listeners, so that finding one by its ID is O(1).
+
+    Handles are strongly referenced. A handle is just a wrapper of an ID, which ST creates freshly for every API
+    call and event, so nothing else keeps a given handle alive and a weak reference to it would be dropped right
+    after it's registered. Instead, closed objects are discarded by listeners, and a found handle is checked
+    with `is_valid` in case a listener is missed. If an ID is not registered, e.g., for objects which exist before
+    the plugin is loaded, all objects are scanned and registered.
+    """
+
+    def __init__(
+        self,
+        scan: Callable[[], Iterable[_T_Handle]],
+        is_valid: Callable[[_T_Handle], bool],
+    ) -> None:
+        self._scan = scan
+        self._is_valid = is_valid
+        self._handles: dict[int, _T_Handle] = {}
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def add(self, handle: _T_Handle) -> None:
+        self._handles[handle.id()] = handle
+
+    def discard(self, id: int) -> None:
+        self._handles.pop(id, None)
+
+    def clear(self) -> None:
+        self._handles.clear()
+
+    def find(self, id: int) -> _T_Handle | None:
+        if (handle := self._handles.get(id)) is not None:
+            if self._is_valid(handle):
+                return handle
+            del self._handles[id]
+
+        found: _T_Handle | None = None
+        for handle in self._scan():
+            handle_id = handle.id()
+            self._handles[handle_id] = handle
+            if handle_id == id:
+                found = handle
+        return found
+
+
+sheet_registry: HandleRegistry[sublime.Sheet] = HandleRegistry(
+    lambda: all_sheets(include_transient=True),
+    lambda sheet: sheet.window() is not None,  # `Sheet` has no `is_valid()`
+)
+view_registry: HandleRegistry[sublime.View] = HandleRegistry(
+    lambda: all_views(include_transient=True),
+    lambda view: view.is_valid(),
+)
+window_registry: HandleRegistry[sublime.Window] = HandleRegistry(
+    all_windows,
+    lambda window: window.is_valid(),
+)
+
+
 def find_sheet_by_id(id: int) -> sublime.Sheet | None:
-    return first_true(all_sheets(include_transient=True), pred=lambda sheet: sheet.id() == id)
+    return sheet_registry.find(id)
 
 
 def find_view_by_id(id: int) -> sublime.View | None:
-    return first_true(all_views(include_transient=True), pred=lambda view: view.id() == id)
+    return view_registry.find(id)
 
 
 def find_window_by_id(id: int) -> sublime.Window | None:
-    return first_true(all_windows(), pred=lambda window: window.id() == id)
+    return window_registry.find(id)
 
 
 def is_active_view(obj: Any) -> bool:
@@ -150,11 +218,6 @@ def get_project_relative_path(path: str) -> str:
     return relpath
 
 
-def get_session_setting(session: Session, key: str, default: Any = None) -> Any:
-    """Get the value of the `key` in "settings" in this plugin's "LSP-*.sublime-settings"."""
-    return default if (value := session.config.settings.get(key)) is None else value
-
-
 def get_view_language_id(view: sublime.View, point: int = 0) -> str:
     """Find the language ID for the `view` at `point`."""
     # the deepest scope satisfying `source | text | embedding` will be used to find the language ID
@@ -166,6 +229,12 @@ def get_view_language_id(view: sublime.View, point: int = 0) -> str:
     return ""
 
 
+def md2html(view: sublime.View, markup: str) -> str:
+    """Thread-safe `mdpopups.md2html()`. The `view` provides the color scheme for syntax highlighting."""
+    with md2html_lock:
+        return mdpopups.md2html(view, markup)
+
+
 def message_dialog(msg: str, *, error: bool = False, console: bool = False) -> None:
     """
     Show a message dialog, whose message is prefixed with "[PACKAGE_NAME]".